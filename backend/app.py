@@ -1,9 +1,11 @@
 """Ponto de entrada da API"""
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from . import database, metricas, sessoes
 from .database import engine, Base
-from .routes import operadoras, estatisticas
+from .routes import operadoras, estatisticas, exportacao
 
 
 Base.metadata.create_all(bind=engine)
@@ -27,12 +29,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count"],
 )
 
+# Por último: fica por fora do CORS e mede a requisição inteira
+app.add_middleware(metricas.MiddlewareMetricas)
+metricas.instrumentar(engine)
+if database.async_engine is not None:
+    metricas.instrumentar(database.async_engine.sync_engine)
 
-app.include_router(operadoras.router)
 
-app.include_router(estatisticas.router)
+adaptar = sessoes.router_async if database.DB_ASYNC else sessoes.router_sync
+
+app.include_router(adaptar(operadoras.router))
+
+app.include_router(adaptar(estatisticas.router))
+
+app.include_router(exportacao.router)
+
+
+@app.get("/api/pool")
+def status_pool():
+    """Pool de conexões: em uso/overflow e tempo de espera por uma conexão."""
+    return database.metricas_pool.resumo(database.pool_ativo())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def expor_metricas():
+    """Latência por rota, consultas SQL por requisição e pool, no formato do Prometheus."""
+    return metricas.metricas.prometheus(database.metricas_pool.resumo(database.pool_ativo()))
+
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,174 @@
+"""Índice de busca em memória para operadoras (trigramas no nome, prefixo no CNPJ)"""
+import bisect
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from . import models
+from .cache import versao_dados
+
+# Reconstrói mesmo sem nova versão depois desse tempo (cargas feitas fora do etl.loader)
+BUSCA_TTL = int(os.getenv("BUSCA_TTL", "600"))
+MAX_CONSULTAS_EM_CACHE = 512
+
+_RE_NAO_ALFANUM = re.compile(r'[^0-9a-z]+')
+_RE_CNPJ = re.compile(r'^[\d./\-\s]+$')
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só com letras/dígitos separados por um espaço."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return _RE_NAO_ALFANUM.sub(' ', texto).strip()
+
+
+def _trigramas(palavra):
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+
+class IndiceBusca:
+    """
+    Índice invertido de trigramas sobre o nome normalizado (busca por trecho,
+    como o LIKE '%termo%'), vocabulário ordenado para prefixos curtos e lista
+    ordenada de CNPJs para busca por prefixo. Resultados vêm ranqueados.
+    """
+
+    def __init__(self, operadoras):
+        # operadoras: iterável de (registro_ans, razao_social, cnpj)
+        self.registros = []
+        nomes = []
+        postings = defaultdict(list)
+        por_palavra = defaultdict(set)
+        cnpjs = []
+        for doc, (registro_ans, razao_social, cnpj) in enumerate(operadoras):
+            nome = normalizar(razao_social)
+            self.registros.append(registro_ans)
+            nomes.append(nome)
+            for palavra in set(nome.split()):
+                por_palavra[palavra].add(doc)
+                for trigrama in _trigramas(palavra):
+                    postings[trigrama].append(doc)
+            if cnpj:
+                cnpjs.append((re.sub(r'\D', '', cnpj), doc))
+
+        # Nomes normalizados são ASCII: array de bytes, com verificação e ranking
+        # feitos por operações vetorizadas (np.strings)
+        self.registros = np.asarray(self.registros, dtype=np.int64)
+        self.espacados = np.array([' ' + n for n in nomes], dtype=bytes)
+        self.tamanhos = np.strings.str_len(self.espacados) - 1
+        # Listas de documentos como arrays ordenados (interseção rápida e pouca memória)
+        self.postings = {t: np.unique(np.asarray(docs, dtype=np.int32)) for t, docs in postings.items()}
+        self.vocabulario = sorted(por_palavra)
+        self.docs_palavra = [np.fromiter(por_palavra[p], dtype=np.int32) for p in self.vocabulario]
+        cnpjs.sort()
+        self.cnpjs = [c for c, _ in cnpjs]
+        self.docs_cnpj = [d for _, d in cnpjs]
+        self._consultas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self.registros)
+
+    def _docs_com_prefixo(self, prefixo):
+        inicio = bisect.bisect_left(self.vocabulario, prefixo)
+        fim = bisect.bisect_left(self.vocabulario, prefixo + '\uffff')
+        if inicio == fim: return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(self.docs_palavra[inicio:fim]))
+
+    def _candidatos(self, palavras):
+        conjuntos = []
+        for palavra in palavras:
+            if len(palavra) < 3:
+                conjuntos.append(self._docs_com_prefixo(palavra))
+            else:
+                # Basta o trigrama mais raro: o trecho completo é conferido depois com find
+                conjuntos.append(min((self.postings.get(t, np.empty(0, dtype=np.int32))
+                                      for t in _trigramas(palavra)), key=len))
+        conjuntos.sort(key=len)
+        candidatos = conjuntos[0]
+        for conjunto in conjuntos[1:]:
+            if not len(candidatos): break
+            candidatos = np.intersect1d(candidatos, conjunto, assume_unique=True)
+        return candidatos
+
+    def _buscar_cnpj(self, digitos):
+        inicio = bisect.bisect_left(self.cnpjs, digitos)
+        fim = bisect.bisect_left(self.cnpjs, digitos + '\uffff')
+        return self.docs_cnpj[inicio:fim]
+
+    def _buscar_nome(self, termo):
+        palavras = termo.split()
+        if not palavras: return []
+        candidatos = self._candidatos(palavras)
+        if not len(candidatos): return []
+
+        espacados = self.espacados[candidatos]
+        # Os trigramas só garantem o trecho exato em palavras de 3 letras; as demais são conferidas.
+        # Palavras curtas valem como prefixo de palavra; as demais como trecho.
+        casam = np.ones(len(candidatos), dtype=bool)
+        for p in palavras:
+            if len(p) != 3:
+                casam &= np.strings.find(espacados, (' ' + p if len(p) < 3 else p).encode()) >= 0
+        candidatos, espacados = candidatos[casam], espacados[casam]
+
+        posicao = np.strings.find(espacados, (' ' + termo).encode())
+        tamanhos = self.tamanhos[candidatos]
+        ordem = np.lexsort((
+            candidatos,
+            tamanhos,                                # nomes mais curtos (mais específicos) primeiro
+            posicao < 0,                             # termo aparece como frase a partir de uma palavra
+            posicao != 0,                            # nome começa com o termo
+            (posicao != 0) | (tamanhos != len(termo)),  # nome idêntico
+        ))
+        return candidatos[ordem]
+
+    def buscar(self, texto):
+        """RegistroANS das operadoras que casam com `texto`, do mais para o menos relevante."""
+        chave = (texto or '').strip()
+        with self._trava:
+            if chave in self._consultas:
+                self._consultas.move_to_end(chave)
+                return self._consultas[chave]
+
+        docs = self._buscar_nome(normalizar(chave))
+        if _RE_CNPJ.match(chave) and re.sub(r'\D', '', chave):
+            # CNPJ casando pelo prefixo vem antes dos nomes
+            por_cnpj = np.asarray(self._buscar_cnpj(re.sub(r'\D', '', chave)), dtype=np.int64)
+            docs = np.concatenate([por_cnpj, np.asarray(docs, dtype=np.int64)[~np.isin(docs, por_cnpj)]])
+        resultado = self.registros[np.asarray(docs, dtype=np.int64)].tolist()
+
+        with self._trava:
+            self._consultas[chave] = resultado
+            while len(self._consultas) > MAX_CONSULTAS_EM_CACHE:
+                self._consultas.popitem(last=False)
+        return resultado
+
+
+_indice = {'versao': None, 'criado_em': 0.0, 'indice': None}
+_trava_indice = threading.Lock()
+
+
+def _indice_valido(versao):
+    return _indice['indice'] is not None and _indice['versao'] == versao and \
+        time.monotonic() - _indice['criado_em'] < BUSCA_TTL
+
+
+def obter_indice(db):
+    """Índice da versão atual dos dados; reconstruído quando o ETL carrega dados novos."""
+    versao = versao_dados(db)
+    if _indice_valido(versao):
+        return _indice['indice']
+
+    # A consulta fica fora da trava: nas rotas assíncronas (run_sync) a espera pelo banco
+    # troca de greenlet na mesma thread, e outra requisição travaria o event loop
+    linhas = db.query(models.Operadora.registro_ans, models.Operadora.razao_social,
+                      models.Operadora.cnpj).all()
+    with _trava_indice:
+        if not _indice_valido(versao):
+            _indice.update(versao=versao, criado_em=time.monotonic(), indice=IndiceBusca(linhas))
+        return _indice['indice']
@@ -0,0 +1,95 @@
+"""Cache das respostas da API, versionado pelo carimbo de carga do ETL"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from . import models
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "256"))
+# Ex.: redis://localhost:6379/0. Sem a variável, o cache fica na memória do processo.
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+
+class CacheMemoria:
+    """Cache LRU com expiração (TTL) na memória do processo."""
+
+    def __init__(self, ttl=CACHE_TTL, max_itens=CACHE_MAX_ITENS):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None: return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+class CacheRedis:
+    """Mesma interface de CacheMemoria, compartilhada entre processos/instâncias da API."""
+
+    def __init__(self, url, ttl=CACHE_TTL, prefixo="ans-api:"):
+        import redis  # dependência opcional, só exigida quando CACHE_URL aponta para um Redis
+        self.cliente = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefixo = prefixo
+
+    def obter(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def guardar(self, chave, valor):
+        self.cliente.set(self.prefixo + chave, json.dumps(valor), ex=self.ttl)
+
+    def limpar(self):
+        for chave in self.cliente.scan_iter(self.prefixo + "*"):
+            self.cliente.delete(chave)
+
+
+def _criar_cache():
+    return CacheRedis(CACHE_URL) if CACHE_URL else CacheMemoria()
+
+
+cache = _criar_cache()
+
+
+def versao_dados(db):
+    """Versão atual dos dados (incrementada pelo etl.loader a cada carga)."""
+    versao = db.query(models.VersaoDados.versao).filter(models.VersaoDados.id == 1).scalar()
+    return versao or 0
+
+
+def responder_condicional(request: Request, response: Response, etag: str):
+    """
+    Define ETag/Cache-Control na resposta. Se o cliente já tem essa versão
+    (If-None-Match), devolve um 304 vazio para a rota retornar diretamente.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    enviados = [e.strip().removeprefix("W/") for e in request.headers.get("if-none-match", "").split(",")]
+    if "*" in enviados or etag.removeprefix("W/") in enviados:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,204 @@
+"""Métricas da API: latência por rota, consultas SQL por requisição e log de requisições lentas"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Requisições que passarem deste tempo vão para o log junto com o SQL executado (0 desliga)
+REQUISICAO_LENTA_MS = float(os.getenv("REQUISICAO_LENTA_MS", "0"))
+MAX_SQL_POR_REQUISICAO = 50
+
+log = logging.getLogger(__name__)
+
+# Consultas da requisição em andamento; o threadpool do Starlette e o run_sync copiam o contexto
+_requisicao = contextvars.ContextVar("requisicao_metricas", default=None)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # a última posição é o +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def acumulado(self):
+        """Pares (le, contagem acumulada), como o Prometheus espera."""
+        soma = 0
+        for limite, contagem in zip([*self.limites, "+Inf"], self.contagens):
+            soma += contagem
+            yield limite, soma
+
+
+class ConsultasRequisicao:
+    """Quantidade, tempo e erros das consultas de uma requisição (e o SQL, se o log de lentas estiver ligado)."""
+
+    def __init__(self, capturar_sql=False):
+        self.qtd = 0
+        self.tempo = 0.0
+        self.erros = 0
+        self.sql = [] if capturar_sql else None
+
+    def registrar(self, sql, segundos, erro=False):
+        self.qtd += 1
+        self.tempo += segundos
+        self.erros += erro
+        if self.sql is not None and len(self.sql) < MAX_SQL_POR_REQUISICAO:
+            self.sql.append((segundos, ("[ERRO] " if erro else "") + " ".join(sql.split())))
+
+
+class MetricasRequisicoes:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.requisicoes = {}   # (método, rota, status) -> quantidade
+        self.latencia = {}      # (método, rota) -> Histograma em segundos
+        self.consultas = {}     # rota -> Histograma de consultas por requisição
+        self.tempo_sql = {}     # rota -> segundos gastos no banco
+        self.erros_sql = {}     # rota -> comandos SQL que terminaram em exceção
+
+    def registrar(self, metodo, rota, status, segundos, consultas):
+        with self._trava:
+            chave = (metodo, rota, status)
+            self.requisicoes[chave] = self.requisicoes.get(chave, 0) + 1
+            self.latencia.setdefault((metodo, rota), Histograma(BUCKETS_LATENCIA)).observar(segundos)
+            self.consultas.setdefault(rota, Histograma(BUCKETS_CONSULTAS)).observar(consultas.qtd)
+            self.tempo_sql[rota] = self.tempo_sql.get(rota, 0.0) + consultas.tempo
+            self.erros_sql[rota] = self.erros_sql.get(rota, 0) + consultas.erros
+
+    def prometheus(self, pool=None):
+        """Texto no formato de exposição do Prometheus (contadores e histogramas desde o início do processo)."""
+        linhas = []
+        with self._trava:
+            linhas += _cabecalho("http_requisicoes_total", "counter", "Requisições por rota e status")
+            linhas += [f"http_requisicoes_total{_rotulos(metodo=m, rota=r, status=s)} {qtd}"
+                       for (m, r, s), qtd in sorted(self.requisicoes.items())]
+            linhas += _cabecalho("http_requisicao_duracao_segundos", "histogram", "Latência por rota")
+            for (m, r), histograma in sorted(self.latencia.items()):
+                linhas += _histograma("http_requisicao_duracao_segundos", histograma, metodo=m, rota=r)
+            linhas += _cabecalho("http_consultas_sql_por_requisicao", "histogram",
+                                 "Comandos SQL executados por requisição")
+            for r, histograma in sorted(self.consultas.items()):
+                linhas += _histograma("http_consultas_sql_por_requisicao", histograma, rota=r)
+            linhas += _cabecalho("http_consultas_sql_segundos_total", "counter", "Tempo gasto no banco por rota")
+            linhas += [f"http_consultas_sql_segundos_total{_rotulos(rota=r)} {segundos:.6f}"
+                       for r, segundos in sorted(self.tempo_sql.items())]
+            linhas += _cabecalho("http_consultas_sql_erros_total", "counter", "Comandos SQL que falharam, por rota")
+            linhas += [f"http_consultas_sql_erros_total{_rotulos(rota=r)} {qtd}"
+                       for r, qtd in sorted(self.erros_sql.items())]
+        if pool is not None:
+            linhas += _cabecalho("db_pool_checkouts_total", "counter", "Conexões obtidas do pool")
+            linhas.append(f"db_pool_checkouts_total {pool['checkouts']}")
+            linhas += _cabecalho("db_pool_espera_max_segundos", "gauge", "Maior espera por uma conexão do pool")
+            linhas.append(f"db_pool_espera_max_segundos {pool['espera_max_ms'] / 1000:.6f}")
+            linhas += _cabecalho("db_pool_em_uso", "gauge", "Conexões emprestadas agora")
+            linhas.append(f"db_pool_em_uso {pool['em_uso'] or 0}")
+        return "\n".join(linhas) + "\n"
+
+
+def _cabecalho(nome, tipo, descricao):
+    return [f"# HELP {nome} {descricao}", f"# TYPE {nome} {tipo}"]
+
+
+def _rotulos(**rotulos):
+    def escapar(valor):
+        return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{nome}="{escapar(valor)}"' for nome, valor in rotulos.items()) + "}"
+
+
+def _histograma(nome, histograma, **rotulos):
+    linhas = [f"{nome}_bucket{_rotulos(**rotulos, le=le)} {qtd}" for le, qtd in histograma.acumulado()]
+    linhas.append(f"{nome}_sum{_rotulos(**rotulos)} {round(histograma.soma, 6)}")
+    linhas.append(f"{nome}_count{_rotulos(**rotulos)} {histograma.total}")
+    return linhas
+
+
+metricas = MetricasRequisicoes()
+
+
+# --- Contagem de consultas via eventos do SQLAlchemy ---
+# O início fica na conexão, pelo cursor: after_cursor_execute não dispara quando o comando
+# falha, e quem retira o início nesse caso é o handle_error (senão ficaria na conexão do pool)
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consultas", {})[id(cursor)] = time.perf_counter()
+
+
+def _registrar_consulta(conn, cursor, statement, erro=False):
+    inicio = conn.info.get("inicio_consultas", {}).pop(id(cursor), None)
+    if inicio is None: return  # erro fora da execução do comando (ex.: ao conectar ou ao ler o resultado)
+    consultas = _requisicao.get()
+    if consultas is not None:
+        consultas.registrar(statement, time.perf_counter() - inicio, erro=erro)
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    _registrar_consulta(conn, cursor, statement)
+
+
+def _erro_na_consulta(contexto):
+    # O SQLAlchemy 2.0 não preenche contexto.cursor; o cursor do comando está no execution_context
+    cursor = getattr(contexto.execution_context, "cursor", None)
+    if contexto.connection is not None and cursor is not None:
+        _registrar_consulta(contexto.connection, cursor, contexto.statement or "", erro=True)
+
+
+def instrumentar(engine):
+    """Conta e cronometra os comandos do engine (no assíncrono, passe `async_engine.sync_engine`)."""
+    if not event.contains(engine, "before_cursor_execute", _antes_da_consulta):
+        event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+        event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+        event.listen(engine, "handle_error", _erro_na_consulta)
+
+
+# --- Middleware ---
+class MiddlewareMetricas:
+    """
+    Middleware ASGI (sem BaseHTTPMiddleware, que bufferiza o corpo): mede a requisição
+    até o último byte da resposta, inclusive as exportações em fluxo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        consultas = ConsultasRequisicao(capturar_sql=REQUISICAO_LENTA_MS > 0)
+        token = _requisicao.set(consultas)
+        status = 500  # se a rota estourar antes de responder
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            segundos = time.perf_counter() - inicio
+            _requisicao.reset(token)
+            # Rota como declarada (/api/operadoras/{cnpj}), não o caminho: evita uma série por CNPJ
+            rota = getattr(scope.get("route"), "path", None) or "sem_rota"
+            metricas.registrar(scope["method"], rota, status, segundos, consultas)
+            if REQUISICAO_LENTA_MS and segundos * 1000 >= REQUISICAO_LENTA_MS:
+                _logar_lenta(scope, status, segundos, consultas)
+
+
+def _logar_lenta(scope, status, segundos, consultas):
+    caminho = scope["path"] + (f"?{scope['query_string'].decode('latin1')}" if scope.get("query_string") else "")
+    sql = "".join(f"\n    [{s * 1000:.1f} ms] {comando}" for s, comando in consultas.sql)
+    log.warning("Requisição lenta: %s %s -> %s em %.1f ms (%d consulta(s), %d com erro, %.1f ms no banco)%s",
+                scope["method"], caminho, status, segundos * 1000, consultas.qtd, consultas.erros,
+                consultas.tempo * 1000, sql)
@@ -1,13 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, Numeric, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class Operadora(Base):
     __tablename__ = "operadoras"
+    # Ordenação por nome com paginação por cursor: (razao_social, registro_ans) > (...) percorre o índice
+    __table_args__ = (Index("idx_operadoras_razao_registro", "razao_social", "registro_ans"),)
 
     registro_ans = Column(Integer, primary_key=True, index=True)
     cnpj = Column(String(20), unique=True, index=True)
-    razao_social = Column(String(255))
+    razao_social = Column(String(255), nullable=False, default="")  # sem nome: "" (a carga preenche)
     modalidade = Column(String(100))
     uf = Column(String(2))
 
@@ -15,6 +17,8 @@ class Operadora(Base):
 
 class Despesa(Base):
     __tablename__ = "despesas"
+    # Chave natural: uma linha por operadora e trimestre (recarga idempotente via upsert)
+    __table_args__ = (UniqueConstraint("registro_ans", "ano", "trimestre", name="uq_despesa_trimestre"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     
@@ -37,4 +41,48 @@ class DespesaAgregada(Base):
     total_despesas = Column(Numeric(15, 2))
     media_despesas = Column(Numeric(15, 2))
     desvio_padrao = Column(Numeric(15, 2))
-    data_processamento = Column(Date) 
\ No newline at end of file
+    data_processamento = Column(Date)
+
+class VersaoDados(Base):
+    """Carimbo incrementado a cada carga do ETL; invalida caches e ETags da API."""
+    __tablename__ = "versao_dados"
+
+    id = Column(Integer, primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime)
+
+class ResumoOperadoraTrimestre(Base):
+    """Despesa de cada operadora por trimestre, com a UF atual do cadastro (mantido pelo etl.rollups)."""
+    __tablename__ = "resumo_operadora_trimestre"
+    __table_args__ = (Index("idx_resumo_op_trimestre", "ano", "trimestre"),)
+
+    registro_ans = Column(Integer, primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    trimestre = Column(Integer, primary_key=True)
+    uf = Column(String(2))
+    valor = Column(Numeric(15, 2))
+
+class ResumoUFTrimestre(Base):
+    """Total de despesas e nº de operadoras por UF e trimestre (mantido pelo etl.rollups)."""
+    __tablename__ = "resumo_uf_trimestre"
+
+    uf = Column(String(2), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    trimestre = Column(Integer, primary_key=True)
+    total = Column(Numeric(17, 2))
+    qtd_operadoras = Column(Integer)
+
+class ResumoOperadora(Base):
+    """Primeiro e último trimestre de cada operadora, crescimento e trimestres acima da média."""
+    __tablename__ = "resumo_operadora"
+
+    registro_ans = Column(Integer, primary_key=True)
+    razao_social = Column(String(255))
+    uf = Column(String(2), index=True)
+    primeiro_periodo = Column(Integer)  # ano * 10 + trimestre
+    valor_inicial = Column(Numeric(15, 2))
+    ultimo_periodo = Column(Integer)
+    valor_final = Column(Numeric(15, 2))
+    crescimento_percentual = Column(Float, index=True)
+    qtd_trimestres = Column(Integer)
+    qtd_trimestres_acima_media = Column(Integer, index=True)
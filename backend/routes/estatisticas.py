@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
+from typing import List
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from .. import models, schemas, database
+from ..cache import cache, responder_condicional, versao_dados
 
 router = APIRouter(
     prefix="/api/estatisticas",
@@ -9,11 +11,13 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=schemas.EstatisticasResponse)
-def get_estatisticas(db: Session = Depends(database.get_db)):
-    
-    total_geral = db.query(func.sum(models.DespesaAgregada.total_despesas)).scalar() or 0
-    media_geral = db.query(func.avg(models.DespesaAgregada.total_despesas)).scalar() or 0
+def calcular_estatisticas(db: Session):
+    """Consulta as estatísticas no banco e devolve um dict pronto para JSON (cacheável)."""
+    # SUM e AVG na mesma varredura
+    total_geral, media_geral = db.query(
+        func.sum(models.DespesaAgregada.total_despesas),
+        func.avg(models.DespesaAgregada.total_despesas)
+    ).one()
 
     
     top_5 = db.query(models.DespesaAgregada)\
@@ -31,10 +35,80 @@ def get_estatisticas(db: Session = Depends(database.get_db)):
         for row in distribuicao_uf
     ]
 
+    resposta = schemas.EstatisticasResponse(
+        total_geral=total_geral or 0,
+        media_por_operadora=media_geral or 0,
+        top_5_operadoras=top_5,
+        despesas_por_uf=dados_grafico,
+    )
+    return resposta.model_dump()
+
+
+@router.get("/", response_model=schemas.EstatisticasResponse)
+def get_estatisticas(request: Request, response: Response, db: Session = Depends(database.get_db)):
+    """
+    Estatísticas gerais, servidas do cache enquanto a versão dos dados não muda.
+    Clientes que mandam If-None-Match com o ETag atual recebem 304.
+    """
+    versao = versao_dados(db)
+    nao_modificado = responder_condicional(request, response, f'"estatisticas-v{versao}"')
+    if nao_modificado:
+        return nao_modificado
+
+    chave = f"estatisticas:v{versao}"
+    dados = cache.obter(chave)
+    if dados is None:
+        dados = calcular_estatisticas(db)
+        cache.guardar(chave, dados)
+    return dados
+
+
+# As rotas abaixo leem as tabelas de resumo mantidas pelo ETL (etl.rollups), não a tabela despesas
+
+@router.get("/crescimento", response_model=List[schemas.CrescimentoOperadora])
+def get_crescimento(limit: int = Query(5, ge=1, le=100), db: Session = Depends(database.get_db)):
+    """Operadoras com maior crescimento entre o primeiro e o último trimestre com despesa."""
+    resumo = models.ResumoOperadora
+    return db.query(resumo)\
+        .filter(resumo.crescimento_percentual.is_not(None))\
+        .order_by(desc(resumo.crescimento_percentual))\
+        .limit(limit)\
+        .all()
+
+
+@router.get("/ufs", response_model=List[schemas.ResumoUF])
+def get_despesas_por_uf(limit: int = Query(5, ge=1, le=30), db: Session = Depends(database.get_db)):
+    """UFs com maior despesa total e a média por operadora de cada uma."""
+    # UF atual do cadastro ('ND' se vazia); ver o fim de sql/03_queries_analiticas.sql
+    totais = db.query(
+        models.ResumoUFTrimestre.uf,
+        func.sum(models.ResumoUFTrimestre.total).label("total")
+    ).group_by(models.ResumoUFTrimestre.uf).all()
+    operadoras_por_uf = dict(db.query(
+        models.ResumoOperadora.uf,
+        func.count()
+    ).group_by(models.ResumoOperadora.uf).all())
+
+    ufs = [
+        {"uf": row.uf, "despesa_total": float(row.total or 0),
+         "media_por_operadora": float(row.total or 0) / (operadoras_por_uf.get(row.uf) or 1)}
+        for row in totais
+    ]
+    return sorted(ufs, key=lambda uf: uf["despesa_total"], reverse=True)[:limit]
+
+
+@router.get("/acima-media", response_model=schemas.AcimaMediaResponse)
+def get_acima_media(min_trimestres: int = Query(2, ge=1), db: Session = Depends(database.get_db)):
+    """Quantas operadoras tiveram despesa acima da média global em pelo menos `min_trimestres` trimestres."""
+    total, qtd = db.query(
+        func.sum(models.ResumoUFTrimestre.total),
+        func.sum(models.ResumoUFTrimestre.qtd_operadoras)
+    ).one()
+    qtd_operadoras = db.query(func.count()).select_from(models.ResumoOperadora)\
+        .filter(models.ResumoOperadora.qtd_trimestres_acima_media >= min_trimestres)\
+        .scalar()
     return {
-        "total_geral": total_geral,
-        "media_por_operadora": media_geral,
-        "top_5_operadoras": top_5,
-        "despesas_por_uf": dados_grafico,
-        
-    }
\ No newline at end of file
+        "media_global": float(total) / qtd if qtd else 0.0,
+        "min_trimestres": min_trimestres,
+        "qtd_operadoras": qtd_operadoras,
+    }
@@ -0,0 +1,172 @@
+import csv
+import io
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Float, String, cast, select, type_coerce
+
+from .. import database, models
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Arrow/Parquet são opcionais; o CSV funciona sem pyarrow
+    pa = pq = None
+
+
+router = APIRouter(
+    prefix="/api/export",
+    tags=["exportacao"]
+)
+
+# Linhas por lote lido do cursor do servidor (e por record batch / row group)
+TAMANHO_LOTE = 50_000
+
+COLUNAS = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'UF', 'Modalidade', 'Ano', 'Trimestre', 'DataEvento',
+           'ValorDespesas']
+
+TIPOS_MIDIA = {
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _esquema_arrow():
+    return pa.schema([
+        ('RegistroANS', pa.int32()),
+        ('CNPJ', pa.string()),
+        ('RazaoSocial', pa.string()),
+        ('UF', pa.string()),
+        ('Modalidade', pa.string()),
+        ('Ano', pa.int16()),
+        ('Trimestre', pa.int8()),
+        ('DataEvento', pa.date32()),
+        ('ValorDespesas', pa.float64()),
+    ])
+
+
+def consulta_despesas(ano=None, trimestre=None, uf=None, modalidade=None):
+    """Despesas com os dados da operadora, na ordem da chave única (registro_ans, ano, trimestre)."""
+    despesa, operadora = models.Despesa, models.Operadora
+    stmt = select(
+        despesa.registro_ans, operadora.cnpj, operadora.razao_social, operadora.uf, operadora.modalidade,
+        despesa.ano, despesa.trimestre,
+        # Sem conversão por linha no SQLAlchemy: data como vem do driver (date, ou texto
+        # ISO no SQLite) e valor já como float, em vez de Decimal
+        type_coerce(despesa.data_evento, String), cast(despesa.valor, Float),
+    ).select_from(despesa).outerjoin(operadora, operadora.registro_ans == despesa.registro_ans)
+    if ano is not None:
+        stmt = stmt.where(despesa.ano == ano)
+    if trimestre is not None:
+        stmt = stmt.where(despesa.trimestre == trimestre)
+    if uf:
+        stmt = stmt.where(operadora.uf == uf.upper())
+    if modalidade:
+        stmt = stmt.where(operadora.modalidade == modalidade)
+    return stmt.order_by(despesa.registro_ans, despesa.ano, despesa.trimestre)
+
+
+def _lotes(stmt):
+    # Conexão própria: o gerador roda depois que a rota retorna. stream_results usa cursor
+    # do lado do servidor (onde o driver suporta) e yield_per limita as linhas em memória.
+    with database.engine.connect() as conexao:
+        resultado = conexao.execution_options(stream_results=True, yield_per=TAMANHO_LOTE).execute(stmt)
+        for lote in resultado.partitions():
+            yield lote
+
+
+class _Destino(io.RawIOBase):
+    """Arquivo só de escrita que acumula bytes até o próximo `esvaziar()`."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        # O ParquetWriter usa a posição para os offsets do rodapé: conta tudo o que já saiu
+        return self._posicao
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _array(valores, tipo):
+    if tipo == pa.date32() and isinstance(next((v for v in valores if v is not None), None), str):
+        return pa.array(valores, type=pa.string()).cast(tipo)
+    return pa.array(valores, type=tipo)
+
+
+def _lote_arrow(lote, esquema):
+    colunas = list(zip(*lote))
+    return pa.RecordBatch.from_arrays(
+        [_array(valores, campo.type) for valores, campo in zip(colunas, esquema)], schema=esquema)
+
+
+def gerar_csv(stmt):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    escritor.writerow(COLUNAS)
+    for lote in _lotes(stmt):
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gerar_arrow(stmt):
+    esquema, destino = _esquema_arrow(), _Destino()
+    with pa.ipc.new_stream(destino, esquema) as escritor:
+        for lote in _lotes(stmt):
+            escritor.write_batch(_lote_arrow(lote, esquema))
+            yield destino.esvaziar()
+    yield destino.esvaziar()
+
+
+def gerar_parquet(stmt):
+    esquema, destino = _esquema_arrow(), _Destino()
+    with pq.ParquetWriter(destino, esquema, compression='snappy') as escritor:
+        for lote in _lotes(stmt):
+            escritor.write_batch(_lote_arrow(lote, esquema))  # um row group por lote
+            yield destino.esvaziar()
+    yield destino.esvaziar()
+
+
+GERADORES = {"csv": gerar_csv, "arrow": gerar_arrow, "parquet": gerar_parquet}
+
+
+@router.get("/despesas")
+def exportar_despesas(
+    formato: Literal["csv", "arrow", "parquet"] = Query("csv", description="csv (;), arrow (IPC stream) ou parquet"),
+    ano: Optional[int] = Query(None),
+    trimestre: Optional[int] = Query(None, ge=1, le=4),
+    uf: Optional[str] = Query(None, min_length=2, max_length=2),
+    modalidade: Optional[str] = Query(None),
+):
+    """
+    Exporta as despesas (com CNPJ, razão social, UF e modalidade da operadora) em
+    fluxo, lote a lote: a memória do servidor não cresce com o tamanho do resultado.
+    """
+    if formato != "csv" and pa is None:
+        raise HTTPException(status_code=501, detail=f"O formato '{formato}' requer o pacote pyarrow no servidor.")
+
+    stmt = consulta_despesas(ano, trimestre, uf, modalidade)
+    return StreamingResponse(
+        GERADORES[formato](stmt),
+        media_type=TIPOS_MIDIA[formato],
+        headers={"Content-Disposition": f'attachment; filename="despesas.{formato}"'},
+    )
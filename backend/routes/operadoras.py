@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
 from typing import List
-from sqlalchemy import or_ 
-from typing import List, Optional 
+from sqlalchemy import Integer, and_, func, literal, select, tuple_
+from typing import List, Literal, Optional 
+import base64
+import json
 import math
 import re
 
 
 from .. import models, schemas, database
+from .. import busca, serializacao
+from ..cache import cache, versao_dados
 
 
 router = APIRouter(
@@ -20,48 +24,117 @@ def limpar_cnpj(cnpj: str) -> str:
     return re.sub(r'\D', '', cnpj)
 
 
+def buscar_operadora_por_cnpj(db: Session, cnpj_limpo: str):
+    """Operadora pelo CNPJ (coluna UNIQUE e indexada: uma busca no índice)."""
+    return db.query(models.Operadora).filter(models.Operadora.cnpj == cnpj_limpo).first()
+
+
+ORDENACOES = {
+    "registro_ans": lambda: (models.Operadora.registro_ans,),
+    # Coluna sem função em volta (NOT NULL, sem nome vira ""): o filtro do cursor usa o índice
+    "razao_social": lambda: (models.Operadora.razao_social, models.Operadora.registro_ans),
+}
+
+
+def codificar_cursor(valores) -> str:
+    """Cursor opaco: a chave de ordenação da última linha da página, em base64."""
+    return base64.urlsafe_b64encode(json.dumps(valores, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor: str, qtd_colunas: int) -> list:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        valores = None
+    if not isinstance(valores, list) or len(valores) != qtd_colunas:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+    return valores
+
+
+def contar_operadoras(query, db: Session) -> int:
+    """COUNT da tabela, em cache até a próxima carga do ETL."""
+    chave = f"operadoras:total:v{versao_dados(db)}"
+    total = cache.obter(chave)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.guardar(chave, total)
+    return total
+
+
+def _listar_busca(search, page, limit, paginacao, cursor, incluir_total, db):
+    """
+    Busca pelo índice em memória (backend.busca): resultados por relevância. No modo
+    cursor, o cursor guarda a posição no ranking.
+    """
+    ranking = busca.obter_indice(db).buscar(search)
+    total_registros = len(ranking)
+    total_pages = math.ceil(total_registros / limit)
+
+    if cursor is not None or paginacao == "cursor":
+        inicio = decodificar_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(inicio, int) or inicio < 0:
+            raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+        pagina_atual = None
+    else:
+        inicio = (page - 1) * limit
+        pagina_atual = page
+
+    ids = ranking[inicio:inicio + limit]
+    linhas = db.query(*serializacao.colunas_operadora()).filter(models.Operadora.registro_ans.in_(ids)).all()
+    por_id = {linha.registro_ans: linha for linha in linhas}
+    operadoras = serializacao.operadoras(por_id[i] for i in ids if i in por_id)
+    fim = inicio + limit
+    next_cursor = codificar_cursor([fim]) if pagina_atual is None and fim < total_registros else None
+
+    return serializacao.RespostaJSON(serializacao.pagina(
+        operadoras, total_registros if incluir_total else None, pagina_atual, limit,
+        total_pages if incluir_total else None, next_cursor))
+
+
 @router.get("/", response_model=schemas.OperadoraResponse)
 def list_operadoras(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    search: Optional[str] = Query(None, description="Busca por Razão Social ou CNPJ"),
+    search: Optional[str] = Query(None, description="Busca por Razão Social ou prefixo de CNPJ (ordenada por relevância)"),
+    paginacao: Literal["offset", "cursor"] = Query("offset", description="offset (page/limit) ou cursor (keyset)"),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior (implica paginacao=cursor)"),
+    ordenar: Literal["registro_ans", "razao_social"] = Query("registro_ans"),
+    incluir_total: bool = Query(True, description="Inclui total/total_pages (contagem em cache)"),
     db: Session = Depends(database.get_db)
 ):
-    
-    query = db.query(models.Operadora)
-
-    
-    if search:
-        
-        termo_limpo = search.strip()
-        search_cnpj = re.sub(r'\D', '', termo_limpo)
-        
-        
-        query = query.filter(
-            or_(
-                models.Operadora.razao_social.like(f"%{termo_limpo}%"),
-                models.Operadora.cnpj.like(f"%{search_cnpj}%") if search_cnpj else False
-            )
-        )
-
-    
-    total_registros = query.count()
+    # Só as colunas da resposta, como tuplas, serializadas direto (sem ORM -> Pydantic)
+    query = db.query(*serializacao.colunas_operadora())
+
+    if search and search.strip():
+        return _listar_busca(search, page, limit, paginacao, cursor, incluir_total, db)
+
+    chave_ordem = ORDENACOES[ordenar]()
+    total_registros = contar_operadoras(query, db) if incluir_total else None
+    total_pages = math.ceil(total_registros / limit) if total_registros is not None else None
+    query = query.order_by(*chave_ordem)
+
+    if cursor is not None or paginacao == "cursor":
+        # Keyset: continua depois da última chave vista, sem OFFSET
+        if cursor:
+            ultima = decodificar_cursor(cursor, len(chave_ordem))
+            query = query.filter(tuple_(*chave_ordem) > tuple_(*ultima))
+        linhas = query.limit(limit + 1).all()
+        operadoras = linhas[:limit]
+        next_cursor = None
+        if len(linhas) > limit:
+            ultima_linha = operadoras[-1]
+            valores = [ultima_linha.registro_ans] if ordenar == "registro_ans" else \
+                [ultima_linha.razao_social, ultima_linha.registro_ans]
+            next_cursor = codificar_cursor(valores)
+        return serializacao.RespostaJSON(serializacao.pagina(
+            serializacao.operadoras(operadoras), total_registros, None, limit, total_pages, next_cursor))
 
     
     skip = (page - 1) * limit
     operadoras = query.offset(skip).limit(limit).all()
-    
-    total_pages = math.ceil(total_registros / limit) if limit > 0 else 1
 
-    return {
-        "data": operadoras,
-        "meta": {
-            "total": total_registros,
-            "page": page,
-            "limit": limit,
-            "total_pages": total_pages
-        }
-    }
+    return serializacao.RespostaJSON(serializacao.pagina(
+        serializacao.operadoras(operadoras), total_registros, page, limit, total_pages))
 
 @router.get("/{cnpj}", response_model=schemas.OperadoraDetalhe)
 def get_operadora(
@@ -81,7 +154,7 @@ def get_operadora(
             detail="CNPJ inválido. O valor deve conter 14 dígitos numéricos."
         )
 
-    operadora = db.query(models.Operadora).filter(models.Operadora.cnpj == cnpj_limpo).first()
+    operadora = buscar_operadora_por_cnpj(db, cnpj_limpo)
 
     if not operadora:
         raise HTTPException(
@@ -92,22 +165,88 @@ def get_operadora(
     return operadora
 
 
+def _linha_despesa(linha) -> dict:
+    return {
+        "id": linha.id,
+        "ano": linha.ano,
+        "trimestre": linha.trimestre,
+        "data_evento": linha.data_evento.isoformat() if linha.data_evento else None,
+        "valor": round(float(linha.valor or 0), 2),
+    }
+
+
 @router.get("/{cnpj}/despesas", response_model=List[schemas.DespesaBase])
 def get_operadora_despesas(
     cnpj: str = Path(..., title="CNPJ"),
+    ano_inicio: Optional[int] = Query(None, ge=1900),
+    trimestre_inicio: Optional[int] = Query(None, ge=1, le=4, description="Com ano_inicio: início do período"),
+    ano_fim: Optional[int] = Query(None, ge=1900),
+    trimestre_fim: Optional[int] = Query(None, ge=1, le=4, description="Com ano_fim: fim do período"),
+    agrupar: Literal["trimestre", "ano"] = Query("trimestre", description="Soma por trimestre ou por ano"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(database.get_db)
 ):
     """
-    Retorna o histórico de despesas de uma operadora específica.
+    Retorna o histórico de despesas de uma operadora específica, do mais antigo
+    para o mais recente. Uma única consulta (operadora LEFT JOIN despesas pelo CNPJ)
+    filtra, agrega e pagina; o total de linhas vai no header X-Total-Count.
     """
     cnpj_limpo = limpar_cnpj(cnpj)
-
-    operadora = db.query(models.Operadora).filter(models.Operadora.cnpj == cnpj_limpo).first()
-
-    if not operadora:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Operadora com CNPJ {cnpj} não encontrada."
+    Despesa = models.Despesa
+
+    # Filtros no ON do LEFT JOIN: a operadora sem despesas no período ainda volta (e não é 404)
+    periodo = Despesa.ano * 10 + Despesa.trimestre
+    condicoes = [Despesa.registro_ans == models.Operadora.registro_ans]
+    if ano_inicio is not None:
+        condicoes.append(periodo >= ano_inicio * 10 + (trimestre_inicio or 1))
+    elif trimestre_inicio is not None:
+        condicoes.append(Despesa.trimestre >= trimestre_inicio)
+    if ano_fim is not None:
+        condicoes.append(periodo <= ano_fim * 10 + (trimestre_fim or 4))
+    elif trimestre_fim is not None:
+        condicoes.append(Despesa.trimestre <= trimestre_fim)
+
+    if agrupar == "trimestre":
+        chaves = (Despesa.ano, Despesa.trimestre)
+        trimestre = Despesa.trimestre
+    else:
+        chaves = (Despesa.ano,)
+        trimestre = literal(None, Integer)
+
+    stmt = (
+        select(
+            func.min(Despesa.id).label("id"),
+            Despesa.ano,
+            trimestre.label("trimestre"),
+            func.min(Despesa.data_evento).label("data_evento"),
+            func.sum(Despesa.valor).label("valor"),
+            func.count().over().label("total"),
         )
+        .select_from(models.Operadora)
+        .outerjoin(Despesa, and_(*condicoes))
+        .where(models.Operadora.cnpj == cnpj_limpo)
+        .group_by(*chaves)
+        .order_by(*chaves)
+        .offset((page - 1) * limit)
+        .limit(limit)
+    )
+    linhas = db.execute(stmt).all()
+
+    if linhas:
+        # Operadora sem despesas no período: a única linha do LEFT JOIN vem com ano nulo
+        total = linhas[0].total if linhas[0].ano is not None else 0
+        linhas = [l for l in linhas if l.ano is not None]
+    else:
+        # Página além do fim (caso raro): confere a operadora e conta os grupos à parte
+        existe = db.query(models.Operadora.registro_ans).filter(models.Operadora.cnpj == cnpj_limpo).first()
+        if not existe:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"Operadora com CNPJ {cnpj} não encontrada."
+            )
+        grupos = stmt.order_by(None).offset(None).limit(None).subquery()
+        total = db.execute(select(func.count()).select_from(grupos).where(grupos.c.ano.is_not(None))).scalar()
 
-    return operadora.despesas
\ No newline at end of file
+    # Serializa direto das linhas, sem montar objetos ORM/Pydantic por despesa
+    return serializacao.RespostaJSON([_linha_despesa(l) for l in linhas], headers={"X-Total-Count": str(total)})
@@ -5,7 +5,7 @@ from datetime import date
 
 class OperadoraBase(BaseModel):
     registro_ans: int = Field(..., alias="RegistroANS")
-    cnpj: str = Field(..., alias="CNPJ")
+    cnpj: Optional[str] = Field(None, alias="CNPJ")  # nulo quando o cadastro repete o CNPJ de outra operadora
     razao_social: str = Field(..., alias="RazaoSocial")
     uf: Optional[str] = Field(None, alias="UF") 
     modalidade: Optional[str] = Field(None, alias="Modalidade")
@@ -20,7 +20,7 @@ class OperadoraDetalhe(OperadoraBase):
 class DespesaBase(BaseModel):
     id: int
     ano: int
-    trimestre: int
+    trimestre: Optional[int] = None  # nulo no histórico agrupado por ano
     data_evento: Optional[date] = None
     valor: float
     
@@ -29,10 +29,13 @@ class DespesaBase(BaseModel):
 
 
 class PaginationMeta(BaseModel):
-    total: int
-    page: int
+    # total/total_pages ficam nulos quando o cliente dispensa a contagem (incluir_total=false)
+    total: Optional[int] = None
+    page: Optional[int] = None
     limit: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    # Paginação por cursor: passe de volta em ?cursor= para buscar a próxima página
+    next_cursor: Optional[str] = None
 
 class OperadoraResponse(BaseModel):
     data: List[OperadoraBase]
@@ -58,4 +61,28 @@ class EstatisticasResponse(BaseModel):
     total_geral: float
     media_por_operadora: float
     top_5_operadoras: List[TopOperadora]
-    despesas_por_uf: List[DespesaUF]  
\ No newline at end of file
+    despesas_por_uf: List[DespesaUF]  
+
+class CrescimentoOperadora(BaseModel):
+    registro_ans: int
+    razao_social: Optional[str] = None
+    primeiro_periodo: int
+    valor_inicial: float
+    ultimo_periodo: int
+    valor_final: float
+    crescimento_percentual: float
+
+    class Config:
+        from_attributes = True
+
+
+class ResumoUF(BaseModel):
+    uf: str
+    despesa_total: float
+    media_por_operadora: float
+
+
+class AcimaMediaResponse(BaseModel):
+    media_global: float
+    min_trimestres: int
+    qtd_operadoras: int
@@ -0,0 +1,65 @@
+"""Serialização rápida das listagens: colunas como tuplas direto para JSON, sem ORM nem Pydantic"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+from . import models, schemas
+
+try:
+    import orjson  # opcional: sem ele, cai no json da biblioteca padrão
+except ImportError:
+    orjson = None
+
+
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def para_json(conteudo) -> bytes:
+    """
+    JSON compacto em UTF-8 sem escapes. Sem orjson, sai byte a byte igual ao JSONResponse
+    do FastAPI; com orjson, os valores são os mesmos, mas não os bytes: floats podem sair
+    com outra grafia, NaN/inf viram null (o json padrão recusa) e datetimes seguem a RFC 3339.
+    """
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao)
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_padrao).encode("utf-8")
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return para_json(content)
+
+
+def _colunas(schema, modelo):
+    # Chaves da resposta vêm dos aliases do schema, na ordem dos campos (RegistroANS, CNPJ, ...)
+    return [(campo.alias or nome, getattr(modelo, nome)) for nome, campo in schema.model_fields.items()]
+
+
+COLUNAS_OPERADORA = _colunas(schemas.OperadoraBase, models.Operadora)
+CHAVES_OPERADORA = tuple(chave for chave, _ in COLUNAS_OPERADORA)
+
+
+def colunas_operadora():
+    """Colunas para db.query(...): as linhas saem como tuplas, na ordem de CHAVES_OPERADORA."""
+    return [coluna for _, coluna in COLUNAS_OPERADORA]
+
+
+def operadoras(linhas) -> list:
+    return [dict(zip(CHAVES_OPERADORA, linha)) for linha in linhas]
+
+
+def pagina(dados, total, page, limit, total_pages, next_cursor=None) -> dict:
+    """Corpo do OperadoraResponse, com todas as chaves de PaginationMeta na ordem do schema."""
+    return {
+        "data": dados,
+        "meta": {"total": total, "page": page, "limit": limit, "total_pages": total_pages,
+                 "next_cursor": next_cursor},
+    }
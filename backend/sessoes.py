@@ -0,0 +1,75 @@
+"""Como cada rota recebe e devolve sua sessão do banco (síncrona ou AsyncSession, com DB_ASYNC=1)"""
+import functools
+import inspect
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database
+
+
+def rota_async(endpoint):
+    """
+    Transforma uma rota síncrona (que recebe `db: Session`) em `async def` com
+    AsyncSession, via `AsyncSession.run_sync`: as consultas aguardam o driver assíncrono.
+
+    Limitação: a rota inteira roda no event loop, não só o SQL. Montar o índice de
+    busca, ranquear, serializar etc. bloqueia as demais requisições enquanto dura;
+    por isso o modo assíncrono é opcional (DB_ASYNC=1) e fica desligado por padrão.
+    """
+    assinatura = inspect.signature(endpoint)
+
+    @functools.wraps(endpoint)
+    async def rota(**kwargs):
+        db = kwargs.pop("db")
+        return await db.run_sync(lambda sessao: endpoint(**kwargs, db=sessao))
+
+    rota.__signature__ = assinatura.replace(parameters=[
+        p.replace(annotation=AsyncSession, default=Depends(database.get_async_db)) if p.name == "db" else p
+        for p in assinatura.parameters.values()
+    ])
+    del rota.__wrapped__  # o FastAPI leria a assinatura síncrona através dele
+    return rota
+
+
+def rota_sync(endpoint):
+    """
+    Fecha a sessão assim que a rota retorna. Sem isso, a conexão só volta ao pool depois
+    que a resposta é serializada, o que também pede uma thread do threadpool: com mais
+    requisições que conexões, as threads esperando conexão travam as que iam devolvê-la.
+    """
+    @functools.wraps(endpoint)
+    def rota(**kwargs):
+        try:
+            return endpoint(**kwargs)
+        finally:
+            kwargs["db"].close()  # os objetos já carregados continuam legíveis (desanexados)
+
+    return rota
+
+
+# Tudo o que add_api_route aceita e o APIRoute guarda (status_code, responses, dependencies,
+# response_class, response_model_exclude_*, deprecated...), para não perder opções ao recriar
+_OPCOES_ROTA = [nome for nome in inspect.signature(APIRouter.add_api_route).parameters
+                if nome not in ("self", "path", "endpoint", "methods", "route_class_override")]
+
+
+def _converter(router, adaptar):
+    novo = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        endpoint = adaptar(route.endpoint) if "db" in inspect.signature(route.endpoint).parameters else route.endpoint
+        novo.add_api_route(route.path, endpoint, methods=list(route.methods),
+                           **{nome: getattr(route, nome) for nome in _OPCOES_ROTA})
+    return novo
+
+
+def router_sync(router: APIRouter) -> APIRouter:
+    return _converter(router, rota_sync)
+
+
+def router_async(router: APIRouter) -> APIRouter:
+    """Mesmas rotas (caminhos, modelos de resposta e documentação) com endpoints assíncronos."""
+    return _converter(router, rota_async)
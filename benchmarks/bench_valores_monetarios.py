@@ -0,0 +1,40 @@
+"""(Benchmark: limpeza de valores monetários linha a linha vs vetorizada)
+
+Uso: python -m benchmarks.bench_valores_monetarios [qtd_linhas]
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+from etl.downloader import limpar_valor_monetario, limpar_valores_monetarios
+
+
+def gerar_valores(qtd, semente=42):
+    rng = random.Random(semente)
+    valores = []
+    for _ in range(qtd):
+        texto = f"{rng.randrange(0, 10 ** 9):,}".replace(",", ".") + f",{rng.randrange(0, 100):02d}"
+        valores.append(f"({texto})" if rng.random() < 0.1 else texto)
+    return pd.Series(valores, dtype=object)
+
+
+def medir(funcao, serie, repeticoes=3):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(serie)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+if __name__ == "__main__":
+    qtd = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    serie = gerar_valores(qtd)
+    t_linha = medir(lambda s: s.apply(limpar_valor_monetario), serie)
+    t_vetor = medir(limpar_valores_monetarios, serie)
+    print(f"📏 {qtd:,} valores")
+    print(f"   linha a linha (apply): {t_linha:.3f}s ({qtd / t_linha:,.0f} valores/s)")
+    print(f"   vetorizada:            {t_vetor:.3f}s ({qtd / t_vetor:,.0f} valores/s)")
+    print(f"   ⚡ {t_linha / t_vetor:.1f}x mais rápida")
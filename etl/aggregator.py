@@ -1,127 +1,181 @@
 """(Lógica de enriquecimento e agregação - Teste 2.2 e 2.3)"""
 import pandas as pd
 import os
-import requests
-import zipfile
+from . import cache, cadastro, esquema, instrumentacao
+from .downloader import criar_sessao
 
-def baixar_cadastro_operadoras():
+URL_CADOP = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
+CAMINHO_CADOP = cadastro.CAMINHO_CADOP
+
+def atualizar_cadastro():
     """
-    Baixa o CSV de operadoras ativas direto da ANS.
-    Retorna o DataFrame com os dados cadastrais limpos.
+    Revalida a cópia local do Relatorio_cadop.csv com GET condicional.
+    Retorna o sha256 da cópia em uso.
     """
-    print(">>> [Enriquecimento] Baixando dados cadastrais das operadoras...")
-    url = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
-    local_path = os.path.join("data", "Relatorio_cadop.csv")
-
     os.makedirs("data", exist_ok=True)
-
     try:
-        if not os.path.exists(local_path):
-            r = requests.get(url)
-            r.raise_for_status()
-            with open(local_path, 'wb') as f:
-                f.write(r.content)
+        sessao = criar_sessao()
+        resultado = cache.baixar_com_cache(sessao, URL_CADOP, CAMINHO_CADOP)
+        sessao.close()
+        if resultado['modificado']:
             print("   ✅ Download do cadastro concluído.")
         else:
-            print("   ℹ️ Arquivo de cadastro já existe localmente.")
-
-        try:
-            df = pd.read_csv(local_path, sep=';', encoding='latin1', on_bad_lines='skip')
-        except:
-            df = pd.read_csv(local_path, sep=';', encoding='utf-8', on_bad_lines='skip')
-      
-        mapa_cols = {
-            'REGISTRO_OPERADORA': 'RegistroANS',
-            'Registro_ANS': 'RegistroANS',
-            'CNPJ': 'CNPJ_Cad',
-            'Razao_Social': 'RazaoSocial_Cad',
-            'Modalidade': 'Modalidade',
-            'UF': 'UF',
-            'Reg_ANS': 'RegistroANS', 
-            'Codigo_ANS': 'RegistroANS'
-        }
-        
-        df = df.rename(columns=lambda x: mapa_cols.get(x, x))
-        
-        if 'RegistroANS' in df.columns:
-            
-            df['RegistroANS'] = df['RegistroANS'].astype(str).str.replace(r'\.0$', '', regex=True)
-            
-            # Padronização do CNPJ
-            if 'CNPJ_Cad' in df.columns:
-                df['CNPJ_Cad'] = df['CNPJ_Cad'].astype(str).str.replace(r'[^0-9]', '', regex=True)
-                df['CNPJ_Cad'] = df['CNPJ_Cad'].str.zfill(14) 
-            
-            return df
-        else:
-            print("❌ Erro: Coluna RegistroANS não encontrada no arquivo de cadastro.")
-            return pd.DataFrame()
+            print("   ℹ️ Cadastro inalterado no servidor, usando cópia local.")
+        return resultado['sha256']
+    except Exception as e:
+        if not os.path.exists(CAMINHO_CADOP): raise
+        print(f"   ⚠️ Não foi possível revalidar o cadastro ({e}). Usando cópia local.")
+        return cache.calcular_sha256(CAMINHO_CADOP)
 
+def baixar_cadastro_operadoras(revalidar=True):
+    """
+    Revalida o CSV de operadoras ativas da ANS e devolve o cadastro indexado
+    (etl.cadastro), lido do snapshot binário quando o CSV não mudou.
+    Retorna None se não houver cadastro disponível.
+    """
+    print(">>> [Enriquecimento] Carregando dados cadastrais das operadoras...")
+    try:
+        if revalidar:
+            atualizar_cadastro()
+        cadop = cadastro.carregar(CAMINHO_CADOP)
+        print(f"   ✅ Cadastro com {len(cadop)} operadoras.")
+        return cadop
     except Exception as e:
         print(f"❌ Erro ao baixar/ler cadastro: {e}")
-        return pd.DataFrame()
+        return None
 
-def enriquecer_dados(df_despesas):
+@instrumentacao.medir('enriquecimento')
+def enriquecer_dados(df_despesas, cadop=None):
     """
-    Realiza o Left Join entre as Despesas e o Cadastro.
+    Realiza o Left Join entre as Despesas e o Cadastro (lookup vetorizado pelo
+    RegistroANS inteiro). `cadop` permite reaproveitar um cadastro já carregado.
     """
     print(">>> [Enriquecimento] Cruzando dados financeiros com cadastrais...")
+    # Lookup por chave: sai uma linha para cada linha que entra
+    instrumentacao.registrar(linhas_entrada=len(df_despesas), linhas_saida=len(df_despesas))
     
     df_despesas['RazaoSocial'] = df_despesas['RazaoSocial'].astype('object')
     df_despesas['CNPJ'] = df_despesas['CNPJ'].astype('object')
-    df_despesas['RegistroANS'] = df_despesas['RegistroANS'].astype(str).str.replace(r'\.0$', '', regex=True)
+    esquema.aplicar(df_despesas, ['RegistroANS'])
 
-    df_cadop = baixar_cadastro_operadoras()
+    if cadop is None:
+        cadop = baixar_cadastro_operadoras()
     
-    if df_cadop.empty:
+    if cadop is None or len(cadop) == 0:
         print("⚠️ Atenção: Cadastro vazio ou inválido. O enriquecimento falhará.")
        
         df_despesas['UF'] = 'ND'
         df_despesas['Modalidade'] = 'Desconhecida'
-        return df_despesas
+        return esquema.aplicar(df_despesas)
 
-    df_merged = pd.merge(df_despesas, 
-                         df_cadop[['RegistroANS', 'CNPJ_Cad', 'RazaoSocial_Cad', 'Modalidade', 'UF']], 
-                         on='RegistroANS', 
-                         how='left')
-    
+    df_cad = cadop.buscar(df_despesas['RegistroANS'])
+    df_merged = df_despesas
 
-    df_merged['CNPJ'] = df_merged['CNPJ'].fillna(df_merged['CNPJ_Cad'])
+    df_merged['CNPJ'] = df_merged['CNPJ'].fillna(df_cad['CNPJ'].astype('object'))
     
     mask_nome_ruim = df_merged['RazaoSocial'].isin([None, 'NÃO INFORMADO', 'RAZAO SOCIAL NAO INFORMADA', '', 'nan']) | df_merged['RazaoSocial'].isna()
-    df_merged.loc[mask_nome_ruim, 'RazaoSocial'] = df_merged.loc[mask_nome_ruim, 'RazaoSocial_Cad']
-
-    df_merged['UF'] = df_merged['UF'].fillna('ND')
+    df_merged.loc[mask_nome_ruim, 'RazaoSocial'] = df_cad.loc[mask_nome_ruim, 'RazaoSocial'].astype('object')
 
-    df_merged = df_merged.drop(columns=['CNPJ_Cad', 'RazaoSocial_Cad'])
+    df_merged['Modalidade'] = df_cad['Modalidade'].astype('object')
+    df_merged['UF'] = df_cad['UF'].fillna('ND').astype('object')
     
     print(f"   ✅ Enriquecimento concluído.")
-    return df_merged
+    return esquema.aplicar(df_merged)
 
-def agregar_dados(df):
+COLUNAS_ESTADO = ['n', 'soma', 'media', 'm2']
+
+
+def _grupos(df):
+    grupos = ['RazaoSocial', 'RegistroANS', 'UF']
+    if 'Modalidade' in df.columns:
+        grupos.append('Modalidade')
+    return grupos
+
+
+def _fundir_estados(a, b):
+    # Fórmula de Chan et al. para combinar (n, média, M2) de dois conjuntos disjuntos
+    a, b = a.align(b, join='outer', fill_value=0)
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    return pd.DataFrame({
+        'n': n.astype('int64'),
+        'soma': a['soma'] + b['soma'],
+        'media': a['media'] + delta * (b['n'] / n),
+        'm2': a['m2'] + b['m2'] + delta ** 2 * (a['n'] * b['n'] / n),
+    })
+
+
+class AgregadorIncremental:
+    """
+    Estatísticas por operadora acumuladas bloco a bloco. Guarda só o estado
+    (n, soma, média, M2) de cada grupo, então a memória cresce com o número de
+    operadoras e não com o de linhas. Estados de workers diferentes se combinam
+    com `fundir`.
+    """
+
+    def __init__(self):
+        self.grupos = None
+        self.estado = None
+        self.linhas = 0
+
+    def adicionar(self, df):
+        if df.empty: return self
+        if not pd.api.types.is_numeric_dtype(df['ValorDespesas']):
+            df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
+        if self.grupos is None:
+            self.grupos = _grupos(df)
+
+        g = df.groupby(self.grupos, observed=True)['ValorDespesas']
+        parcial = g.agg(['count', 'sum', 'mean']).rename(columns={'count': 'n', 'sum': 'soma', 'mean': 'media'})
+        # M2 do bloco em duas passadas (estável); entre blocos vale a fusão de Chan
+        parcial['m2'] = g.var(ddof=0) * parcial['n']
+        parcial = parcial[parcial['n'] > 0]
+        self._incorporar(parcial)
+        self.linhas += len(df)
+        return self
+
+    def fundir(self, outro):
+        if outro.estado is None: return self
+        self.grupos = self.grupos or outro.grupos
+        self._incorporar(outro.estado)
+        self.linhas += outro.linhas
+        return self
+
+    def _incorporar(self, parcial):
+        self.estado = parcial[COLUNAS_ESTADO] if self.estado is None else _fundir_estados(self.estado, parcial)
+
+    def resultado(self):
+        """Mesmas colunas de `groupby(...).agg(['sum', 'mean', 'std', 'count'])`, ordenado pelo total."""
+        if self.estado is None:
+            return pd.DataFrame(columns=(self.grupos or []) + ['TotalDespesas', 'MediaTrimestral',
+                                                              'DesvioPadrao', 'QtdTrimestres'])
+        e = self.estado
+        desvio = (e['m2'] / (e['n'] - 1)).where(e['n'] > 1) ** 0.5
+        df_agregado = pd.DataFrame({
+            'TotalDespesas': e['soma'],
+            'MediaTrimestral': e['media'],
+            'DesvioPadrao': desvio,
+            'QtdTrimestres': e['n'],
+        }).reset_index()
+        return esquema.aplicar(df_agregado).sort_values(by='TotalDespesas', ascending=False)
+
+
+@instrumentacao.medir('agregacao')
+def agregar_dados(dados):
     """
     Calcula estatísticas (Soma, Média, Desvio Padrão) por Operadora.
+    Aceita um DataFrame ou um iterável de blocos (ex.: uma partição por vez).
     """
     print(">>> [Agregação] Calculando estatísticas por Operadora...")
 
-    df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
-    
-    grupos = ['RazaoSocial', 'RegistroANS', 'UF']
-    if 'Modalidade' in df.columns:
-        grupos.append('Modalidade')
+    agregador = AgregadorIncremental()
+    for bloco in ([dados] if isinstance(dados, pd.DataFrame) else dados):
+        agregador.adicionar(bloco)
+    df_agregado = agregador.resultado()
+    instrumentacao.registrar(linhas_entrada=agregador.linhas, linhas_saida=len(df_agregado))
 
-    df_agregado = df.groupby(grupos)['ValorDespesas'].agg(['sum', 'mean', 'std', 'count']).reset_index()
-    
-    df_agregado = df_agregado.rename(columns={
-        'sum': 'TotalDespesas',
-        'mean': 'MediaTrimestral',
-        'std': 'DesvioPadrao',
-        'count': 'QtdTrimestres'
-    })
-    
-    df_agregado = df_agregado.sort_values(by='TotalDespesas', ascending=False)
-    
     print(f"   📊 Tabela agregada gerada com {len(df_agregado)} operadoras.")
+    esquema.relatar(df_agregado, "a agregação")
     return df_agregado
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""(Formatos intermediários do ETL: CSV ou Parquet particionado por Ano/Trimestre)"""
+import glob
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from . import esquema, instrumentacao
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet é opcional; o formato CSV funciona sem pyarrow
+    pa = pq = None
+
+FORMATOS = ('csv', 'parquet')
+COLUNAS_CONSOLIDADO = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas']
+COLUNAS_PARTICAO = ['Ano', 'Trimestre']
+
+_RE_PARTICAO = re.compile(r'Ano=(\d+)[\\/]+Trimestre=(\d+)')
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise RuntimeError("O formato 'parquet' requer o pacote pyarrow (pip install pyarrow).")
+
+
+def _esquema_arrow():
+    # Colunas gravadas nos arquivos; Ano/Trimestre ficam no caminho (Ano=.../Trimestre=...)
+    return pa.schema([
+        ('RegistroANS', pa.string()),
+        ('CNPJ', pa.string()),
+        ('RazaoSocial', pa.string()),
+        ('ValorDespesas', pa.float64()),
+    ])
+
+
+def caminho_particao(pasta, ano, trim, nome, formato='csv'):
+    if formato == 'parquet':
+        return os.path.join(pasta, f"Ano={ano}", f"Trimestre={trim}", f"{nome}.parquet")
+    return os.path.join(pasta, f"{nome}.csv")
+
+
+class EscritorParticao:
+    """
+    Grava uma partição bloco a bloco em um arquivo temporário; `concluir()` faz o
+    rename atômico. Se o bloco `with` terminar sem `concluir()`, nada fica no destino.
+    """
+
+    def __init__(self, destino, formato='csv'):
+        if formato not in FORMATOS: raise ValueError(f"Formato desconhecido: {formato}")
+        if formato == 'parquet': _exigir_pyarrow()
+        self.destino = destino
+        self.formato = formato
+        self.tmp = f"{destino}.{os.getpid()}.tmp"
+        self.linhas = 0
+        self._writer = None
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+
+    def escrever(self, df):
+        if self.formato == 'csv':
+            df.to_csv(self.tmp, mode='a', index=False, header=self.linhas == 0, sep=';', encoding='utf-8')
+        else:
+            df = df.drop(columns=COLUNAS_PARTICAO, errors='ignore')
+            # Colunas tipadas pelo esquema (Int32/categoria) são gravadas como texto, como no CSV
+            df = df.astype({c: 'string' for c in ('RegistroANS', 'CNPJ', 'RazaoSocial') if c in df.columns})
+            tabela = pa.Table.from_pandas(df, schema=_esquema_arrow(), preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp, tabela.schema, compression='zstd')
+            self._writer.write_table(tabela)
+        self.linhas += len(df)
+
+    def _fechar(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def concluir(self):
+        self._fechar()
+        os.replace(self.tmp, self.destino)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._fechar()
+        if os.path.exists(self.tmp): os.remove(self.tmp)
+        return False
+
+
+class ColetorMemoria:
+    """
+    Mesma interface de EscritorParticao, mas mantém os blocos em memória
+    (`dados` fica disponível após `concluir()`).
+    """
+
+    def __init__(self):
+        self.blocos = []
+        self.linhas = 0
+        self.dados = None
+
+    def escrever(self, df):
+        self.blocos.append(df)
+        self.linhas += len(df)
+
+    def concluir(self):
+        self.dados = pd.concat(self.blocos, ignore_index=True)
+        self.blocos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.blocos = []
+        return False
+
+
+@instrumentacao.medir('gravacao_consolidado')
+def salvar_consolidado(df, caminho_base, formato='csv'):
+    """
+    Materializa um consolidado que está em memória: `<caminho_base>.csv` ou o dataset
+    Parquet `<caminho_base>/` com uma partição por (Ano, Trimestre).
+    """
+    if formato != 'parquet':
+        return salvar_tabela(df[COLUNAS_CONSOLIDADO], caminho_base, 'csv')
+
+    _exigir_pyarrow()
+    tmp = f"{caminho_base}.{os.getpid()}.tmp"
+    if os.path.exists(tmp): shutil.rmtree(tmp)
+    for (ano, trim), grupo in df.groupby(COLUNAS_PARTICAO, sort=True):
+        with EscritorParticao(caminho_particao(tmp, ano, trim, 'memoria', 'parquet'), 'parquet') as escritor:
+            escritor.escrever(grupo)
+            escritor.concluir()
+    if os.path.exists(caminho_base): shutil.rmtree(caminho_base)
+    os.makedirs(tmp, exist_ok=True)
+    os.replace(tmp, caminho_base)
+    instrumentacao.registrar(linhas_entrada=len(df), bytes_escritos=instrumentacao.tamanho_em_disco(caminho_base))
+    return caminho_base
+
+
+def listar_particoes_parquet(pasta):
+    """Arquivos .parquet de um dataset Ano=/Trimestre=, em ordem (ano, trimestre, nome)."""
+    arquivos = glob.glob(os.path.join(pasta, "Ano=*", "Trimestre=*", "*.parquet"))
+    return sorted(arquivos, key=lambda c: (*map(int, _RE_PARTICAO.search(c).groups()), os.path.basename(c)))
+
+
+def ler_particoes(particoes):
+    """
+    Lê partições (Parquet memory-mapped ou CSV) em um único DataFrame com os tipos
+    de etl.esquema, na ordem recebida.
+    """
+    if not particoes:
+        return esquema.aplicar(pd.DataFrame(columns=COLUNAS_CONSOLIDADO))
+    if not particoes[0].endswith('.parquet'):
+        df = pd.concat([pd.read_csv(c, sep=';', encoding='utf-8', dtype=str) for c in particoes], ignore_index=True)
+        return esquema.aplicar(df[COLUNAS_CONSOLIDADO])
+
+    _exigir_pyarrow()
+    tabelas = []
+    for caminho in particoes:
+        ano, trim = map(int, _RE_PARTICAO.search(caminho).groups())
+        tabela = pq.read_table(caminho, memory_map=True)
+        tabela = tabela.append_column('Ano', pa.array([ano] * len(tabela), pa.int16()))
+        tabela = tabela.append_column('Trimestre', pa.array([trim] * len(tabela), pa.int8()))
+        tabelas.append(tabela)
+    return esquema.aplicar(pa.concat_tables(tabelas).to_pandas()[COLUNAS_CONSOLIDADO])
+
+
+def ler_consolidado(caminho_base, formato='csv'):
+    """
+    Lê o consolidado de despesas: `<caminho_base>.csv` (tudo como texto, como o
+    LOAD DATA espera) ou o dataset Parquet `<caminho_base>/`.
+    """
+    if formato == 'parquet':
+        return ler_particoes(listar_particoes_parquet(caminho_base))
+    return pd.read_csv(f"{caminho_base}.csv", sep=';', encoding='utf-8', dtype=str)
+
+
+def exportar_particoes_csv(particoes, arquivo_csv):
+    """Exporta partições Parquet para um CSV ';' (formato usado por sql/02_import_data.sql)."""
+    _exigir_pyarrow()
+    tmp = f"{arquivo_csv}.tmp"
+    primeira = True
+    for caminho in particoes:
+        df = ler_particoes([caminho])
+        df.to_csv(tmp, mode='w' if primeira else 'a', index=False, header=primeira, sep=';', encoding='utf-8')
+        primeira = False
+    if primeira:
+        pd.DataFrame(columns=COLUNAS_CONSOLIDADO).to_csv(tmp, index=False, sep=';', encoding='utf-8')
+    os.replace(tmp, arquivo_csv)
+
+
+@instrumentacao.medir('gravacao')
+def salvar_tabela(df, caminho_base, formato='csv'):
+    """Grava `df` em `<caminho_base>.csv` ou `<caminho_base>.parquet`. Retorna o caminho gravado."""
+    if formato == 'parquet':
+        _exigir_pyarrow()
+        caminho = f"{caminho_base}.parquet"
+        df.to_parquet(caminho, index=False, compression='zstd')
+    else:
+        caminho = f"{caminho_base}.csv"
+        df.to_csv(caminho, index=False, sep=';', encoding='utf-8')
+    instrumentacao.registrar(linhas_entrada=len(df), bytes_escritos=os.path.getsize(caminho))
+    return caminho
+
+
+def ler_tabela(caminho_base, formato='csv'):
+    if formato == 'parquet':
+        _exigir_pyarrow()
+        return pq.read_table(f"{caminho_base}.parquet", memory_map=True).to_pandas()
+    return pd.read_csv(f"{caminho_base}.csv", sep=';', encoding='utf-8')
@@ -0,0 +1,92 @@
+"""(Cache de downloads da ANS com GET condicional)"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+CAMINHO_MANIFESTO = os.path.join("data", "cache_downloads.json")
+
+_trava = threading.Lock()
+
+
+def carregar_manifesto(caminho_manifesto=CAMINHO_MANIFESTO):
+    """
+    Lê o manifesto {url: {etag, last_modified, tamanho, sha256, caminho}}.
+    """
+    if not os.path.exists(caminho_manifesto): return {}
+    try:
+        with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"   ⚠️ Manifesto de cache corrompido, ignorando: {caminho_manifesto}")
+        return {}
+
+
+def _registrar(url, entrada, caminho_manifesto):
+    # Releitura + escrita atômica sob trava: vários downloads terminam em paralelo
+    with _trava:
+        manifesto = carregar_manifesto(caminho_manifesto)
+        manifesto[url] = entrada
+        os.makedirs(os.path.dirname(caminho_manifesto) or ".", exist_ok=True)
+        tmp = f"{caminho_manifesto}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, caminho_manifesto)
+
+
+def calcular_sha256(caminho, tamanho_bloco=1024 * 1024):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def baixar_com_cache(sessao, url, destino, caminho_manifesto=CAMINHO_MANIFESTO):
+    """
+    Baixa `url` para `destino` usando GET condicional (If-None-Match / If-Modified-Since).
+
+    Retorna {'caminho', 'sha256', 'modificado'}. `modificado` é False quando o servidor
+    responde 304 ou quando o conteúdo baixado tem o mesmo sha256 da versão anterior,
+    permitindo pular também a extração/processamento.
+    """
+    anterior = carregar_manifesto(caminho_manifesto).get(url)
+
+    headers = {}
+    # Só envia cabeçalhos condicionais se a cópia local ainda corresponde ao manifesto
+    if anterior and os.path.exists(destino) and os.path.getsize(destino) == anterior.get('tamanho'):
+        if anterior.get('etag'): headers['If-None-Match'] = anterior['etag']
+        if anterior.get('last_modified'): headers['If-Modified-Since'] = anterior['last_modified']
+
+    with sessao.get(url, headers=headers, stream=True, timeout=60) as r:
+        if r.status_code == 304:
+            return {'caminho': destino, 'sha256': anterior['sha256'], 'modificado': False}
+        r.raise_for_status()
+
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.part"
+        h = hashlib.sha256()
+        tamanho = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+                    h.update(chunk)
+                    tamanho += len(chunk)
+            os.replace(tmp, destino)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+
+        entrada = {
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+            'tamanho': tamanho,
+            'sha256': h.hexdigest(),
+            'caminho': destino,
+            'baixado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    _registrar(url, entrada, caminho_manifesto)
+    modificado = not anterior or anterior.get('sha256') != entrada['sha256']
+    return {'caminho': destino, 'sha256': entrada['sha256'], 'modificado': modificado}
@@ -0,0 +1,143 @@
+"""(Cadastro de operadoras pré-normalizado: snapshot binário indexado por RegistroANS)"""
+import json
+import os
+import threading
+
+import pandas as pd
+
+from . import armazenamento, dialeto
+
+CAMINHO_CADOP = os.path.join("data", "Relatorio_cadop.csv")
+CAMINHO_SNAPSHOT = os.path.join("data", "cadastro_operadoras")
+COLUNAS_CADASTRO = ['CNPJ', 'RazaoSocial', 'Modalidade', 'UF']
+
+_MAPA_COLUNAS = {
+    'REGISTRO_OPERADORA': 'RegistroANS',
+    'Registro_ANS': 'RegistroANS',
+    'Reg_ANS': 'RegistroANS',
+    'Codigo_ANS': 'RegistroANS',
+    'CNPJ': 'CNPJ',
+    'Razao_Social': 'RazaoSocial',
+    'Modalidade': 'Modalidade',
+    'UF': 'UF',
+}
+
+_trava = threading.Lock()
+_em_memoria = {}
+
+
+def chaves_registro(valores):
+    """Converte RegistroANS (texto, '123.0', número) para Int64; o que não for número vira <NA>."""
+    serie = pd.Series(valores, copy=False)
+    if not pd.api.types.is_integer_dtype(serie):
+        serie = pd.to_numeric(serie, errors='coerce')
+        serie = serie.where(serie == serie.round())
+    return serie.astype('Int64')
+
+
+def _normalizar_cnpj(serie):
+    cnpj = serie.astype('string').str.replace(r'\D', '', regex=True)
+    return cnpj.where(cnpj.str.len() > 0).str.zfill(14)
+
+
+def ler_relatorio_cadop(caminho_csv=CAMINHO_CADOP):
+    """Lê e normaliza o Relatorio_cadop.csv. Retorna um DataFrame indexado por RegistroANS (int)."""
+    d = dialeto.obter_dialeto(caminho_csv)
+    df = pd.read_csv(caminho_csv, sep=d['sep'], encoding=d['encoding'], dtype=str, on_bad_lines='skip')
+    df = df.rename(columns=lambda c: _MAPA_COLUNAS.get(c.strip(), c.strip()))
+    if 'RegistroANS' not in df.columns:
+        raise ValueError(f"Coluna RegistroANS não encontrada em {caminho_csv}")
+
+    for coluna in COLUNAS_CADASTRO:
+        if coluna not in df.columns: df[coluna] = None
+    df['RegistroANS'] = chaves_registro(df['RegistroANS'])
+    df['CNPJ'] = _normalizar_cnpj(df['CNPJ'])
+    df = df.dropna(subset=['RegistroANS']).drop_duplicates(subset=['RegistroANS'])
+    return df.set_index('RegistroANS')[COLUNAS_CADASTRO].astype('string')
+
+
+class CadastroOperadoras:
+    """
+    Cadastro indexado por RegistroANS inteiro. As consultas são vetorizadas sobre o
+    índice (`get_indexer`), sem merge nem limpeza de chave por regex a cada uso.
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def buscar(self, registros):
+        """
+        Colunas cadastrais alinhadas posição a posição com `registros`
+        (<NA> onde a operadora não está no cadastro).
+        """
+        chaves = chaves_registro(registros)
+        posicoes = self.df.index.get_indexer(chaves.fillna(-1).astype('int64'))
+        # take(allow_fill=True) devolve <NA> nas posições -1 (não encontradas)
+        return pd.DataFrame({c: self.df[c].array.take(posicoes, allow_fill=True) for c in COLUNAS_CADASTRO},
+                            index=registros.index if isinstance(registros, pd.Series) else None)
+
+
+def _caminhos_snapshot(caminho_base):
+    formato = 'parquet' if armazenamento.pa is not None else 'pickle'
+    return f"{caminho_base}.{formato}", f"{caminho_base}.json", formato
+
+
+def _assinatura(caminho):
+    st = os.stat(caminho)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _ler_meta(caminho_meta):
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def construir_snapshot(caminho_csv=CAMINHO_CADOP, caminho_base=CAMINHO_SNAPSHOT):
+    """Gera o snapshot binário (Parquet, ou pickle sem pyarrow) a partir do CSV da ANS."""
+    caminho, caminho_meta, formato = _caminhos_snapshot(caminho_base)
+    df = ler_relatorio_cadop(caminho_csv)
+
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    if formato == 'parquet':
+        df.to_parquet(tmp, compression='zstd')
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, caminho)
+
+    meta = {'fonte': caminho_csv, 'assinatura': _assinatura(caminho_csv), 'linhas': len(df)}
+    with open(f"{caminho_meta}.tmp", 'w', encoding='utf-8') as f: json.dump(meta, f, indent=2)
+    os.replace(f"{caminho_meta}.tmp", caminho_meta)
+    print(f"   💾 Snapshot do cadastro gravado: {caminho} ({len(df)} operadoras)")
+    return df
+
+
+def carregar(caminho_csv=CAMINHO_CADOP, caminho_base=CAMINHO_SNAPSHOT):
+    """
+    Retorna o CadastroOperadoras, lido uma única vez por processo. O snapshot é
+    refeito quando o CSV de origem mudou (tamanho/mtime) e relido quando o
+    snapshot em disco foi regravado por outro processo.
+    """
+    caminho, caminho_meta, formato = _caminhos_snapshot(caminho_base)
+    with _trava:
+        meta = _ler_meta(caminho_meta)
+        # Sem o CSV (ex.: no servidor da API) vale o snapshot que existir
+        atual = os.path.exists(caminho) and (
+            not os.path.exists(caminho_csv) or meta.get('assinatura') == _assinatura(caminho_csv))
+
+        chave = (caminho, tuple(_assinatura(caminho)) if atual else None)
+        if chave in _em_memoria: return _em_memoria[chave]
+
+        if atual:
+            df = pd.read_parquet(caminho) if formato == 'parquet' else pd.read_pickle(caminho)
+        else:
+            df = construir_snapshot(caminho_csv, caminho_base)
+            chave = (caminho, tuple(_assinatura(caminho)))
+        _em_memoria.clear()
+        _em_memoria[chave] = CadastroOperadoras(df)
+        return _em_memoria[chave]
@@ -0,0 +1,119 @@
+"""(Detecção de dialeto dos arquivos de entrada: encoding, separador e decimal)"""
+import csv
+import json
+import os
+import re
+import zipfile
+
+TAMANHO_AMOSTRA = 256 * 1024
+SEPARADORES = [';', ',', '\t', '|']
+MAX_LINHAS_AMOSTRA = 200
+
+_RE_DECIMAL_VIRGULA = re.compile(r'^\(?-?\d{1,3}(\.\d{3})*,\d+\)?$|^\(?-?\d+,\d+\)?$')
+_RE_DECIMAL_PONTO = re.compile(r'^\(?-?\d{1,3}(,\d{3})*\.\d+\)?$|^\(?-?\d+\.\d+\)?$')
+
+
+def _decodificar(amostra):
+    if amostra.startswith(b'\xef\xbb\xbf'):
+        return amostra[3:].decode('utf-8', errors='ignore'), 'utf-8-sig'
+    try:
+        return amostra.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError as e:
+        # Um caractere multibyte cortado no fim da amostra não invalida o utf-8
+        if e.start >= len(amostra) - 3:
+            return amostra[:e.start].decode('utf-8'), 'utf-8'
+        return amostra.decode('latin1'), 'latin1'
+
+
+def _escolher_separador(linhas):
+    melhor, melhor_nota = ';', (-1, 0)
+    for sep in SEPARADORES:
+        registros = list(csv.reader(linhas, delimiter=sep))
+        if not registros or len(registros[0]) < 2: continue
+        qtd_campos = len(registros[0])
+        consistencia = sum(len(r) == qtd_campos for r in registros) / len(registros)
+        nota = (consistencia, qtd_campos)
+        if nota > melhor_nota:
+            melhor, melhor_nota = sep, nota
+    return melhor
+
+
+def _escolher_decimal(linhas, sep):
+    if sep == ',': return '.'
+    virgula = ponto = 0
+    for registro in csv.reader(linhas[1:], delimiter=sep):
+        for campo in registro:
+            campo = campo.strip()
+            if _RE_DECIMAL_VIRGULA.match(campo): virgula += 1
+            elif _RE_DECIMAL_PONTO.match(campo): ponto += 1
+    return ',' if virgula > ponto else '.'
+
+
+def detectar_dialeto(amostra):
+    """
+    Escolhe encoding, separador e separador decimal a partir dos primeiros bytes do arquivo.
+    Também estima o tamanho médio da linha, usado para dimensionar a leitura em blocos.
+    """
+    texto, encoding = _decodificar(amostra)
+    # Descarta a última linha da amostra, que pode estar cortada
+    linhas = [l for l in texto.splitlines()[:MAX_LINHAS_AMOSTRA + 1] if l.strip()]
+    if len(linhas) > 1: linhas = linhas[:-1]
+    if not linhas:
+        return {'encoding': encoding, 'sep': ';', 'decimal': ',', 'bytes_por_linha': len(amostra)}
+
+    sep = _escolher_separador(linhas)
+    return {
+        'encoding': encoding,
+        'sep': sep,
+        'decimal': _escolher_decimal(linhas, sep),
+        'bytes_por_linha': max(1, len(amostra) // max(1, amostra.count(b'\n'))),
+    }
+
+
+def _ler_amostra(caminho, membro=None):
+    if membro is None:
+        with open(caminho, 'rb') as f: return f.read(TAMANHO_AMOSTRA)
+    with zipfile.ZipFile(caminho, 'r') as z, z.open(membro) as f:
+        return f.read(TAMANHO_AMOSTRA)
+
+
+def _assinatura(caminho):
+    st = os.stat(caminho)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _caminho_sidecar(caminho):
+    return caminho + ".dialeto.json"
+
+
+def _ler_sidecar(caminho):
+    try:
+        with open(_caminho_sidecar(caminho), 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def salvar_dialeto(caminho, membro, dialeto):
+    """Grava o dialeto no sidecar `<arquivo>.dialeto.json` (uma entrada por membro de ZIP)."""
+    dados = _ler_sidecar(caminho)
+    dados[membro or ''] = {'assinatura': _assinatura(caminho), 'dialeto': dialeto}
+    tmp = f"{_caminho_sidecar(caminho)}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f: json.dump(dados, f, indent=2)
+    os.replace(tmp, _caminho_sidecar(caminho))
+
+
+def obter_dialeto(caminho, membro=None):
+    """
+    Retorna o dialeto de `caminho` (ou do membro de ZIP), usando o sidecar quando o
+    arquivo não mudou desde a última detecção.
+    """
+    entrada = _ler_sidecar(caminho).get(membro or '')
+    if entrada and entrada.get('assinatura') == _assinatura(caminho):
+        return entrada['dialeto']
+
+    dialeto = detectar_dialeto(_ler_amostra(caminho, membro))
+    try:
+        salvar_dialeto(caminho, membro, dialeto)
+    except OSError as e:
+        print(f"      ⚠️ Não foi possível gravar o sidecar de dialeto: {e}")
+    return dialeto
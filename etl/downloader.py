@@ -1,11 +1,27 @@
 import requests
+import io
 import os
 import zipfile
 import gc
+import hashlib
 import re
+import numpy as np
 import pandas as pd
 from bs4 import BeautifulSoup
 import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import armazenamento
+from . import cache
+from . import dialeto
+from . import esquema
+from . import instrumentacao
+from . import manifesto
 
 
 MAPA_COLUNAS = {
@@ -17,15 +33,154 @@ MAPA_COLUNAS = {
     'Descricao': ['ds_conta', 'nm_conta_contabil', 'descricao', 'ds_conta_contabil']
 }
 
+URL_BASE_ANS = "https://dadosabertos.ans.gov.br/FTP/PDA/"
+QTD_TRIMESTRES_PADRAO = 3
+MAX_DOWNLOADS_PADRAO = 4
+MAX_CONEXOES_POR_HOST = 4
+MARCADOR_EXTRACAO = ".origem_sha256"
+SEPARADOR_ZIP = manifesto.SEPARADOR_ZIP
+COLUNAS_CONSOLIDADO = armazenamento.COLUNAS_CONSOLIDADO
+
+# Leitura podada: só as colunas que chegam ao consolidado, sempre como texto
+# (CNPJ/RegistroANS preservam zeros à esquerda; Conta/Valor são tratados como string)
+COLUNAS_LEITURA = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'Conta', 'Valor']
+DTYPES_LEITURA = {c: 'str' for c in COLUNAS_LEITURA}
+MEMORIA_PADRAO_MB = int(os.getenv("ETL_MEMORIA_MB", "512"))
+FATOR_MEMORIA_POR_BYTE = 6
+CHUNKSIZE_MINIMO = 10_000
+CHUNKSIZE_MAXIMO = 2_000_000
+PASTA_PARTICOES = os.path.join("data", "particoes")
+CAMINHO_CONSOLIDADO_PARQUET = os.path.join("data", "consolidado_despesas")
+
+# Semáforos por host para limitar conexões simultâneas no mesmo servidor
+_semaforos_host = {}
+_trava_semaforos = threading.Lock()
+
+
+def criar_sessao(max_conexoes=MAX_DOWNLOADS_PADRAO, tentativas=3):
+    """
+    Cria uma sessão HTTP com pool de conexões keep-alive e retentativas com backoff.
+    """
+    sessao = requests.Session()
+    retry = Retry(
+        total=tentativas,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+    )
+    adaptador = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes, max_retries=retry)
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+def _semaforo_do_host(url):
+    host = urlparse(url).netloc
+    with _trava_semaforos:
+        if host not in _semaforos_host:
+            _semaforos_host[host] = threading.BoundedSemaphore(MAX_CONEXOES_POR_HOST)
+        return _semaforos_host[host]
+
+
+def _get(sessao, url, **kwargs):
+    """GET respeitando o limite de conexões simultâneas por host."""
+    with _semaforo_do_host(url):
+        r = sessao.get(url, timeout=kwargs.pop('timeout', 60), **kwargs)
+        r.raise_for_status()
+        return r
+
+
+def _identificar_trimestre(nome):
+    n_low = nome.lower()
+    if '1t' in n_low or '1_trimestre' in n_low: return 1
+    elif '2t' in n_low or '2_trimestre' in n_low: return 2
+    elif '3t' in n_low or '3_trimestre' in n_low: return 3
+    elif '4t' in n_low or '4_trimestre' in n_low: return 4
+    return 0
+
+
+def _listar_zips_do_ano(sessao, url_categoria, ano):
+    url_ano = url_categoria + ano + "/"
+    encontrados = []
+    try:
+        soup_ano = BeautifulSoup(_get(sessao, url_ano).text, 'html.parser')
+        for link in soup_ano.find_all('a'):
+            nome = link.get('href')
+            if not nome or not nome.lower().endswith('.zip'): continue
+
+            trim = _identificar_trimestre(nome)
+            if trim > 0:
+                encontrados.append({
+                    "ano": int(ano), "trimestre": trim,
+                    "url": url_ano + nome, "nome": nome
+                })
+    except Exception as e:
+        print(f"   ⚠️ Falha ao listar {url_ano}: {e}")
+    return encontrados
+
+
+def _extrair_zip(caminho_zip, pasta_destino, sha256):
+    """
+    Extrai o ZIP de forma atômica (pasta temporária + rename) e grava um marcador
+    com o sha256 de origem. Pastas sem marcador (extração interrompida) são refeitas.
+    """
+    marcador = os.path.join(pasta_destino, MARCADOR_EXTRACAO)
+    if os.path.exists(marcador):
+        with open(marcador, 'r') as f:
+            if f.read().strip() == sha256: return False
+
+    pasta_tmp = pasta_destino + ".tmp"
+    if os.path.exists(pasta_tmp): shutil.rmtree(pasta_tmp)
+    with zipfile.ZipFile(caminho_zip, 'r') as z: z.extractall(pasta_tmp)
+    with open(os.path.join(pasta_tmp, MARCADOR_EXTRACAO), 'w') as f: f.write(sha256)
+
+    if os.path.exists(pasta_destino): shutil.rmtree(pasta_destino)
+    os.replace(pasta_tmp, pasta_destino)
+    return True
+
+
+def _baixar_trimestre(sessao, item, pasta_root, extrair=True):
+    rotulo = f"{item['ano']}_{item['trimestre']}"
+    pasta_destino = os.path.join(pasta_root, rotulo)
+    # O ZIP fica guardado em data/zips para permitir GET condicional nas próximas execuções
+    caminho_zip = os.path.join(pasta_root, "zips", f"{rotulo}.zip")
+
+    try:
+        with instrumentacao.span('download_zip', arquivo=f"{rotulo}.zip"), _semaforo_do_host(item['url']):
+            resultado = cache.baixar_com_cache(sessao, item['url'], caminho_zip,
+                                               os.path.join(pasta_root, os.path.basename(cache.CAMINHO_MANIFESTO)))
+            # Sem modificação (304) nada trafegou além dos cabeçalhos
+            if resultado['modificado']: instrumentacao.registrar(bytes_lidos=os.path.getsize(caminho_zip))
+        if resultado['modificado']:
+            print(f"   Baixado {item['ano']} T{item['trimestre']} ({item['nome']}).")
+        else:
+            print(f"   {item['ano']} T{item['trimestre']} inalterado no servidor.")
+
+        if extrair and _extrair_zip(caminho_zip, pasta_destino, resultado['sha256']):
+            print(f"   Extraído em {pasta_destino}.")
+    except Exception as e:
+        print(f"   ❌ Falha ao baixar {item['url']}: {e}")
+
+
 # --- Acessa a api ---
-def baixar_dados():
+@instrumentacao.medir('download')
+def baixar_dados(qtd_trimestres=QTD_TRIMESTRES_PADRAO, max_downloads=MAX_DOWNLOADS_PADRAO,
+                 url_base=URL_BASE_ANS, pasta_root=None, extrair=True):
+    """
+    Baixa os últimos `qtd_trimestres` trimestres disponíveis na ANS.
+
+    As listagens dos anos e os ZIPs são buscados em paralelo (até `max_downloads`
+    simultâneos) usando uma única sessão HTTP. `url_base` permite apontar para um
+    servidor local que simule o diretório da ANS. Com `extrair=False` os ZIPs ficam
+    apenas em data/zips, para leitura direta por `processar_incrementalmente(origem='zip')`.
+    """
     print(">>> 1. Iniciando processo de download...")
-    url_base = "https://dadosabertos.ans.gov.br/FTP/PDA/"
     url_categoria = url_base + "demonstracoes_contabeis/"
+    sessao = criar_sessao(max_downloads)
 
     try:
         print(f"   Acessando {url_categoria}...")
-        resposta_categoria = requests.get(url_categoria)
+        resposta_categoria = _get(sessao, url_categoria)
         soup_categoria = BeautifulSoup(resposta_categoria.text, 'html.parser')
         lista_de_anos = [link.get('href').strip('/') for link in soup_categoria.find_all('a') 
                          if link.get('href') and link.get('href').strip('/').isdigit() and len(link.get('href').strip('/')) == 4]
@@ -34,64 +189,29 @@ def baixar_dados():
         return
 
 #Encontra os arquivos
+    # Percorre os anos do mais recente para o mais antigo e para assim que a janela é preenchida
+    lista_de_anos.sort(reverse=True)
     arquivos_encontrados = []
-    for ano in lista_de_anos:
-        url_ano = url_categoria + ano + "/"
-        try: 
-            soup_ano = BeautifulSoup(requests.get(url_ano).text, 'html.parser')
-            for link in soup_ano.find_all('a'):
-                nome = link.get('href')
-                if not nome or not nome.lower().endswith('.zip'): continue
-                
-                trim = 0
-                n_low = nome.lower()
-                if '1t' in n_low or '1_trimestre' in n_low: trim = 1
-                elif '2t' in n_low or '2_trimestre' in n_low: trim = 2
-                elif '3t' in n_low or '3_trimestre' in n_low: trim = 3
-                elif '4t' in n_low or '4_trimestre' in n_low: trim = 4
-                
-                if trim > 0:
-                    arquivos_encontrados.append({
-                        "ano": int(ano), "trimestre": trim, 
-                        "url": url_ano + nome, "nome": nome
-                    })
-        except: pass
+    with ThreadPoolExecutor(max_workers=max_downloads) as pool:
+        for i in range(0, len(lista_de_anos), max_downloads):
+            lote = lista_de_anos[i:i + max_downloads]
+            for encontrados in instrumentacao.mapear(pool, lambda ano: _listar_zips_do_ano(sessao, url_categoria, ano), lote):
+                arquivos_encontrados.extend(encontrados)
+            if len(arquivos_encontrados) >= qtd_trimestres: break
 
     arquivos_encontrados.sort(key=lambda x: (x['ano'], x['trimestre']), reverse=True)
-    ultimos_3 = arquivos_encontrados[:3]
+    selecionados = arquivos_encontrados[:qtd_trimestres]
     
-    if not ultimos_3:
+    if not selecionados:
         print("❌ Nenhum arquivo encontrado.")
         return
 #baixa os arquivos
-    pasta_root = os.path.join(os.getcwd(), "data")
-    if not os.path.exists(pasta_root): os.makedirs(pasta_root)
+    if pasta_root is None: pasta_root = os.path.join(os.getcwd(), "data")
+    os.makedirs(pasta_root, exist_ok=True)
 
-    for item in ultimos_3:
-        pasta_destino = os.path.join(pasta_root, f"{item['ano']}_{item['trimestre']}")
-        
-        precisa_baixar = True
-        if os.path.exists(pasta_destino):
-            arquivos_na_pasta = os.listdir(pasta_destino)
-            if arquivos_na_pasta:
-                print(f"   Pasta {item['ano']}_{item['trimestre']} já existe e contém arquivos. Pulando.")
-                precisa_baixar = False
-            else:
-                shutil.rmtree(pasta_destino)
-        
-        if precisa_baixar:
-            if not os.path.exists(pasta_destino): os.makedirs(pasta_destino)
-            print(f"   Baixando {item['ano']} T{item['trimestre']} ({item['nome']})...")
-            try:
-                r = requests.get(item['url'], stream=True)
-                caminho_zip = os.path.join(pasta_root, "temp.zip")
-                with open(caminho_zip, 'wb') as f: 
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                with zipfile.ZipFile(caminho_zip, 'r') as z: z.extractall(pasta_destino)
-                os.remove(caminho_zip)
-            except Exception as e:
-                print(f"   ❌ Falha ao baixar {item['url']}: {e}")
+    with ThreadPoolExecutor(max_workers=max_downloads) as pool:
+        instrumentacao.mapear(pool, lambda item: _baixar_trimestre(sessao, item, pasta_root, extrair), selecionados)
+    sessao.close()
 
 
 #Limpa os valores
@@ -99,35 +219,171 @@ def limpar_valor_monetario(valor):
     if pd.isna(valor) or str(valor).strip() == '': return 0.0
     v = str(valor).strip()
     mult = -1 if '(' in v or ')' in v else 1
-    v = re.sub(r'[^\d.,-]', '', v) 
+    v = re.sub(r'[^0-9.,-]', '', v)  # só dígitos ASCII, como na versão vetorizada
     try:
         if ',' in v and '.' in v: v = v.replace('.', '').replace(',', '.') 
         elif ',' in v: v = v.replace(',', '.') 
         return float(v) * mult
     except: return 0.0
 
-def normalizar_colunas(df):
-    cols_novas = {}
-    for col_atual in df.columns:
-        col_lower = col_atual.lower().strip()
+def limpar_valores_monetarios(serie):
+    """
+    Versão vetorizada de `limpar_valor_monetario` para uma Series inteira.
+
+    Mesmas regras: separadores brasileiros de milhar/decimal, negativos entre
+    parênteses e vazios/lixo viram 0.0.
+    """
+    texto = serie.astype('str')
+    mult = np.where(texto.str.contains(r'[()]', regex=True, na=False), -1.0, 1.0)
+
+    # [0-9] e não \d: o \d do re aceita dígitos Unicode e o do motor do pyarrow não
+    v = texto.str.replace(r'[^0-9.,-]', '', regex=True)
+    tem_virgula = v.str.contains(',', regex=False, na=False).to_numpy()
+
+    # Com vírgula presente, o ponto é separador de milhar; sem vírgula, o texto já é um float
+    valores = np.empty(len(v))
+    valores[~tem_virgula] = _converter_float(v[~tem_virgula])
+    br = v[tem_virgula].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    valores[tem_virgula] = _converter_float(br)
+
+    return pd.Series(np.nan_to_num(valores * mult, nan=0.0), index=serie.index)
+
+def _converter_float(v):
+    # Só converte o que float() aceitaria; o restante (ex.: '1.2.3', '-') vira NaN
+    numerico = v.str.fullmatch(r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)', na=False)
+    return v.where(numerico).astype('float64').to_numpy()
+
+def resolver_colunas(colunas):
+    """
+    Mapeia os nomes de coluna do arquivo para os nomes padrão de MAPA_COLUNAS.
+    Retorna {coluna_original: coluna_padrao}, usando a primeira ocorrência de cada padrão.
+    """
+    mapa = {}
+    for col_atual in colunas:
+        col_lower = str(col_atual).lower().strip()
         for col_padrao, possiveis in MAPA_COLUNAS.items():
             if col_lower in possiveis or col_atual in possiveis:
-                cols_novas[col_atual] = col_padrao
+                if col_padrao not in mapa.values():
+                    mapa[col_atual] = col_padrao
                 break
-    
-    df = df.rename(columns=cols_novas)
+    return mapa
+
+def normalizar_colunas(df):
+    cols_novas = resolver_colunas(df.columns)
+    df = df[list(cols_novas)].rename(columns=cols_novas)
+    return df
+
+
+def _separar_membro_zip(caminho):
+    """'data/zips/2024_3.zip!pasta/arquivo.csv' -> ('data/zips/2024_3.zip', 'pasta/arquivo.csv')"""
+    if SEPARADOR_ZIP not in caminho: return caminho, None
+    return tuple(caminho.split(SEPARADOR_ZIP, 1))
+
+
+@contextmanager
+def _abrir_fonte(caminho_fisico, membro):
+    if membro is None:
+        with open(caminho_fisico, 'rb') as f: yield f
+    else:
+        with zipfile.ZipFile(caminho_fisico, 'r') as zf, zf.open(membro) as f: yield f
+
+
+def carregar_arquivo_robusto(caminho, chunksize=None):
+    """
+    Lê um CSV/XLSX do disco ou um membro de ZIP ('arquivo.zip!membro.csv').
+
+    Encoding, separador e decimal são detectados por amostragem (com cache em
+    sidecar), então o arquivo é lido uma única vez. Com `chunksize`, retorna um
+    iterador de DataFrames.
+    """
+    caminho_fisico, membro = _separar_membro_zip(caminho)
+    if caminho.lower().endswith('.xlsx'):
+        with _abrir_fonte(caminho_fisico, membro) as f: return pd.read_excel(io.BytesIO(f.read()))
+
+    d = dialeto.obter_dialeto(caminho_fisico, membro)
+    print(f"      Dialeto: encoding={d['encoding']} sep={d['sep']!r} decimal={d['decimal']!r}")
+    opcoes = dict(sep=d['sep'], encoding=d['encoding'], decimal=d['decimal'], on_bad_lines='skip')
+
+    if chunksize is not None:
+        # Em blocos não dá para recomeçar a leitura: bytes inválidos além da amostra são substituídos
+        return _ler_em_blocos(caminho_fisico, membro, chunksize, encoding_errors='replace', **opcoes)
+
+    try:
+        with _abrir_fonte(caminho_fisico, membro) as f:
+            return pd.read_csv(f, low_memory=False, **opcoes)
+    except UnicodeDecodeError:
+        # A amostra parecia utf-8 mas o restante do arquivo não é
+        print("      ⚠️ Encoding detectado falhou além da amostra, relendo como latin1.")
+        d = dict(d, encoding='latin1')
+        dialeto.salvar_dialeto(caminho_fisico, membro, d)
+        with _abrir_fonte(caminho_fisico, membro) as f:
+            return pd.read_csv(f, low_memory=False, **dict(opcoes, encoding='latin1'))
+
+
+def _ler_em_blocos(caminho_fisico, membro, chunksize, **opcoes):
+    with _abrir_fonte(caminho_fisico, membro) as f:
+        with pd.read_csv(f, chunksize=chunksize, **opcoes) as leitor:
+            yield from leitor
+
 
-    cols_presentes = [c for c in df.columns if c in MAPA_COLUNAS.keys()]
-    return df[cols_presentes]
+def calcular_chunksize(bytes_por_linha, memoria_mb=MEMORIA_PADRAO_MB):
+    """
+    Quantidade de linhas por bloco para que um bloco (texto + colunas + cópia filtrada)
+    caiba no orçamento de memória.
+    """
+    custo_linha = max(bytes_por_linha, 1) * FATOR_MEMORIA_POR_BYTE
+    linhas = int(memoria_mb * 1024 * 1024 / custo_linha)
+    return min(max(linhas, CHUNKSIZE_MINIMO), CHUNKSIZE_MAXIMO)
 
 
-def carregar_arquivo_robusto(caminho):
-    if caminho.endswith('.xlsx'): return pd.read_excel(caminho)
+def ler_colunas_necessarias(caminho, memoria_mb=MEMORIA_PADRAO_MB, chunksize=None):
+    """
+    Resolve o cabeçalho contra MAPA_COLUNAS antes de ler os dados e lê apenas as
+    colunas usadas no consolidado, com dtypes fixos, em blocos dimensionados por
+    `memoria_mb`.
+
+    Retorna (colunas_padrao_presentes, iterador de DataFrames já renomeados).
+    """
+    caminho_fisico, membro = _separar_membro_zip(caminho)
+    if caminho.lower().endswith('.xlsx'):
+        df = normalizar_colunas(carregar_arquivo_robusto(caminho))
+        df = df[[c for c in df.columns if c in COLUNAS_LEITURA]]
+        return list(df.columns), iter([df])
+
+    d = dialeto.obter_dialeto(caminho_fisico, membro)
+    opcoes = dict(sep=d['sep'], encoding=d['encoding'], decimal=d['decimal'], encoding_errors='replace')
+    with _abrir_fonte(caminho_fisico, membro) as f:
+        cabecalho = pd.read_csv(f, nrows=0, **opcoes).columns
+
+    mapa = {orig: padrao for orig, padrao in resolver_colunas(cabecalho).items() if padrao in COLUNAS_LEITURA}
+    if chunksize is None:
+        chunksize = calcular_chunksize(d.get('bytes_por_linha', 200), memoria_mb)
+    print(f"      Dialeto: encoding={d['encoding']} sep={d['sep']!r} decimal={d['decimal']!r} | "
+          f"{len(mapa)}/{len(cabecalho)} colunas, blocos de {chunksize} linhas")
+
+    blocos = _ler_em_blocos(caminho_fisico, membro, chunksize, usecols=list(mapa),
+                            dtype={orig: DTYPES_LEITURA[padrao] for orig, padrao in mapa.items()},
+                            on_bad_lines='skip', **opcoes)
+    return list(mapa.values()), (bloco.rename(columns=mapa) for bloco in blocos)
+
+
+def _eh_arquivo_de_despesa(nome):
+    nome = os.path.basename(nome).lower()
+    if not nome.endswith(('.csv', '.txt', '.xlsx')): return False
+    termos_chave = ['evento', 'sinistro', 'despesa', 'demonstracao', 'contabeis', '1t', '2t', '3t', '4t']
+    return any(x in nome for x in termos_chave)
+
+
+def _ano_trimestre(nome):
+    """'2024_3' -> (2024, 3); (0, 0) se o nome não identifica um trimestre."""
+    if '_' in nome and nome.replace('_', '').isdigit():
+        try:
+            a, t = map(int, nome.split('_'))
+            if 2000 < a < 2030 and 1 <= t <= 4:
+                return a, t
+        except: pass
+    return 0, 0
 
-    try: return pd.read_csv(caminho, sep=';', encoding='utf-8', on_bad_lines='skip', low_memory=False)
-    except:
-        try: return pd.read_csv(caminho, sep=';', encoding='latin1', on_bad_lines='skip', low_memory=False)
-        except: return pd.read_csv(caminho, sep=',', encoding='utf-8', on_bad_lines='skip', low_memory=False)
 
 def identificar_arquivos_nas_pastas(pasta_raiz):
     arquivos = []
@@ -137,93 +393,378 @@ def identificar_arquivos_nas_pastas(pasta_raiz):
         ano, trim = 0, 0
         path_parts = root.split(os.sep)
         for part in path_parts:
-            if '_' in part and part.replace('_', '').isdigit():
-                try:
-                    a, t = map(int, part.split('_'))
-                    if 2000 < a < 2030 and 1 <= t <= 4:
-                        ano, trim = a, t
-                        break
-                except: pass
+            ano, trim = _ano_trimestre(part)
+            if ano: break
         
         if ano == 0: continue
 
         for file in files:
-            if file.lower().endswith(('.csv', '.txt', '.xlsx')):
-                termos_chave = ['evento', 'sinistro', 'despesa', 'demonstracao', 'contabeis', '1t', '2t', '3t', '4t']
-                if any(x in file.lower() for x in termos_chave):
-                    arquivos.append((os.path.join(root, file), ano, trim))
+            if _eh_arquivo_de_despesa(file):
+                arquivos.append((os.path.join(root, file), ano, trim))
+    return arquivos
+
+def identificar_arquivos_nos_zips(pasta_zips):
+    """
+    Equivalente a `identificar_arquivos_nas_pastas`, mas lista os membros dos ZIPs
+    guardados em data/zips (<ano>_<trim>.zip) sem extraí-los.
+    """
+    arquivos = []
+    if not os.path.exists(pasta_zips): return []
+
+    for nome_zip in sorted(os.listdir(pasta_zips)):
+        if not nome_zip.lower().endswith('.zip'): continue
+        ano, trim = _ano_trimestre(nome_zip[:-4])
+        if ano == 0: continue
+
+        caminho_zip = os.path.join(pasta_zips, nome_zip)
+        try:
+            with zipfile.ZipFile(caminho_zip, 'r') as z:
+                membros = [info.filename for info in z.infolist() if not info.is_dir()]
+        except zipfile.BadZipFile:
+            print(f"   ⚠️ ZIP corrompido ignorado: {caminho_zip}")
+            continue
+
+        for membro in membros:
+            if _eh_arquivo_de_despesa(membro):
+                arquivos.append((f"{caminho_zip}{SEPARADOR_ZIP}{membro}", ano, trim))
     return arquivos
 
-def processar_incrementalmente():
+
+def _filtrar_despesas(df, ano, trim):
+    """
+    Normaliza as colunas de um bloco, mantém apenas contas de despesa (41...) e
+    converte os valores. Retorna None se o bloco não tiver linhas de despesa.
+    """
+    col_conta_limpa = df['Conta'].astype(str).str.replace(r'[^0-9]', '', regex=True)
+    mascara_despesa = col_conta_limpa.str.startswith('41', na=False)
+    df_filtrado = df[mascara_despesa].copy()
+    if len(df_filtrado) == 0: return None
+
+    df_filtrado['ValorDespesas'] = limpar_valores_monetarios(df_filtrado['Valor']).abs()
+    df_filtrado['Ano'] = ano
+    df_filtrado['Trimestre'] = trim
+
+    for c in COLUNAS_CONSOLIDADO:
+        if c not in df_filtrado.columns: 
+            df_filtrado[c] = None 
+        
+    return df_filtrado[COLUNAS_CONSOLIDADO]
+
+
+def _nome_particao(caminho, ano, trim):
+    # Nome determinístico por arquivo de origem: reprocessar o mesmo arquivo sobrescreve a mesma partição
+    return f"{ano}_{trim}_{hashlib.sha1(caminho.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _tamanho_fonte(caminho):
+    caminho_fisico, membro = _separar_membro_zip(caminho)
+    if membro is None: return os.path.getsize(caminho_fisico)
+    with zipfile.ZipFile(caminho_fisico) as z:
+        return z.getinfo(membro).file_size
+
+
+def processar_arquivo(caminho, ano, trim, pasta_particoes=PASTA_PARTICOES,
+                      memoria_mb=MEMORIA_PADRAO_MB, chunksize=None, formato='csv'):
+    """
+    Filtra as despesas de um único arquivo e grava o resultado na sua própria partição.
+
+    Pode rodar em um processo separado: qualquer erro fica restrito a este arquivo
+    e é devolvido em `resultado['erro']`. A partição só aparece (rename atômico)
+    quando o arquivo foi processado por completo. Com formato='memoria' nada é
+    gravado e o DataFrame filtrado volta em `resultado['dados']`.
+    """
+    with instrumentacao.span('arquivo', arquivo=os.path.basename(caminho), ano=ano, trimestre=trim):
+        resultado = _processar_arquivo(caminho, ano, trim, pasta_particoes, memoria_mb, chunksize, formato)
+        instrumentacao.registrar(linhas_saida=resultado['linhas'],
+                                 bytes_escritos=instrumentacao.tamanho_em_disco(resultado['particao']))
+    return resultado
+
+
+def _processar_arquivo(caminho, ano, trim, pasta_particoes, memoria_mb, chunksize, formato):
+    resultado = {'caminho': caminho, 'ano': ano, 'trimestre': trim, 'particao': None, 'linhas': 0, 'erro': None}
+    em_memoria = formato == 'memoria'
+    destino = None if em_memoria else armazenamento.caminho_particao(
+        pasta_particoes, ano, trim, _nome_particao(caminho, ano, trim), formato)
+
+    print(f"   -> Lendo: {os.path.basename(caminho)}...")
+    try:
+        instrumentacao.registrar(bytes_lidos=_tamanho_fonte(caminho))
+        colunas, blocos = ler_colunas_necessarias(caminho, memoria_mb=memoria_mb, chunksize=chunksize)
+
+        if 'Conta' not in colunas:
+            print(f"      ⚠️ [Ignorado] Sem coluna 'Conta'. Colunas atuais: {colunas}")
+            return resultado
+        if 'Valor' not in colunas:
+            print(f"      ❌ ERRO CRÍTICO: Coluna 'Valor' não encontrada após mapeamento. Pulando arquivo.")
+            return resultado
+
+        escritor = armazenamento.ColetorMemoria() if em_memoria else armazenamento.EscritorParticao(destino, formato)
+        operadoras = set()
+        with escritor:
+            for df in blocos:
+                instrumentacao.registrar(linhas_entrada=len(df))
+                df_export = _filtrar_despesas(df, ano, trim)
+                if df_export is None: continue
+
+                escritor.escrever(df_export)
+                operadoras.update(df_export['RegistroANS'].dropna().astype(str))
+                del df, df_export
+
+            qtd_filtrada = escritor.linhas
+            if qtd_filtrada == 0:
+                print("      ⚠️ [Aviso] Nenhuma linha de despesa encontrada.")
+                return resultado
+            escritor.concluir()
+
+        print(f"      ✅ Filtrado: {qtd_filtrada} registros.")
+        resultado.update(particao=destino, linhas=qtd_filtrada, operadoras=sorted(operadoras))
+        if em_memoria: resultado['dados'] = escritor.dados
+
+    except Exception as e:
+        print(f"      ❌ Erro ao processar arquivo: {e}")
+        import traceback
+        traceback.print_exc()
+        resultado['erro'] = str(e)
+    finally:
+        gc.collect()
+    return resultado
+
+
+def _processar_no_worker(caminho, ano, trim, **opcoes):
+    # Devolve ao processo principal só os spans deste arquivo
+    instrumentacao.iniciar_processo()
+    resultado = processar_arquivo(caminho, ano, trim, **opcoes)
+    resultado['spans'] = instrumentacao.drenar()
+    return resultado
+
+
+def _processar_isolado(caminho, ano, trim, **opcoes):
+    """Um arquivo num processo só dele: se o worker morrer, só este arquivo falha."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_processar_no_worker, caminho, ano, trim, **opcoes).result()
+
+
+def _falha_do_worker(arquivo, erro):
+    caminho, ano, trim = arquivo
+    print(f"      ❌ Worker falhou em {os.path.basename(caminho)}: {erro!r}")
+    return {'caminho': caminho, 'ano': ano, 'trimestre': trim, 'particao': None, 'linhas': 0, 'erro': repr(erro)}
+
+
+def _processar_em_paralelo(arquivos, workers, **opcoes):
+    resultados = [None] * len(arquivos)
+    interrompidos = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(_processar_no_worker, caminho, ano, trim, **opcoes): i
+                   for i, (caminho, ano, trim) in enumerate(arquivos)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                resultados[i] = futuro.result()
+            except BrokenProcessPool:
+                # Um worker morreu (ex.: falta de memória) e o pool inteiro quebrou:
+                # não dá para saber de qual arquivo era, então todos os pendentes voltam
+                interrompidos.append(i)
+            except Exception as e:
+                resultados[i] = _falha_do_worker(arquivos[i], e)
+
+    if interrompidos:
+        print(f"      ⚠️ Um worker morreu; reprocessando {len(interrompidos)} arquivo(s), cada um no seu processo...")
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            futuros = {i: threads.submit(_processar_isolado, *arquivos[i], **opcoes) for i in sorted(interrompidos)}
+            for i, futuro in futuros.items():
+                try:
+                    resultados[i] = futuro.result()
+                except Exception as e:
+                    resultados[i] = _falha_do_worker(arquivos[i], e)
+
+    for resultado in resultados:
+        instrumentacao.incorporar(resultado.pop('spans', None))
+    return resultados
+
+
+def consolidar_particoes(particoes, arquivo_saida):
+    """
+    Concatena as partições na ordem recebida em um único CSV (um cabeçalho só).
+    """
+    tmp = f"{arquivo_saida}.tmp"
+    primeira = True
+    with open(tmp, 'wb') as saida:
+        for particao in particoes:
+            with open(particao, 'rb') as entrada:
+                cabecalho = entrada.readline()
+                if primeira:
+                    saida.write(cabecalho)
+                    primeira = False
+                shutil.copyfileobj(entrada, saida, 1024 * 1024)
+    os.replace(tmp, arquivo_saida)
+
+
+def listar_arquivos(origem='pastas'):
+    """Arquivos de despesa (caminho, ano, trimestre) na ordem de consolidação."""
+    if origem == 'zip':
+        arquivos = identificar_arquivos_nos_zips(os.path.join("data", "zips"))
+    else:
+        arquivos = identificar_arquivos_nas_pastas("data")
+    arquivos.sort(key=lambda x: (x[1], x[2], x[0]))
+    return arquivos
+
+
+@instrumentacao.medir('coleta')
+def coletar_despesas(origem='pastas', chunksize=None, memoria_mb=MEMORIA_PADRAO_MB, workers=1):
+    """
+    Mesmo processamento de `processar_incrementalmente`, mas devolve o consolidado
+    como DataFrame tipado em vez de gravá-lo no disco.
+    """
+    print(">>> 2. Processando despesas em memória com FILTRAGEM CONTÁBIL...")
+    arquivos = listar_arquivos(origem)
+    if not arquivos:
+        print("\n❌ ERRO FATAL: Nenhum arquivo válido encontrado.")
+        return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
+
+    opcoes = dict(memoria_mb=memoria_mb, chunksize=chunksize, formato='memoria')
+    print(f"\n   Processando {len(arquivos)} arquivos encontrados ({workers} worker(s))...")
+    if workers > 1:
+        resultados = _processar_em_paralelo(arquivos, workers, **opcoes)
+    else:
+        resultados = [processar_arquivo(caminho, ano, trim, **opcoes) for caminho, ano, trim in arquivos]
+
+    partes = [r['dados'] for r in resultados if r.get('dados') is not None]
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
+    df = esquema.aplicar(pd.concat(partes, ignore_index=True))
+    instrumentacao.registrar(linhas_saida=len(df))
+    print(f"\n✅ CONSOLIDADO EM MEMÓRIA: {len(df)} registros.")
+    esquema.relatar(df, "a coleta")
+    return df
+
+
+@instrumentacao.medir('particoes')
+def atualizar_particoes(origem='pastas', chunksize=None, memoria_mb=MEMORIA_PADRAO_MB, workers=1,
+                        formato='csv', forcar=False):
+    """
+    Processa apenas os arquivos novos ou alterados desde a última execução, de
+    acordo com o manifesto do ETL, e remove as partições de arquivos que sumiram.
+
+    Retorna um resumo das alterações: partições vigentes (na ordem de consolidação),
+    arquivos processados/removidos e as operadoras e trimestres afetados.
+    """
+    arquivos = listar_arquivos(origem)
+    dados_manifesto = manifesto.carregar()
+    entradas = dados_manifesto['arquivos']
+    alteracoes = {'particoes': [], 'processados': [], 'removidos': [], 'falhas': [],
+                  'operadoras': set(), 'trimestres': set(), 'linhas': 0}
+
+    def _marcar_afetados(entrada):
+        alteracoes['operadoras'].update(entrada.get('operadoras', []))
+        alteracoes['trimestres'].add((entrada['ano'], entrada['trimestre']))
+
+    atuais = {caminho for caminho, _, _ in arquivos}
+    for caminho in [c for c in entradas if c not in atuais]:
+        entrada = entradas.pop(caminho)
+        if entrada.get('particao') and os.path.exists(entrada['particao']): os.remove(entrada['particao'])
+        _marcar_afetados(entrada)
+        alteracoes['removidos'].append(caminho)
+
+    pendentes = [(c, a, t) for c, a, t in arquivos
+                 if forcar or not manifesto.fonte_inalterada(entradas.get(c), c, formato)]
+    print(f"\n   {len(arquivos)} arquivos encontrados, {len(pendentes)} novos ou alterados ({workers} worker(s))...")
+
+    pasta_particoes = PASTA_PARTICOES if formato == 'csv' else CAMINHO_CONSOLIDADO_PARQUET
+    os.makedirs(pasta_particoes, exist_ok=True)
+    opcoes = dict(pasta_particoes=pasta_particoes, memoria_mb=memoria_mb, chunksize=chunksize, formato=formato)
+
+    hashes = {c: manifesto.hash_fonte(c) for c, _, _ in pendentes}
+    if workers > 1 and len(pendentes) > 1:
+        resultados = _processar_em_paralelo(pendentes, workers, **opcoes)
+    else:
+        resultados = [processar_arquivo(caminho, ano, trim, **opcoes) for caminho, ano, trim in pendentes]
+
+    for r in resultados:
+        caminho = r['caminho']
+        if r['erro']:
+            # Mantém a entrada anterior (se houver): o arquivo será tentado de novo na próxima execução
+            alteracoes['falhas'].append(caminho)
+            continue
+
+        anterior = entradas.get(caminho)
+        if anterior:
+            _marcar_afetados(anterior)
+            if anterior.get('particao') and anterior['particao'] != r['particao'] and os.path.exists(anterior['particao']):
+                os.remove(anterior['particao'])
+
+        caminho_fisico, membro = _separar_membro_zip(caminho)
+        entradas[caminho] = {
+            'hash': hashes[caminho],
+            'assinatura': manifesto.assinatura(caminho),
+            'formato': formato,
+            'dialeto': None if caminho.lower().endswith('.xlsx') else dialeto.obter_dialeto(caminho_fisico, membro),
+            'ano': r['ano'],
+            'trimestre': r['trimestre'],
+            'linhas': r['linhas'],
+            'particao': r['particao'],
+            'operadoras': r.get('operadoras', []),
+        }
+        _marcar_afetados(entradas[caminho])
+        alteracoes['processados'].append(caminho)
+
+    manifesto.salvar(dados_manifesto)
+
+    for caminho, _, _ in arquivos:
+        entrada = entradas.get(caminho)
+        if entrada and entrada.get('particao'):
+            alteracoes['particoes'].append(entrada['particao'])
+            alteracoes['linhas'] += entrada['linhas']
+    instrumentacao.registrar(linhas_saida=alteracoes['linhas'])
+    return alteracoes
+
+
+def processar_incrementalmente(origem='pastas', chunksize=None, memoria_mb=MEMORIA_PADRAO_MB, workers=1,
+                               formato='csv', exportar_csv=True, forcar=False):
+    """
+    Consolida as despesas de todos os arquivos trimestrais em data/consolidado_despesas.csv.
+
+    origem='pastas' lê os arquivos extraídos em data/<ano>_<trim>; origem='zip' lê os
+    membros direto de data/zips. Cada arquivo é lido em blocos dimensionados por
+    `memoria_mb` (ou de `chunksize` linhas, se informado) e gera a sua própria
+    partição; com `workers` > 1 os arquivos são processados em paralelo. O
+    consolidado é montado na ordem (ano, trimestre), igual nos dois modos.
+
+    Só arquivos novos ou alterados (segundo o manifesto do ETL) são reprocessados,
+    a menos que `forcar` seja True; as partições dos demais são reaproveitadas.
+
+    Com formato='parquet' as partições formam o dataset data/consolidado_despesas/
+    (Ano=.../Trimestre=...); `exportar_csv` ainda gera o CSV usado pelo LOAD DATA.
+    """
     print(">>> 2. Iniciando processamento incremental com FILTRAGEM CONTÁBIL...")
     arquivo_saida = os.path.join("data", "consolidado_despesas.csv")
     
-    if os.path.exists(arquivo_saida): os.remove(arquivo_saida)
-    
-    arquivos = identificar_arquivos_nas_pastas("data")
-    if not arquivos:
+    if not listar_arquivos(origem):
         print("\n❌ ERRO FATAL: Nenhum arquivo válido encontrado.")
         return
 
-    arquivos.sort(key=lambda x: (x[1], x[2]))
-    primeira_vez = True
-    total_registros = 0
-    
-    print(f"\n   Processando {len(arquivos)} arquivos encontrados...")
+    alteracoes = atualizar_particoes(origem, chunksize=chunksize, memoria_mb=memoria_mb, workers=workers,
+                                     formato=formato, forcar=forcar)
+    particoes = alteracoes['particoes']
+    houve_mudanca = alteracoes['processados'] or alteracoes['removidos']
 
-    for caminho, ano, trim in arquivos:
-        print(f"   -> Lendo: {os.path.basename(caminho)}...")
-        try:
-            df = carregar_arquivo_robusto(caminho)
-            df = normalizar_colunas(df)
-            
-            if 'Conta' not in df.columns:
-                print(f"      ⚠️ [Ignorado] Sem coluna 'Conta'. Colunas atuais: {list(df.columns)}")
-                continue
-
-          
-            col_conta_limpa = df['Conta'].astype(str).str.replace(r'[^0-9]', '', regex=True)
-            mascara_despesa = col_conta_limpa.str.startswith('41', na=False)
-            df_filtrado = df[mascara_despesa].copy()
-            
-            qtd_filtrada = len(df_filtrado)
-            if qtd_filtrada == 0:
-                print("      ⚠️ [Aviso] Nenhuma linha de despesa encontrada.")
-                continue
-                
-            print(f"      ✅ Filtrado: {qtd_filtrada} registros.")
-
-            if 'Valor' not in df_filtrado.columns:
-                print(f"      ❌ ERRO CRÍTICO: Coluna 'Valor' não encontrada após mapeamento. Pulando arquivo.")
-                continue
-
-     
-            df_filtrado['ValorDespesas'] = df_filtrado['Valor'].apply(limpar_valor_monetario).abs()
-            df_filtrado['Ano'] = ano
-            df_filtrado['Trimestre'] = trim
-       
-            cols_finais = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas']
-            
-            for c in cols_finais:
-                if c not in df_filtrado.columns: 
-                    df_filtrado[c] = None 
-                
-            df_export = df_filtrado[cols_finais]
-            
-            df_export.to_csv(arquivo_saida, mode='a', index=False, header=primeira_vez, sep=';', encoding='utf-8')
-            
-            total_registros += len(df_export)
-            primeira_vez = False
-            
-            del df, df_filtrado, df_export
-            gc.collect()
-
-        except Exception as e:
-            print(f"      ❌ Erro ao processar arquivo: {e}")
-            import traceback
-            traceback.print_exc()
-
-    print(f"\n✅ CONSOLIDADO FINALIZADO: {total_registros} registros salvos em {arquivo_saida}")
+    if formato == 'parquet':
+        if exportar_csv and (houve_mudanca or not os.path.exists(arquivo_saida)):
+            armazenamento.exportar_particoes_csv(particoes, arquivo_saida)
+        arquivo_saida = CAMINHO_CONSOLIDADO_PARQUET
+    elif houve_mudanca or not os.path.exists(arquivo_saida):
+        if particoes:
+            consolidar_particoes(particoes, arquivo_saida)
+        elif os.path.exists(arquivo_saida):
+            os.remove(arquivo_saida)
+    else:
+        print("   ℹ️ Nenhum arquivo novo ou alterado; consolidado mantido.")
+
+    falhas = alteracoes['falhas']
+    if falhas:
+        print(f"\n⚠️ {len(falhas)} arquivo(s) com erro: {[os.path.basename(c) for c in falhas]}")
+
+    print(f"\n✅ CONSOLIDADO FINALIZADO: {alteracoes['linhas']} registros salvos em {arquivo_saida}")
+    return alteracoes
 
 def compactar_csv_final():
     print(">>> 3. Compactando arquivo consolidado...")
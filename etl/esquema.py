@@ -0,0 +1,55 @@
+"""(Esquema de tipos compactos das tabelas do ETL)"""
+import pandas as pd
+
+# Texto com poucos valores distintos vira categoria; chaves e períodos viram inteiros pequenos
+ESQUEMA = {
+    'RegistroANS': 'Int32',
+    'CNPJ': 'category',
+    'RazaoSocial': 'category',
+    'UF': 'category',
+    'Modalidade': 'category',
+    'Ano': 'int16',
+    'Trimestre': 'int8',
+    'ValorDespesas': 'float64',
+    'TotalDespesas': 'float64',
+    'MediaTrimestral': 'float64',
+    'DesvioPadrao': 'float64',
+    'QtdTrimestres': 'int32',
+}
+
+
+def _converter(serie, dtype):
+    if dtype == 'Int32':
+        if not pd.api.types.is_integer_dtype(serie):
+            serie = pd.to_numeric(serie.astype('string').str.strip(), errors='coerce')
+            serie = serie.where(serie == serie.round())
+        return serie.astype('Int32')
+    if dtype == 'category':
+        # Categorias de blocos diferentes são unificadas aqui (concat de categorias distintas vira object)
+        return serie.astype('object').astype('category')
+    if dtype == 'float64' and not pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce')
+    return serie.astype(dtype)
+
+
+def aplicar(df, colunas=None):
+    """
+    Converte (no próprio DataFrame) as colunas presentes para o tipo do ESQUEMA.
+    Colunas que já estão no tipo certo não são copiadas.
+    """
+    for coluna in (colunas or df.columns):
+        dtype = ESQUEMA.get(coluna)
+        if dtype is None or coluna not in df.columns: continue
+        if dtype == 'category' and isinstance(df[coluna].dtype, pd.CategoricalDtype): continue
+        if str(df[coluna].dtype) == dtype: continue
+        df[coluna] = _converter(df[coluna], dtype)
+    return df
+
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def relatar(df, etapa):
+    """Imprime o uso de memória do DataFrame ao final de uma etapa."""
+    print(f"   🧠 Memória após {etapa}: {memoria_mb(df):.1f} MB ({len(df)} linhas)")
@@ -0,0 +1,278 @@
+"""(Instrumentação do ETL: spans por etapa e por arquivo com tempo, CPU, linhas, bytes e memória)"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, o pico de RSS fica nulo
+    resource = None
+
+CAMINHO_RELATORIO = os.path.join("data", "relatorio_execucao.json")
+PASTA_PERFIS = "data"
+CONTADORES = ('linhas_entrada', 'linhas_saida', 'bytes_lidos', 'bytes_escritos')
+
+_spans = []
+_trava = threading.Lock()
+_atual = contextvars.ContextVar('span_atual', default=None)
+_execucao = {'inicio': time.time()}
+_perfil = {'etapa': None, 'modo': 'cprofile', 'profiler': None}
+
+
+def pico_rss_mb():
+    """
+    Maior RSS do processo desde que ele começou (ru_maxrss vem em KB no Linux e em bytes
+    no macOS). Não volta a cair: não mede o consumo de uma etapa isolada.
+    """
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def rss_atual_mb():
+    """RSS do processo agora (Linux, via /proc/self/statm); None onde não houver /proc."""
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def tamanho_em_disco(caminho):
+    """Bytes de um arquivo ou da soma dos arquivos de uma pasta (ex.: dataset Parquet)."""
+    if not caminho or not os.path.exists(caminho): return 0
+    if os.path.isfile(caminho): return os.path.getsize(caminho)
+    return sum(os.path.getsize(os.path.join(raiz, nome)) for raiz, _, nomes in os.walk(caminho) for nome in nomes)
+
+
+class Span:
+    def __init__(self, etapa, pai, atributos):
+        self.dados = {
+            'etapa': etapa,
+            'caminho': f"{pai.dados['caminho']}/{etapa}" if pai else etapa,
+            **atributos,
+            **dict.fromkeys(CONTADORES),
+        }
+
+    def registrar(self, **contadores):
+        """Soma linhas/bytes ao span (pode ser chamado a cada bloco)."""
+        for nome, valor in contadores.items():
+            if valor is None: continue
+            self.dados[nome] = (self.dados.get(nome) or 0) + int(valor)
+
+
+def registrar(**contadores):
+    """Soma contadores ao span em andamento; sem span ativo, não faz nada."""
+    span_atual = _atual.get()
+    if span_atual is not None:
+        span_atual.registrar(**contadores)
+
+
+@contextmanager
+def span(etapa, **atributos):
+    """
+    Mede um trecho do ETL: tempo de parede, CPU do processo, variação do RSS entre o início
+    e o fim do trecho, o pico de RSS do processo até o fim dele e os contadores informados
+    via `registrar`. Spans aninhados ganham o caminho do pai (pipeline/coleta/arquivo).
+    """
+    s = Span(etapa, _atual.get(), atributos)
+    token = _atual.set(s)
+    perfil = _iniciar_perfil(etapa)
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    rss_inicio = rss_atual_mb()
+    s.dados['inicio'] = time.time()
+    try:
+        yield s
+    except Exception as e:
+        s.dados['erro'] = repr(e)
+        raise
+    finally:
+        s.dados['duracao_s'] = round(time.perf_counter() - inicio, 6)
+        s.dados['cpu_s'] = round(time.process_time() - inicio_cpu, 6)
+        rss_fim = rss_atual_mb()
+        s.dados['variacao_rss_mb'] = round(rss_fim - rss_inicio, 3) if None not in (rss_inicio, rss_fim) else None
+        # Pico do processo até o fim da etapa (inclui o que etapas anteriores já tinham alocado)
+        s.dados['pico_rss_processo_mb'] = pico_rss_mb()
+        _finalizar_perfil(perfil, s)
+        _atual.reset(token)
+        with _trava:
+            _spans.append(s.dados)
+
+
+def medir(etapa=None):
+    """Decorador: a função inteira vira um span (por padrão, com o nome dela)."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with span(etapa or funcao.__name__):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def mapear(pool, funcao, itens):
+    """
+    Como `pool.map` num ThreadPoolExecutor, mas cada item roda numa cópia do contexto de
+    quem chama: os spans abertos nas threads ficam sob o span em andamento (download/download_zip).
+    """
+    futuros = [pool.submit(contextvars.copy_context().run, funcao, item) for item in itens]
+    return [futuro.result() for futuro in futuros]
+
+
+# --- Perfil opcional de uma etapa (cProfile ou tracemalloc) ---
+def configurar_perfil(etapa, modo='cprofile'):
+    if modo not in ('cprofile', 'tracemalloc'):
+        raise ValueError(f"Modo de perfil desconhecido: {modo}")
+    _perfil.update(etapa=etapa, modo=modo, profiler=None)
+
+
+def _iniciar_perfil(etapa):
+    if etapa != _perfil['etapa']: return None
+    if _perfil['modo'] == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start(10)
+        return 'tracemalloc'
+    import cProfile
+    # Um profiler por execução: spans repetidos (ex.: um por arquivo) acumulam no mesmo
+    if _perfil['profiler'] is None:
+        _perfil['profiler'] = cProfile.Profile()
+    _perfil['profiler'].enable()
+    return 'cprofile'
+
+
+def _finalizar_perfil(perfil, s):
+    if perfil == 'cprofile':
+        _perfil['profiler'].disable()
+        caminho = os.path.join(PASTA_PERFIS, f"perfil_{s.dados['etapa']}.prof")
+        os.makedirs(PASTA_PERFIS, exist_ok=True)
+        _perfil['profiler'].dump_stats(caminho)
+        s.dados['perfil'] = caminho
+    elif perfil == 'tracemalloc':
+        import tracemalloc
+        _, pico = tracemalloc.get_traced_memory()
+        maiores = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        tracemalloc.stop()
+        s.dados['tracemalloc'] = {'pico_mb': round(pico / (1024 * 1024), 3), 'maiores': [str(e) for e in maiores]}
+
+
+# --- Coleta entre processos (workers do ProcessPoolExecutor) ---
+def drenar():
+    """Remove e devolve os spans registrados neste processo (para enviar ao processo principal)."""
+    with _trava:
+        spans = list(_spans)
+        _spans.clear()
+    return spans
+
+
+def iniciar_processo():
+    """Num worker criado por fork, descarta os spans e o span em andamento herdados do pai."""
+    drenar()
+    _atual.set(None)
+
+
+def incorporar(spans):
+    """Junta spans vindos de outro processo, pendurados no span em andamento deste."""
+    pai = _atual.get()
+    for dados in spans or []:
+        if pai is not None: dados['caminho'] = f"{pai.dados['caminho']}/{dados['caminho']}"
+    with _trava:
+        _spans.extend(spans or [])
+
+
+# --- Relatórios ---
+def reiniciar():
+    drenar()
+    _execucao['inicio'] = time.time()
+
+
+def resumo_por_etapa(spans=None):
+    """
+    Totais por etapa: execuções, tempo, CPU e contadores somados, a maior variação de RSS
+    numa execução e o maior pico de RSS do processo (ou do worker) ao fim delas.
+    """
+    resumo = {}
+    for dados in (_spans if spans is None else spans):
+        etapa = resumo.setdefault(dados['etapa'], {'execucoes': 0, 'duracao_s': 0.0, 'cpu_s': 0.0,
+                                                   **dict.fromkeys(CONTADORES, 0), 'variacao_rss_mb': None,
+                                                   'pico_rss_processo_mb': None, 'erros': 0})
+        etapa['execucoes'] += 1
+        etapa['duracao_s'] += dados['duracao_s']
+        etapa['cpu_s'] += dados['cpu_s']
+        for nome in CONTADORES:
+            etapa[nome] += dados.get(nome) or 0
+        if dados.get('variacao_rss_mb') is not None:
+            etapa['variacao_rss_mb'] = max(v for v in (etapa['variacao_rss_mb'], dados['variacao_rss_mb'])
+                                           if v is not None)
+        if dados.get('pico_rss_processo_mb') is not None:
+            etapa['pico_rss_processo_mb'] = max(etapa['pico_rss_processo_mb'] or 0, dados['pico_rss_processo_mb'])
+        etapa['erros'] += 'erro' in dados
+    for etapa in resumo.values():
+        etapa['duracao_s'], etapa['cpu_s'] = round(etapa['duracao_s'], 6), round(etapa['cpu_s'], 6)
+    return resumo
+
+
+def relatorio():
+    with _trava:
+        spans = list(_spans)
+    return {
+        'inicio': _execucao['inicio'],
+        'duracao_s': round(time.time() - _execucao['inicio'], 3),
+        'pico_rss_processo_mb': pico_rss_mb(),
+        'etapas': resumo_por_etapa(spans),
+        'spans': spans,
+    }
+
+
+def _gravar(caminho, texto):
+    # Escrita atômica: quem lê (ex.: node_exporter) nunca vê o arquivo pela metade
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(texto)
+    os.replace(tmp, caminho)
+    return caminho
+
+
+def salvar_relatorio(caminho=CAMINHO_RELATORIO):
+    return _gravar(caminho, json.dumps(relatorio(), ensure_ascii=False, indent=2))
+
+
+METRICAS_PROMETHEUS = [
+    ('etl_etapa_duracao_segundos', 'duracao_s', 'Tempo de parede somado da etapa na última execução'),
+    ('etl_etapa_cpu_segundos', 'cpu_s', 'Tempo de CPU do processo somado da etapa'),
+    ('etl_etapa_execucoes', 'execucoes', 'Quantas vezes a etapa rodou (ex.: uma por arquivo)'),
+    ('etl_etapa_linhas_entrada', 'linhas_entrada', 'Linhas lidas pela etapa'),
+    ('etl_etapa_linhas_saida', 'linhas_saida', 'Linhas produzidas pela etapa'),
+    ('etl_etapa_bytes_lidos', 'bytes_lidos', 'Bytes lidos (rede ou disco) pela etapa'),
+    ('etl_etapa_bytes_escritos', 'bytes_escritos', 'Bytes gravados em disco pela etapa'),
+    ('etl_etapa_erros', 'erros', 'Execuções da etapa que terminaram com exceção'),
+]
+
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formato_prometheus():
+    """Relatório no formato texto do Prometheus (para o textfile collector do node_exporter)."""
+    dados = relatorio()
+    linhas = []
+    for metrica, chave, descricao in METRICAS_PROMETHEUS:
+        linhas += [f"# HELP {metrica} {descricao}", f"# TYPE {metrica} gauge"]
+        linhas += [f'{metrica}{{etapa="{_rotulo(etapa)}"}} {valores[chave]}' for etapa, valores in dados['etapas'].items()]
+    linhas += ["# HELP etl_pico_rss_bytes Pico de RSS do processo do ETL na execução inteira", "# TYPE etl_pico_rss_bytes gauge",
+               f"etl_pico_rss_bytes {int((dados['pico_rss_processo_mb'] or 0) * 1024 * 1024)}",
+               "# HELP etl_ultima_execucao_timestamp_segundos Início da última execução",
+               "# TYPE etl_ultima_execucao_timestamp_segundos gauge",
+               f"etl_ultima_execucao_timestamp_segundos {dados['inicio']:.0f}"]
+    return "\n".join(linhas) + "\n"
+
+
+def salvar_prometheus(caminho):
+    return _gravar(caminho, formato_prometheus())
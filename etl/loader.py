@@ -0,0 +1,177 @@
+"""(Carga direta do ETL no banco: operadoras, despesas e agregados com upsert)"""
+import os
+import time
+from datetime import date, datetime
+
+import pandas as pd
+from sqlalchemy import create_engine, delete, insert, update
+
+from backend import database, models
+from . import armazenamento, cadastro, esquema, instrumentacao, rollups
+
+TAMANHO_LOTE = 5000
+
+
+def _insert_upsert(conexao, tabela, chaves, atualizar):
+    """INSERT com atualização em conflito de chave, no dialeto do banco conectado."""
+    dialeto = conexao.dialect.name
+    if dialeto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as insert_mysql
+        stmt = insert_mysql(tabela)
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in atualizar})
+    if dialeto in ('sqlite', 'postgresql'):
+        if dialeto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+        stmt = insert_dialeto(tabela)
+        return stmt.on_conflict_do_update(index_elements=chaves, set_={c: stmt.excluded[c] for c in atualizar})
+    raise ValueError(f"Upsert não suportado para o dialeto '{dialeto}' (suportados: mysql, sqlite, postgresql)")
+
+
+def _registros(df):
+    # Tipos do numpy/pandas viram tipos Python; ausentes viram None (NULL)
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def _executar_em_lotes(conexao, stmt, registros, tamanho_lote=TAMANHO_LOTE):
+    # executemany: o SQLAlchemy agrupa cada lote em INSERTs multi-linha (insertmanyvalues)
+    for inicio in range(0, len(registros), tamanho_lote):
+        conexao.execute(stmt, registros[inicio:inicio + tamanho_lote])
+
+
+def _relatar(nome, linhas, inicio):
+    duracao = max(time.perf_counter() - inicio, 1e-9)
+    print(f"   ⚡ {nome}: {linhas} linhas em {duracao:.2f}s ({linhas / duracao:,.0f} linhas/s)")
+
+
+def preparar_operadoras(cadop, df_despesas=None):
+    """
+    Linhas da tabela operadoras: o cadastro ativo mais as operadoras que só aparecem
+    nas despesas (ex.: canceladas), para que toda despesa tenha sua operadora.
+    """
+    if cadop is not None:
+        df = cadop.df.reset_index()
+    else:
+        df = pd.DataFrame(columns=['RegistroANS'] + cadastro.COLUNAS_CADASTRO)
+    if df_despesas is not None and not df_despesas.empty:
+        extras = esquema.aplicar(df_despesas[['RegistroANS', 'CNPJ', 'RazaoSocial']].copy())
+        extras = extras.dropna(subset=['RegistroANS']).drop_duplicates(subset=['RegistroANS'])
+        extras = extras[~extras['RegistroANS'].isin(df['RegistroANS'])]
+        df = pd.concat([df.astype(object), extras.astype(object)], ignore_index=True)
+
+    df = df.drop_duplicates(subset=['RegistroANS']).reset_index(drop=True)
+    # cnpj é UNIQUE na tabela: o CNPJ fica com a primeira operadora e as demais entram
+    # sem CNPJ, em vez de sumirem (as despesas delas precisam da operadora pela FK)
+    repetidos = df['CNPJ'].notna() & df['CNPJ'].duplicated()
+    if repetidos.any():
+        registros = df.loc[repetidos, 'RegistroANS'].astype('int64').tolist()
+        print(f"   ⚠️ {len(registros)} operadora(s) com CNPJ repetido gravada(s) sem CNPJ: {registros[:10]}")
+        df['CNPJ'] = df['CNPJ'].astype(object).where(~repetidos, None)
+    return pd.DataFrame({
+        'registro_ans': df['RegistroANS'].astype('int64'),
+        'cnpj': df['CNPJ'],
+        # NOT NULL na tabela (índice da ordenação por nome): operadora sem nome fica com ""
+        'razao_social': df['RazaoSocial'].astype(object).where(df['RazaoSocial'].notna(), ''),
+        'modalidade': df.get('Modalidade'),
+        'uf': df.get('UF'),
+    })
+
+
+def preparar_despesas(df_despesas):
+    """Soma as contas de despesa em uma linha por (registro_ans, ano, trimestre)."""
+    df = esquema.aplicar(df_despesas[['RegistroANS', 'Ano', 'Trimestre', 'ValorDespesas']].copy())
+    df = df.dropna(subset=['RegistroANS'])
+    df = df.groupby(['RegistroANS', 'Ano', 'Trimestre'], observed=True, as_index=False)['ValorDespesas'].sum()
+    return pd.DataFrame({
+        'registro_ans': df['RegistroANS'].astype('int64'),
+        'ano': df['Ano'].astype('int64'),
+        'trimestre': df['Trimestre'].astype('int64'),
+        'valor': df['ValorDespesas'].round(2),
+        'data_evento': [date(int(a), int(t) * 3 - 2, 1) for a, t in zip(df['Ano'], df['Trimestre'])],
+    })
+
+
+def preparar_agregadas(df_agregado):
+    return pd.DataFrame({
+        'registro_ans': esquema.aplicar(df_agregado[['RegistroANS']].copy())['RegistroANS'],
+        'razao_social': df_agregado['RazaoSocial'],
+        'uf': df_agregado['UF'],
+        'total_despesas': df_agregado['TotalDespesas'].round(2),
+        'media_despesas': df_agregado['MediaTrimestral'].round(2),
+        'desvio_padrao': df_agregado['DesvioPadrao'].round(2),
+        'data_processamento': date.today(),
+    })
+
+
+def carregar_operadoras(conexao, df_operadoras):
+    inicio = time.perf_counter()
+    tabela = models.Operadora.__table__
+    stmt = _insert_upsert(conexao, tabela, ['registro_ans'], ['cnpj', 'razao_social', 'modalidade', 'uf'])
+    _executar_em_lotes(conexao, stmt, _registros(df_operadoras))
+    _relatar("operadoras", len(df_operadoras), inicio)
+
+
+def carregar_despesas(conexao, df_despesas):
+    inicio = time.perf_counter()
+    tabela = models.Despesa.__table__
+    stmt = _insert_upsert(conexao, tabela, ['registro_ans', 'ano', 'trimestre'], ['valor', 'data_evento'])
+    _executar_em_lotes(conexao, stmt, _registros(df_despesas))
+    _relatar("despesas", len(df_despesas), inicio)
+
+
+def carregar_agregadas(conexao, df_agregadas):
+    """O agregado é um retrato completo: substitui a tabela inteira na mesma transação."""
+    inicio = time.perf_counter()
+    tabela = models.DespesaAgregada.__table__
+    conexao.execute(delete(tabela))
+    _executar_em_lotes(conexao, insert(tabela), _registros(df_agregadas))
+    _relatar("despesas_agregadas", len(df_agregadas), inicio)
+
+
+def registrar_versao(conexao):
+    """Incrementa o carimbo de versão dos dados; a API usa-o para invalidar cache e ETags."""
+    tabela = models.VersaoDados.__table__
+    agora = datetime.now()
+    atualizados = conexao.execute(
+        update(tabela).where(tabela.c.id == 1).values(versao=tabela.c.versao + 1, atualizado_em=agora)).rowcount
+    if not atualizados:
+        conexao.execute(insert(tabela).values(id=1, versao=1, atualizado_em=agora))
+    return conexao.execute(tabela.select().where(tabela.c.id == 1)).one().versao
+
+
+@instrumentacao.medir('carga')
+def carregar(df_despesas, df_agregado=None, cadop=None, url=None):
+    """
+    Grava operadoras, despesas e agregados no banco (DATABASE_URL ou `url`), tudo em
+    uma transação, e atualiza as tabelas de resumo dos trimestres carregados.
+    Recarregar os mesmos trimestres é idempotente.
+    """
+    print("\n>>> [Carga] Gravando no banco de dados...")
+    engine = create_engine(url) if url else database.engine
+    models.Base.metadata.create_all(bind=engine)
+    if cadop is None:
+        try:
+            cadop = cadastro.carregar()
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️ Cadastro indisponível ({e}); operadoras vêm só das despesas.")
+
+    with engine.begin() as conexao:
+        carregar_operadoras(conexao, preparar_operadoras(cadop, df_despesas))
+        despesas = preparar_despesas(df_despesas)
+        carregar_despesas(conexao, despesas)
+        rollups.atualizar(conexao, zip(despesas['ano'], despesas['trimestre']))
+        if df_agregado is not None:
+            carregar_agregadas(conexao, preparar_agregadas(df_agregado))
+        versao = registrar_versao(conexao)
+    instrumentacao.registrar(linhas_entrada=len(df_despesas), linhas_saida=len(despesas))
+    print(f"   ✅ Carga concluída (versão dos dados: {versao}).")
+
+
+if __name__ == "__main__":
+    # Carrega os arquivos já gerados pelo ETL em data/
+    formato = 'parquet' if os.path.isdir(os.path.join("data", "consolidado_despesas")) else 'csv'
+    df_consolidado = armazenamento.ler_consolidado(os.path.join("data", "consolidado_despesas"), formato)
+    df_final = armazenamento.ler_tabela(os.path.join("data", "despesas_agregadas"), formato)
+    carregar(df_consolidado, df_final)
@@ -0,0 +1,67 @@
+"""(Manifesto da execução do ETL: o que já foi processado de cada arquivo de origem)"""
+import json
+import os
+import zipfile
+
+from . import cache
+
+CAMINHO_MANIFESTO_ETL = os.path.join("data", "manifesto_etl.json")
+SEPARADOR_ZIP = "!"
+
+
+def carregar(caminho_manifesto=CAMINHO_MANIFESTO_ETL):
+    """
+    Lê o manifesto {'arquivos': {caminho: {...}}, 'cadastro_sha256': ...}.
+    """
+    if not os.path.exists(caminho_manifesto): return {'arquivos': {}}
+    try:
+        with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        print(f"   ⚠️ Manifesto do ETL corrompido, reprocessando tudo: {caminho_manifesto}")
+        return {'arquivos': {}}
+    dados.setdefault('arquivos', {})
+    return dados
+
+
+def salvar(manifesto, caminho_manifesto=CAMINHO_MANIFESTO_ETL):
+    os.makedirs(os.path.dirname(caminho_manifesto) or ".", exist_ok=True)
+    tmp = f"{caminho_manifesto}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, caminho_manifesto)
+
+
+def assinatura(caminho):
+    """Tamanho + mtime do arquivo físico: checagem barata antes de calcular o hash."""
+    fisico = caminho.split(SEPARADOR_ZIP, 1)[0]
+    st = os.stat(fisico)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def hash_fonte(caminho):
+    """
+    Hash do conteúdo de um arquivo de origem. Para membros de ZIP usa o CRC32 e o
+    tamanho registrados no próprio ZIP, sem descompactar o membro.
+    """
+    if SEPARADOR_ZIP in caminho:
+        caminho_zip, membro = caminho.split(SEPARADOR_ZIP, 1)
+        with zipfile.ZipFile(caminho_zip, 'r') as z:
+            info = z.getinfo(membro)
+        return f"crc32:{info.CRC:08x}:{info.file_size}"
+    return f"sha256:{cache.calcular_sha256(caminho)}"
+
+
+def fonte_inalterada(entrada, caminho, formato):
+    """
+    Confere se o arquivo ainda corresponde à entrada do manifesto. Atualiza a
+    assinatura da entrada quando só o mtime mudou.
+    """
+    if not entrada or entrada.get('formato') != formato: return False
+    if entrada.get('particao') and not os.path.exists(entrada['particao']): return False
+
+    atual = assinatura(caminho)
+    if atual == entrada.get('assinatura'): return True
+    if hash_fonte(caminho) != entrada.get('hash'): return False
+    entrada['assinatura'] = atual
+    return True
@@ -0,0 +1,196 @@
+"""(Execução do ETL completo em memória: download -> normalização -> enriquecimento -> validação -> agregação)"""
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+
+from . import aggregator, armazenamento, downloader, esquema, instrumentacao, manifesto, processor
+
+PASTA_DADOS = "data"
+
+
+@dataclass
+class ConfigPipeline:
+    qtd_trimestres: int = downloader.QTD_TRIMESTRES_PADRAO
+    max_downloads: int = downloader.MAX_DOWNLOADS_PADRAO
+    streaming: bool = False
+    memoria_mb: int = downloader.MEMORIA_PADRAO_MB
+    workers: int = 1
+    formato: str = 'csv'
+    # O que é materializado no disco; o restante só existe em memória entre as etapas
+    salvar_consolidado: bool = True
+    salvar_debug: bool = False
+    exportar_csv: bool = False
+    # Reprocessa só arquivos novos/alterados e recalcula só as operadoras afetadas
+    incremental: bool = False
+    # Grava operadoras/despesas/agregados no banco (DATABASE_URL) ao final
+    carregar_banco: bool = False
+    # Métricas por etapa: o JSON sempre vai para data/relatorio_execucao.json; Prometheus é opcional
+    metricas_prometheus: str = None
+    # Etapa a perfilar (ex.: 'enriquecimento', 'arquivo') com cProfile ou tracemalloc
+    perfil: str = None
+    perfil_modo: str = 'cprofile'
+
+
+def _caminho(nome):
+    return os.path.join(PASTA_DADOS, nome)
+
+
+def executar(config=None):
+    """
+    Roda o pipeline passando DataFrames tipados de uma etapa para a outra, sem
+    gravar e reler o consolidado. Retorna o DataFrame agregado.
+    Ao final (mesmo com erro) grava o relatório de tempo/linhas/memória por etapa.
+    """
+    config = config or ConfigPipeline()
+    instrumentacao.reiniciar()
+    if config.perfil:
+        instrumentacao.configurar_perfil(config.perfil, config.perfil_modo)
+    try:
+        with instrumentacao.span('pipeline', incremental=config.incremental):
+            return _executar(config)
+    finally:
+        _salvar_metricas(config)
+
+
+def _salvar_metricas(config):
+    caminho = instrumentacao.salvar_relatorio()
+    print(f"   ⏱️ Relatório de execução em {caminho}")
+    if config.metricas_prometheus:
+        print(f"   ⏱️ Métricas Prometheus em {instrumentacao.salvar_prometheus(config.metricas_prometheus)}")
+
+
+def _executar(config):
+    # 1. DOWNLOAD (Ingestão)
+    downloader.baixar_dados(qtd_trimestres=config.qtd_trimestres, max_downloads=config.max_downloads,
+                            extrair=not config.streaming)
+    if config.incremental:
+        return _executar_incremental(config)
+
+    df_bruto = downloader.coletar_despesas(origem='zip' if config.streaming else 'pastas',
+                                           memoria_mb=config.memoria_mb, workers=config.workers)
+    if df_bruto.empty:
+        print("❌ Erro: Nenhuma despesa consolidada.")
+        return None
+
+    if config.salvar_consolidado:
+        caminho = armazenamento.salvar_consolidado(df_bruto, _caminho("consolidado_despesas"), config.formato)
+        if config.formato == 'parquet' and config.exportar_csv:
+            armazenamento.salvar_consolidado(df_bruto, _caminho("consolidado_despesas"), 'csv')
+        print(f"   💾 Consolidado gravado em {caminho}")
+
+    # 2. ENRIQUECIMENTO
+    print("\n>>> EXECUTANDO ENRIQUECIMENTO (JOIN)...")
+    df_enriquecido = aggregator.enriquecer_dados(df_bruto)
+    del df_bruto
+    esquema.relatar(df_enriquecido, "o enriquecimento")
+
+    # 3. VALIDAÇÃO
+    print("\n>>> EXECUTANDO VALIDAÇÃO DE DADOS...")
+    df_validado = processor.aplicar_validacoes(df_enriquecido)
+    esquema.relatar(df_validado, "a validação")
+
+    if config.salvar_debug:
+        armazenamento.salvar_tabela(df_validado, _caminho("debug_dados_completos"), config.formato)
+
+    # 4. AGREGAÇÃO
+    print("\n>>> EXECUTANDO AGREGAÇÃO FINAL...")
+    df_final = aggregator.agregar_dados(df_validado)
+
+    # 5. SALVAR
+    caminho_final = armazenamento.salvar_tabela(df_final, _caminho("despesas_agregadas"), config.formato)
+    if config.formato == 'parquet' and config.exportar_csv:
+        armazenamento.salvar_tabela(df_final, _caminho("despesas_agregadas"), 'csv')
+
+    # 6. CARGA
+    if config.carregar_banco:
+        from . import loader  # importa o backend (SQLAlchemy + driver) só quando vai usar o banco
+        loader.carregar(df_validado, df_final)
+    print(f"\n✅ PROCESSO CONCLUÍDO! Arquivo final gerado: {caminho_final}")
+    return df_final
+
+
+def _ler_agregado_anterior(formato):
+    caminho = _caminho("despesas_agregadas")
+    if not os.path.exists(f"{caminho}.{formato}"): return None
+    return esquema.aplicar(armazenamento.ler_tabela(caminho, formato))
+
+
+def _executar_incremental(config):
+    """
+    Atualiza só as partições de arquivos novos/alterados e recalcula enriquecimento,
+    validação e agregação apenas para as operadoras presentes nesses arquivos,
+    aproveitando o agregado anterior para as demais. Se o cadastro de operadoras
+    mudou, o agregado é refeito por completo. As partições são processadas uma a
+    uma, então a memória fica limitada a uma partição mais o estado por operadora.
+    """
+    alteracoes = downloader.atualizar_particoes(origem='zip' if config.streaming else 'pastas',
+                                                memoria_mb=config.memoria_mb, workers=config.workers,
+                                                formato=config.formato)
+    houve_mudanca = bool(alteracoes['processados'] or alteracoes['removidos'])
+
+    print("\n>>> Verificando cadastro de operadoras...")
+    sha_cadastro = aggregator.atualizar_cadastro()
+    dados_manifesto = manifesto.carregar()
+    cadastro_mudou = dados_manifesto.get('cadastro_sha256') != sha_cadastro
+
+    anterior = None if cadastro_mudou else _ler_agregado_anterior(config.formato)
+    if anterior is not None and not houve_mudanca:
+        print("\n✅ Nenhum arquivo ou cadastro alterado; agregado anterior mantido.")
+        return anterior
+
+    if config.salvar_consolidado and houve_mudanca:
+        caminho_csv = _caminho("consolidado_despesas.csv")
+        if config.formato == 'csv':
+            downloader.consolidar_particoes(alteracoes['particoes'], caminho_csv)
+        elif config.exportar_csv:
+            armazenamento.exportar_particoes_csv(alteracoes['particoes'], caminho_csv)
+
+    afetadas = esquema.aplicar(pd.DataFrame({'RegistroANS': sorted(alteracoes['operadoras'])}))['RegistroANS']
+    if anterior is not None:
+        print(f"\n>>> Recalculando {len(afetadas)} operadora(s) em "
+              f"{len(alteracoes['trimestres'])} trimestre(s) afetado(s)...")
+
+    # Cada partição é enriquecida, validada e dobrada no agregador antes de ler a próxima
+    print("\n>>> EXECUTANDO ENRIQUECIMENTO, VALIDAÇÃO E AGREGAÇÃO POR PARTIÇÃO...")
+    cadop = aggregator.baixar_cadastro_operadoras(revalidar=False)
+    agregador = aggregator.AgregadorIncremental()
+    debug = []
+    for particao in alteracoes['particoes']:
+        df_bruto = armazenamento.ler_particoes([particao])
+        if anterior is not None:
+            df_bruto = df_bruto[df_bruto['RegistroANS'].isin(afetadas)].reset_index(drop=True)
+        if df_bruto.empty: continue
+        df_validado = processor.aplicar_validacoes(aggregator.enriquecer_dados(df_bruto, cadop))
+        with instrumentacao.span('agregacao'):
+            agregador.adicionar(df_validado)
+            instrumentacao.registrar(linhas_entrada=len(df_validado))
+        if config.salvar_debug: debug.append(df_validado)
+    if debug:
+        armazenamento.salvar_tabela(pd.concat(debug, ignore_index=True), _caminho("debug_dados_completos"),
+                                    config.formato)
+
+    with instrumentacao.span('agregacao'):
+        df_final = agregador.resultado()
+        instrumentacao.registrar(linhas_saida=len(df_final))
+    print(f"   📊 {agregador.linhas} registros agregados em {len(df_final)} operadoras.")
+    if anterior is not None:
+        mantidas = anterior[~anterior['RegistroANS'].isin(afetadas)]
+        df_final = esquema.aplicar(pd.concat([mantidas, df_final], ignore_index=True))
+        df_final = df_final.sort_values(by='TotalDespesas', ascending=False)
+
+    caminho_final = armazenamento.salvar_tabela(df_final, _caminho("despesas_agregadas"), config.formato)
+    if config.formato == 'parquet' and config.exportar_csv:
+        armazenamento.salvar_tabela(df_final, _caminho("despesas_agregadas"), 'csv')
+
+    if config.carregar_banco:
+        from . import loader
+        # Recarrega só os trimestres afetados (upsert), com todas as partições de cada um
+        tocadas = [e['particao'] for e in dados_manifesto['arquivos'].values()
+                   if e.get('particao') and (e['ano'], e['trimestre']) in alteracoes['trimestres']]
+        loader.carregar(armazenamento.ler_particoes(tocadas), df_final, cadop)
+
+    dados_manifesto['cadastro_sha256'] = sha_cadastro
+    manifesto.salvar(dados_manifesto)
+    print(f"\n✅ PROCESSO CONCLUÍDO! Arquivo final gerado: {caminho_final}")
+    return df_final
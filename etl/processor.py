@@ -1,8 +1,11 @@
 """(Lógica de limpeza e validação - Teste 1.3 e 2.1)"""
+import numpy as np
 import pandas as pd
 import re
 import os
 
+from . import instrumentacao
+
 def validar_cnpj_calculo(cnpj_in):
     """
     Realiza o cálculo matemático (Módulo 11) para validar o CNPJ.
@@ -32,21 +35,59 @@ def validar_cnpj_calculo(cnpj_in):
 
     return True
 
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int32)
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int32)
+
+def validar_cnpjs_em_lote(serie):
+    """
+    Versão vetorizada de `validar_cnpj_calculo` para uma Series inteira.
+
+    Cada CNPJ distinto é validado uma única vez: os dígitos viram uma matriz
+    (n, 14) uint8 e os dois dígitos verificadores saem de produtos matriciais.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Valida só as categorias e espalha pelos códigos; ausente (-1) é inválido
+        validas = np.append(validar_cnpjs_em_lote(pd.Series(serie.cat.categories)).to_numpy(), False)
+        return pd.Series(validas[serie.cat.codes.to_numpy()], index=serie.index)
+
+    codigos, unicos = pd.factorize(serie.astype(str), use_na_sentinel=False)
+    limpos = pd.Series(unicos, dtype=object).str.replace(r'[^0-9]', '', regex=True)
+
+    validos_unicos = np.zeros(len(limpos), dtype=bool)
+    tem_14 = (limpos.str.len() == 14).to_numpy()
+    if tem_14.any():
+        texto = ''.join(limpos[tem_14]).encode('ascii')
+        digitos = (np.frombuffer(texto, dtype=np.uint8) - ord('0')).reshape(-1, 14)
+
+        resto_1 = (digitos[:, :12] @ PESOS_DV1) % 11
+        dv1 = np.where(resto_1 < 2, 0, 11 - resto_1)
+        resto_2 = (digitos[:, :13] @ PESOS_DV2) % 11
+        dv2 = np.where(resto_2 < 2, 0, 11 - resto_2)
+
+        repetidos = (digitos == digitos[:, :1]).all(axis=1)
+        validos_unicos[tem_14] = (digitos[:, 12] == dv1) & (digitos[:, 13] == dv2) & ~repetidos
+
+    return pd.Series(validos_unicos[codigos], index=serie.index)
+
+@instrumentacao.medir('validacao')
 def aplicar_validacoes(df):
     """
     Recebe um DataFrame JÁ COM CNPJ (pós-join) e aplica as validações.
     """
     print(">>> [Validação] Iniciando validação de regras de negócio...")
     
-    df['CNPJ'] = df['CNPJ'].astype(str)
-    df['flag_cnpj_valido'] = df['CNPJ'].apply(validar_cnpj_calculo)
+    if not isinstance(df['CNPJ'].dtype, pd.CategoricalDtype):
+        df['CNPJ'] = df['CNPJ'].astype(str)
+    df['flag_cnpj_valido'] = validar_cnpjs_em_lote(df['CNPJ'])
     
     qtd_invalidos = (~df['flag_cnpj_valido']).sum()
     print(f"   -> CNPJs matematicamente inválidos: {qtd_invalidos}")
 
-    if 'ValorDespesas' in df.columns:
+    # Vindo do pipeline em memória o valor já é float; só converte quando chega como texto
+    if 'ValorDespesas' in df.columns and not pd.api.types.is_float_dtype(df['ValorDespesas']):
         df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0.0).abs()
 
+    instrumentacao.registrar(linhas_entrada=len(df), linhas_saida=len(df))
     return df
 
 def limpar_e_validar_dados(caminho_arquivo_entrada):
@@ -59,7 +100,7 @@ def limpar_e_validar_dados(caminho_arquivo_entrada):
     df = pd.read_csv(caminho_arquivo_entrada, sep=';', encoding='utf-8', dtype={'CNPJ': str})
 
     print("   Aplicando validação matemática de CNPJ...")
-    df['flag_cnpj_valido'] = df['CNPJ'].apply(validar_cnpj_calculo)
+    df['flag_cnpj_valido'] = validar_cnpjs_em_lote(df['CNPJ'])
     
 
     invalidos = len(df[~df['flag_cnpj_valido']])
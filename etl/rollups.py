@@ -0,0 +1,141 @@
+"""(Tabelas de resumo no banco: operadora x trimestre, UF x trimestre e resumo por operadora)"""
+import time
+
+from sqlalchemy import Float, and_, case, cast, delete, func, insert, literal, select, tuple_, update
+
+from backend import database, models
+from . import instrumentacao
+
+
+def _periodo(tabela):
+    return tabela.c.ano * 10 + tabela.c.trimestre
+
+
+def _nos_trimestres(tabela, trimestres):
+    return tuple_(tabela.c.ano, tabela.c.trimestre).in_(trimestres)
+
+
+def atualizar_operadora_trimestre(conexao, trimestres):
+    """Refaz as linhas operadora x trimestre dos trimestres carregados, com a UF do cadastro."""
+    resumo = models.ResumoOperadoraTrimestre.__table__
+    despesas = models.Despesa.__table__
+    operadoras = models.Operadora.__table__
+
+    conexao.execute(delete(resumo).where(_nos_trimestres(resumo, trimestres)))
+    origem = select(
+        despesas.c.registro_ans, despesas.c.ano, despesas.c.trimestre,
+        func.coalesce(operadoras.c.uf, 'ND'), despesas.c.valor,
+    ).select_from(
+        despesas.outerjoin(operadoras, operadoras.c.registro_ans == despesas.c.registro_ans)
+    ).where(_nos_trimestres(despesas, trimestres), despesas.c.registro_ans.is_not(None))
+    colunas = ['registro_ans', 'ano', 'trimestre', 'uf', 'valor']
+    return conexao.execute(insert(resumo).from_select(colunas, origem)).rowcount
+
+
+def trimestres_com_uf_desatualizada(conexao):
+    """
+    Trimestres já resumidos em que alguma operadora mudou de UF no cadastro desde então.
+    Refeitos junto com os carregados, os resumos seguem sempre a UF atual da operadora,
+    como a consulta original sobre despesas JOIN operadoras.
+    """
+    resumo = models.ResumoOperadoraTrimestre.__table__
+    operadoras = models.Operadora.__table__
+    return conexao.execute(select(resumo.c.ano, resumo.c.trimestre).select_from(
+        resumo.join(operadoras, operadoras.c.registro_ans == resumo.c.registro_ans)
+    ).where(resumo.c.uf != func.coalesce(operadoras.c.uf, 'ND')).distinct()).all()
+
+
+def atualizar_uf_trimestre(conexao, trimestres):
+    resumo_uf = models.ResumoUFTrimestre.__table__
+    resumo = models.ResumoOperadoraTrimestre.__table__
+
+    conexao.execute(delete(resumo_uf).where(_nos_trimestres(resumo_uf, trimestres)))
+    # Uma linha por operadora e trimestre: COUNT(*) já é o nº de operadoras distintas
+    origem = select(
+        resumo.c.uf, resumo.c.ano, resumo.c.trimestre, func.sum(resumo.c.valor), func.count(),
+    ).where(_nos_trimestres(resumo, trimestres)).group_by(resumo.c.uf, resumo.c.ano, resumo.c.trimestre)
+    colunas = ['uf', 'ano', 'trimestre', 'total', 'qtd_operadoras']
+    return conexao.execute(insert(resumo_uf).from_select(colunas, origem)).rowcount
+
+
+def atualizar_resumo_operadoras(conexao, trimestres):
+    """Primeiro/último trimestre e crescimento, só das operadoras com despesa nos trimestres carregados."""
+    resumo_op = models.ResumoOperadora.__table__
+    resumo = models.ResumoOperadoraTrimestre.__table__
+    operadoras = models.Operadora.__table__
+
+    afetadas = select(resumo.c.registro_ans).where(_nos_trimestres(resumo, trimestres)).distinct()
+    conexao.execute(delete(resumo_op).where(resumo_op.c.registro_ans.in_(afetadas)))
+
+    limites = select(
+        resumo.c.registro_ans,
+        func.min(_periodo(resumo)).label('primeiro'),
+        func.max(_periodo(resumo)).label('ultimo'),
+        func.count().label('qtd'),
+    ).where(resumo.c.registro_ans.in_(afetadas)).group_by(resumo.c.registro_ans).subquery()
+    inicio = resumo.alias('inicio')
+    fim = resumo.alias('fim')
+    crescimento = case(
+        (inicio.c.valor > 0, cast((fim.c.valor - inicio.c.valor) * 100, Float) / cast(inicio.c.valor, Float)),
+        else_=None,
+    )
+    origem = select(
+        limites.c.registro_ans, operadoras.c.razao_social, fim.c.uf,
+        limites.c.primeiro, inicio.c.valor, limites.c.ultimo, fim.c.valor,
+        crescimento, limites.c.qtd, literal(0),
+    ).select_from(
+        limites
+        .join(inicio, and_(inicio.c.registro_ans == limites.c.registro_ans, _periodo(inicio) == limites.c.primeiro))
+        .join(fim, and_(fim.c.registro_ans == limites.c.registro_ans, _periodo(fim) == limites.c.ultimo))
+        .outerjoin(operadoras, operadoras.c.registro_ans == limites.c.registro_ans)
+    )
+    colunas = ['registro_ans', 'razao_social', 'uf', 'primeiro_periodo', 'valor_inicial', 'ultimo_periodo',
+               'valor_final', 'crescimento_percentual', 'qtd_trimestres', 'qtd_trimestres_acima_media']
+    return conexao.execute(insert(resumo_op).from_select(colunas, origem)).rowcount
+
+
+def atualizar_acima_media(conexao):
+    """
+    Recalcula quantos trimestres de cada operadora ficaram acima da média global.
+    A média muda a cada carga, então essa contagem é refeita para todas (no ETL, não na API).
+    """
+    resumo_uf = models.ResumoUFTrimestre.__table__
+    resumo_op = models.ResumoOperadora.__table__
+    resumo = models.ResumoOperadoraTrimestre.__table__
+
+    total, qtd = conexao.execute(select(func.sum(resumo_uf.c.total), func.sum(resumo_uf.c.qtd_operadoras))).one()
+    media = float(total) / qtd if qtd else 0.0
+    acima = select(func.count()).where(
+        resumo.c.registro_ans == resumo_op.c.registro_ans, resumo.c.valor > media).scalar_subquery()
+    conexao.execute(update(resumo_op).values(qtd_trimestres_acima_media=acima))
+    return media
+
+
+@instrumentacao.medir('resumos')
+def atualizar(conexao, trimestres):
+    """Atualiza as tabelas de resumo para os (ano, trimestre) recém-carregados, na transação da carga."""
+    trimestres = {(int(ano), int(trimestre)) for ano, trimestre in trimestres}
+    if not trimestres: return
+    trimestres = sorted(trimestres | {(int(ano), int(trimestre))
+                                      for ano, trimestre in trimestres_com_uf_desatualizada(conexao)})
+    inicio = time.perf_counter()
+    linhas = atualizar_operadora_trimestre(conexao, trimestres)
+    atualizar_uf_trimestre(conexao, trimestres)
+    operadoras = atualizar_resumo_operadoras(conexao, trimestres)
+    media = atualizar_acima_media(conexao)
+    instrumentacao.registrar(linhas_saida=linhas)
+    print(f"   📈 Resumos: {linhas} linhas em {len(trimestres)} trimestre(s), {operadoras} operadora(s) "
+          f"atualizadas, média global {media:,.2f} ({time.perf_counter() - inicio:.2f}s)")
+
+
+def reconstruir(conexao):
+    """Refaz os resumos de todos os trimestres presentes na tabela despesas."""
+    despesas = models.Despesa.__table__
+    trimestres = select(despesas.c.ano, despesas.c.trimestre).where(despesas.c.ano.is_not(None)).distinct()
+    atualizar(conexao, conexao.execute(trimestres).all())
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conexao:
+        reconstruir(conexao)
@@ -1,42 +1,66 @@
-import pandas as pd
-import os
+import argparse
+from etl import armazenamento
 from etl import downloader
-from etl import processor
-from etl import aggregator 
+from etl import pipeline
 
-def main():
-    # 1. DOWNLOAD (Ingestão)
-    downloader.baixar_dados()
-    downloader.processar_incrementalmente() 
-    
-    caminho_bruto = os.path.join("data", "consolidado_despesas.csv")
-    if not os.path.exists(caminho_bruto):
-        print("❌ Erro: Arquivo bruto não gerado.")
-        return
 
-    
-    print("\n>>> CARREGANDO DADOS BRUTOS...")
-    df_bruto = pd.read_csv(caminho_bruto, sep=';', encoding='utf-8', dtype=str)
-
-    # 2. ENRIQUECIMENTO
-    print("\n>>> EXECUTANDO ENRIQUECIMENTO (JOIN)...")
-    df_enriquecido = aggregator.enriquecer_dados(df_bruto) 
-
-    # 3. VALIDAÇÃO 
-    print("\n>>> EXECUTANDO VALIDAÇÃO DE DADOS...")
-    df_validado = processor.aplicar_validacoes(df_enriquecido) 
-
-    df_validado.to_csv("data/debug_dados_completos.csv", index=False, sep=';')
-
-
-    print("\n>>> EXECUTANDO AGREGAÇÃO FINAL...")
-    df_final = aggregator.agregar_dados(df_validado)
-
-    # 5. SALVAR E COMPACTAR
-    caminho_final = os.path.join("data", "despesas_agregadas.csv")
-    df_final.to_csv(caminho_final, index=False, sep=';', encoding='utf-8')
-    print(f"\n✅ PROCESSO CONCLUÍDO! Arquivo final gerado: {caminho_final}")
+def main(qtd_trimestres=downloader.QTD_TRIMESTRES_PADRAO, max_downloads=downloader.MAX_DOWNLOADS_PADRAO,
+         streaming=False, memoria_mb=downloader.MEMORIA_PADRAO_MB, workers=1,
+         formato='csv', exportar_csv=False, salvar_consolidado=True, debug=False, incremental=False,
+         carregar_banco=False, metricas_prometheus=None, perfil=None, perfil_modo='cprofile'):
+    config = pipeline.ConfigPipeline(
+        qtd_trimestres=qtd_trimestres,
+        max_downloads=max_downloads,
+        streaming=streaming,
+        memoria_mb=memoria_mb,
+        workers=workers,
+        formato=formato,
+        exportar_csv=exportar_csv,
+        salvar_consolidado=salvar_consolidado,
+        salvar_debug=debug,
+        incremental=incremental,
+        carregar_banco=carregar_banco,
+        metricas_prometheus=metricas_prometheus,
+        perfil=perfil,
+        perfil_modo=perfil_modo,
+    )
+    return pipeline.executar(config)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pipeline ETL das demonstrações contábeis da ANS")
+    parser.add_argument("--trimestres", type=int, default=downloader.QTD_TRIMESTRES_PADRAO,
+                        help="Quantidade de trimestres mais recentes a baixar")
+    parser.add_argument("--downloads", type=int, default=downloader.MAX_DOWNLOADS_PADRAO,
+                        help="Downloads simultâneos")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lê os CSVs direto dos ZIPs, sem extraí-los para o disco")
+    parser.add_argument("--memoria-mb", type=int, default=downloader.MEMORIA_PADRAO_MB,
+                        help="Orçamento de memória por bloco de leitura (MB)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processos para o processamento dos arquivos trimestrais")
+    parser.add_argument("--formato", choices=armazenamento.FORMATOS, default='csv',
+                        help="Formato dos arquivos intermediários")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help="Com --formato parquet, também gera os CSVs usados por sql/02_import_data.sql")
+    parser.add_argument("--sem-consolidado", action="store_true",
+                        help="Não grava o consolidado de despesas no disco")
+    parser.add_argument("--debug", action="store_true",
+                        help="Grava data/debug_dados_completos com o dataset validado")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reprocessa só arquivos novos/alterados e recalcula só as operadoras afetadas")
+    parser.add_argument("--carregar-banco", action="store_true",
+                        help="Grava os resultados no banco (DATABASE_URL) com upsert por trimestre")
+    parser.add_argument("--metricas-prometheus", metavar="CAMINHO",
+                        help="Também grava as métricas por etapa no formato texto do Prometheus")
+    parser.add_argument("--perfil", metavar="ETAPA",
+                        help="Perfila uma etapa (download, coleta, particoes, arquivo, enriquecimento, "
+                             "validacao, agregacao, gravacao, carga, resumos)")
+    parser.add_argument("--perfil-modo", choices=['cprofile', 'tracemalloc'], default='cprofile',
+                        help="cprofile grava data/perfil_<etapa>.prof; tracemalloc anota as maiores alocações no relatório")
+    args = parser.parse_args()
+    main(qtd_trimestres=args.trimestres, max_downloads=args.downloads, streaming=args.streaming,
+         memoria_mb=args.memoria_mb, workers=args.workers, formato=args.formato,
+         exportar_csv=args.exportar_csv, salvar_consolidado=not args.sem_consolidado, debug=args.debug,
+         incremental=args.incremental, carregar_banco=args.carregar_banco,
+         metricas_prometheus=args.metricas_prometheus, perfil=args.perfil, perfil_modo=args.perfil_modo)
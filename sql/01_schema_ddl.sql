@@ -2,10 +2,11 @@
 CREATE TABLE operadoras (
     registro_ans INT PRIMARY KEY, 
     cnpj VARCHAR(20),             
-    razao_social VARCHAR(255),
+    razao_social VARCHAR(255) NOT NULL DEFAULT '',
     modalidade VARCHAR(100),
     uf CHAR(2),
-    INDEX idx_uf (uf)
+    INDEX idx_uf (uf),
+    INDEX idx_operadoras_razao_registro (razao_social, registro_ans)
 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
 
@@ -18,7 +19,9 @@ CREATE TABLE despesas (
     valor DECIMAL(15, 2),
     
     INDEX idx_registro_ans (registro_ans), 
-    INDEX idx_data_evento (data_evento)
+    INDEX idx_data_evento (data_evento),
+    -- Uma linha por operadora/trimestre: recargas fazem upsert nesta chave
+    UNIQUE KEY uq_despesa_trimestre (registro_ans, ano, trimestre)
 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
 
@@ -35,4 +38,52 @@ CREATE TABLE despesas_agregadas (
 
     INDEX idx_registro_ans_agg (registro_ans),
     INDEX idx_uf_total (uf, total_despesas)
-) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
\ No newline at end of file
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- Carimbo de versão dos dados: cada carga incrementa; a API o usa nas chaves de cache e nos ETags
+CREATE TABLE versao_dados (
+    id INT PRIMARY KEY,
+    versao INT NOT NULL DEFAULT 0,
+    atualizado_em DATETIME
+);
+
+-- Tabelas de resumo, mantidas pelo ETL (etl/rollups.py) a cada trimestre carregado
+CREATE TABLE resumo_operadora_trimestre (
+    registro_ans INT,
+    ano INT,
+    trimestre INT,
+    uf CHAR(2),
+    valor DECIMAL(15, 2),
+
+    PRIMARY KEY (registro_ans, ano, trimestre),
+    INDEX idx_resumo_op_trimestre (ano, trimestre)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+
+CREATE TABLE resumo_uf_trimestre (
+    uf CHAR(2),
+    ano INT,
+    trimestre INT,
+    total DECIMAL(17, 2),
+    qtd_operadoras INT,
+
+    PRIMARY KEY (uf, ano, trimestre)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+
+CREATE TABLE resumo_operadora (
+    registro_ans INT PRIMARY KEY,
+    razao_social VARCHAR(255),
+    uf CHAR(2),
+    primeiro_periodo INT,          -- ano * 10 + trimestre
+    valor_inicial DECIMAL(15, 2),
+    ultimo_periodo INT,
+    valor_final DECIMAL(15, 2),
+    crescimento_percentual DOUBLE,
+    qtd_trimestres INT,
+    qtd_trimestres_acima_media INT,
+
+    INDEX idx_resumo_uf (uf),
+    INDEX idx_resumo_crescimento (crescimento_percentual),
+    INDEX idx_resumo_acima_media (qtd_trimestres_acima_media)
+) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
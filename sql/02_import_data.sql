@@ -33,13 +33,24 @@ IGNORE 1 ROWS
 SET 
     registro_ans = @v_registro,
     cnpj = NULLIF(@v_cnpj, ''),
-    razao_social = @v_razao,
+    razao_social = COALESCE(@v_razao, ''),
     modalidade = @v_modalidade,
     uf = @v_uf;
 
 
+-- Alternativa sem SQL manual: python main.py --carregar-banco (ou python -m etl.loader)
+
+-- As contas de despesa são somadas por operadora/trimestre numa tabela de apoio e
+-- gravadas com upsert na chave (registro_ans, ano, trimestre): recarregar é idempotente.
+CREATE TEMPORARY TABLE stg_despesas (
+    registro_ans INT,
+    ano INT,
+    trimestre INT,
+    valor DECIMAL(15, 2)
+);
+
 LOAD DATA LOCAL INFILE 'data/consolidado_despesas.csv'
-INTO TABLE despesas
+INTO TABLE stg_despesas
 CHARACTER SET utf8mb4
 FIELDS TERMINATED BY ';' 
 LINES TERMINATED BY '\n'
@@ -56,10 +67,27 @@ SET
     registro_ans = @v_registro,
     ano = @v_ano,
     trimestre = @v_trimestre,
-    valor = REPLACE(@v_valor, ',', '.'),
-    
-    data_evento = STR_TO_DATE(CONCAT(@v_ano, '-', (@v_trimestre * 3 - 2), '-01'), '%Y-%m-%d');
+    valor = REPLACE(@v_valor, ',', '.');
+
+INSERT INTO despesas (registro_ans, ano, trimestre, valor, data_evento)
+SELECT
+    registro_ans,
+    ano,
+    trimestre,
+    SUM(valor),
+    STR_TO_DATE(CONCAT(ano, '-', (trimestre * 3 - 2), '-01'), '%Y-%m-%d')
+FROM stg_despesas
+GROUP BY registro_ans, ano, trimestre
+ON DUPLICATE KEY UPDATE
+    valor = VALUES(valor),
+    data_evento = VALUES(data_evento);
+
+DROP TEMPORARY TABLE stg_despesas;
+
 
+-- Colunas de data/despesas_agregadas.csv:
+-- RazaoSocial;RegistroANS;UF;Modalidade;TotalDespesas;MediaTrimestral;DesvioPadrao;QtdTrimestres
+DELETE FROM despesas_agregadas;
 
 LOAD DATA LOCAL INFILE 'data/despesas_agregadas.csv'
 INTO TABLE despesas_agregadas
@@ -69,8 +97,9 @@ LINES TERMINATED BY '\n'
 IGNORE 1 ROWS
 (
     @v_razao,
-    @v_uf,
     @v_registro,
+    @v_uf,
+    @dummy,
     @v_total,
     @v_media,
     @v_desvio,
@@ -80,17 +109,21 @@ SET
     registro_ans = @v_registro,
     razao_social = @v_razao,
     uf = @v_uf,
-    total_despesas = @v_total,
-    media_despesas = @v_media,
-    desvio_padrao = @v_desvio;
-
     total_despesas = REPLACE(@v_total, ',', '.'),
     media_despesas = REPLACE(@v_media, ',', '.'),
-    desvio_padrao  = REPLACE(@v_desvio, ',', '.');
+    desvio_padrao  = NULLIF(REPLACE(@v_desvio, ',', '.'), '');
 
 
 LOAD DATA INFILE '.../data/operadoras_para_banco.csv'
 INTO TABLE operadoras
 FIELDS TERMINATED BY ';'
 IGNORE 1 ROWS
-(registro_ans, cnpj, razao_social, modalidade, uf);
\ No newline at end of file
+(registro_ans, cnpj, razao_social, modalidade, uf);
+
+
+-- Por último: nova versão dos dados, como faz o etl.loader. Sem isso a API continua
+-- servindo do cache (e respondendo 304) os números de antes desta carga.
+-- Depois, refaça as tabelas de resumo com: python -m etl.rollups
+INSERT INTO versao_dados (id, versao, atualizado_em)
+VALUES (1, 1, NOW())
+ON DUPLICATE KEY UPDATE versao = versao + 1, atualizado_em = NOW();
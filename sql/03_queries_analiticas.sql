@@ -50,4 +50,29 @@ operadoras_acima AS (
 )
 SELECT COUNT(*) as qtd_operadoras_alvo
 FROM operadoras_acima
-WHERE qtd_trimestres_acima >= 2;
\ No newline at end of file
+WHERE qtd_trimestres_acima >= 2;
+
+-- As mesmas três respostas lidas das tabelas de resumo (etl/rollups.py), sem varrer despesas.
+-- A UF dos resumos é a UF atual da operadora no cadastro, como no JOIN acima: a cada carga,
+-- os trimestres com operadora que mudou de UF são refeitos. Diferença: operadora sem UF
+-- aparece como 'ND' (no JOIN acima, UF nula). A média por operadora divide o total da UF
+-- pelas operadoras com alguma despesa nela, o mesmo que COUNT(DISTINCT d.registro_ans).
+
+SELECT registro_ans, razao_social, valor_inicial, valor_final, crescimento_percentual
+FROM resumo_operadora
+WHERE crescimento_percentual IS NOT NULL
+ORDER BY crescimento_percentual DESC
+LIMIT 5;
+
+SELECT
+    t.uf,
+    t.despesa_total,
+    t.despesa_total / o.qtd_operadoras as media_por_operadora
+FROM (SELECT uf, SUM(total) as despesa_total FROM resumo_uf_trimestre GROUP BY uf) t
+JOIN (SELECT uf, COUNT(*) as qtd_operadoras FROM resumo_operadora GROUP BY uf) o ON o.uf = t.uf
+ORDER BY t.despesa_total DESC
+LIMIT 5;
+
+SELECT COUNT(*) as qtd_operadoras_alvo
+FROM resumo_operadora
+WHERE qtd_trimestres_acima_media >= 2;
@@ -0,0 +1,54 @@
+import os
+import sys
+
+# Os testes importam `etl` e `backend` a partir da raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# backend.database cria o engine na importação: sem DATABASE_URL, usa SQLite em memória
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+
+
+@pytest.fixture
+def cliente_api():
+    """Cria um TestClient das rotas de operadoras e estatísticas sobre o banco em `url`."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from backend import busca, database, sessoes
+    from backend.cache import cache
+    from backend.routes import estatisticas, operadoras
+
+    engines = []
+
+    def criar(url):
+        # Banco em arquivo: o SQLite em memória teria um banco por thread do threadpool
+        engine = create_engine(url)
+        engines.append(engine)
+        database.Base.metadata.create_all(bind=engine)
+        Sessao = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def get_db():
+            db = Sessao()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        for router in (operadoras.router, estatisticas.router):
+            app.include_router(sessoes.router_sync(router))
+        app.dependency_overrides[database.get_db] = get_db
+        return TestClient(app)
+
+    # Cache e índice de busca são globais e indexados pela versão dos dados, que se repete entre testes
+    cache.limpar()
+    busca._indice.update(versao=None, indice=None)
+    yield criar
+    cache.limpar()
+    busca._indice.update(versao=None, indice=None)
+    for engine in engines:
+        engine.dispose()
@@ -0,0 +1,115 @@
+"""AgregadorIncremental (etl.aggregator) contra o groupby(...).agg(['sum', 'mean', 'std', 'count']) do pandas"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.aggregator import AgregadorIncremental
+
+GRUPOS = ['RazaoSocial', 'RegistroANS', 'UF', 'Modalidade']
+COLUNAS = {'sum': 'TotalDespesas', 'mean': 'MediaTrimestral', 'std': 'DesvioPadrao', 'count': 'QtdTrimestres'}
+
+
+def _despesas(n_linhas=2000, n_operadoras=40, semente=7):
+    rng = np.random.default_rng(semente)
+    registros = rng.integers(1, n_operadoras + 1, n_linhas)
+    return pd.DataFrame({
+        'RazaoSocial': [f"OPERADORA {r}" for r in registros],
+        'RegistroANS': registros,
+        'UF': np.array(['SP', 'RJ', 'MG', 'BA'])[registros % 4],
+        'Modalidade': np.array(['Cooperativa Médica', 'Autogestão', 'Medicina de Grupo'])[registros % 3],
+        # Valores grandes e próximos entre si: onde a variância ingênua (E[x²] - E[x]²) perde precisão
+        'ValorDespesas': 1e7 + rng.normal(0, 1e3, n_linhas) * registros,
+    })
+
+
+def _blocos(df, tamanhos):
+    inicio = 0
+    for tamanho in tamanhos:
+        yield df.iloc[inicio:inicio + tamanho].copy()
+        inicio += tamanho
+    assert inicio == len(df)
+
+
+def _referencia(df):
+    ref = df.groupby(GRUPOS, observed=True)['ValorDespesas'].agg(['sum', 'mean', 'std', 'count'])
+    return ref.rename(columns=COLUNAS)
+
+
+def _por_grupo(resultado):
+    df = resultado.astype({c: object for c in GRUPOS})
+    df['RegistroANS'] = df['RegistroANS'].astype('int64')
+    df['UF'], df['RazaoSocial'], df['Modalidade'] = (df[c].astype(str) for c in ('UF', 'RazaoSocial', 'Modalidade'))
+    return df.set_index(GRUPOS)[list(COLUNAS.values())].sort_index()
+
+
+def _confere(resultado, df, rtol=1e-9):
+    obtido, esperado = _por_grupo(resultado), _referencia(df).sort_index()
+    assert obtido.index.equals(esperado.index)
+    assert (obtido['QtdTrimestres'].astype('int64') == esperado['QtdTrimestres']).all()
+    for coluna in ('TotalDespesas', 'MediaTrimestral', 'DesvioPadrao'):
+        np.testing.assert_allclose(obtido[coluna].astype(float), esperado[coluna], rtol=rtol, err_msg=coluna)
+
+
+def test_varios_blocos_igual_ao_groupby():
+    df = _despesas()
+    agregador = AgregadorIncremental()
+    for bloco in _blocos(df, [1, 7, 500, 300, 1192]):
+        agregador.adicionar(bloco)
+
+    assert agregador.linhas == len(df)
+    _confere(agregador.resultado(), df)
+
+
+def test_fundir_agregadores_de_workers():
+    df = _despesas(semente=11)
+    inteiro = AgregadorIncremental().adicionar(df.copy())
+    # Dois "workers" com metades intercaladas, cada um em vários blocos
+    pares, impares = df.iloc[::2], df.iloc[1::2]
+    a, b = AgregadorIncremental(), AgregadorIncremental()
+    for bloco in _blocos(pares, [300, len(pares) - 300]):
+        a.adicionar(bloco)
+    for bloco in _blocos(impares, [len(impares)]):
+        b.adicionar(bloco)
+
+    fundido = a.fundir(b)
+
+    assert fundido.linhas == len(df)
+    _confere(fundido.resultado(), df)
+    # Mesma contagem e os mesmos números do agregador único, a menos do arredondamento da ordem das somas
+    obtido, esperado = _por_grupo(fundido.resultado()), _por_grupo(inteiro.resultado())
+    assert obtido['QtdTrimestres'].equals(esperado['QtdTrimestres'])
+    np.testing.assert_allclose(obtido.drop(columns='QtdTrimestres').astype(float),
+                               esperado.drop(columns='QtdTrimestres').astype(float), rtol=1e-12)
+
+
+def test_fundir_com_agregador_vazio():
+    df = _despesas(n_linhas=50)
+    agregador = AgregadorIncremental().adicionar(df.copy())
+    _confere(agregador.fundir(AgregadorIncremental()).resultado(), df)
+    _confere(AgregadorIncremental().fundir(agregador).resultado(), df)
+
+
+def test_grupo_de_uma_linha_tem_desvio_nulo():
+    df = _despesas(n_linhas=200, n_operadoras=5)
+    sozinha = pd.DataFrame([{'RazaoSocial': 'OPERADORA UNICA', 'RegistroANS': 999, 'UF': 'AC',
+                             'Modalidade': 'Autogestão', 'ValorDespesas': 123.45}])
+    df = pd.concat([df, sozinha], ignore_index=True)
+    agregador = AgregadorIncremental()
+    for bloco in _blocos(df, [100, 101]):
+        agregador.adicionar(bloco)
+
+    resultado = _por_grupo(agregador.resultado())
+    linha = resultado.loc[('OPERADORA UNICA', 999, 'AC', 'Autogestão')]
+    assert linha['QtdTrimestres'] == 1 and linha['TotalDespesas'] == pytest.approx(123.45)
+    assert pd.isna(linha['DesvioPadrao'])
+    _confere(agregador.resultado(), df)
+
+
+def test_chaves_categoricas_com_categorias_diferentes_por_bloco():
+    df = _despesas(semente=3)
+    agregador = AgregadorIncremental()
+    for bloco in _blocos(df, [400, 600, 1000]):
+        # Cada bloco vira categórico com as suas próprias categorias (como sai de cada partição)
+        agregador.adicionar(bloco.astype({c: 'category' for c in ('RazaoSocial', 'UF', 'Modalidade')}))
+
+    _confere(agregador.resultado(), df)
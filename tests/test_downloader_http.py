@@ -0,0 +1,157 @@
+"""Downloader e cache de GET condicional contra um servidor HTTP local que imita o diretório da ANS"""
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from etl import cache, downloader, instrumentacao
+
+TRIMESTRES = [(2023, 3), (2023, 4), (2024, 1), (2024, 2)]
+
+
+def _zip(ano, trimestre):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        z.writestr(f"{trimestre}T{ano}.csv", f"DATA;REG_ANS;CD_CONTA_CONTABIL;VL_SALDO_FINAL\n{ano}-01-01;1;411;{trimestre},50\n")
+    return buffer.getvalue()
+
+
+def _paginas():
+    anos = sorted({ano for ano, _ in TRIMESTRES})
+    paginas = {"/demonstracoes_contabeis/": "".join(f'<a href="{ano}/">{ano}/</a>' for ano in anos).encode()}
+    for ano in anos:
+        nomes = [f"{t}T{ano}.zip" for a, t in TRIMESTRES if a == ano]
+        paginas[f"/demonstracoes_contabeis/{ano}/"] = "".join(f'<a href="{n}">{n}</a>' for n in nomes).encode()
+        for nome, (_, t) in zip(nomes, [(a, t) for a, t in TRIMESTRES if a == ano]):
+            paginas[f"/demonstracoes_contabeis/{ano}/{nome}"] = _zip(ano, t)
+    return paginas
+
+
+class ServidorANS(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.paginas = _paginas()
+        self.log = []            # (caminho, status)
+        self.em_andamento = 0
+        self.max_simultaneos = 0
+        self.trava = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server
+        corpo = servidor.paginas.get(self.path)
+        if corpo is None:
+            return self._responder(404, b"")
+        etag = '"%s"' % hashlib.sha1(corpo).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            return self._responder(304, None, etag)
+        if self.path.endswith(".zip"):
+            with servidor.trava:
+                servidor.em_andamento += 1
+                servidor.max_simultaneos = max(servidor.max_simultaneos, servidor.em_andamento)
+            time.sleep(0.2)  # segura a conexão para que os downloads se sobreponham
+            with servidor.trava:
+                servidor.em_andamento -= 1
+        self._responder(200, corpo, etag)
+
+    def _responder(self, status, corpo, etag=None):
+        self.server.log.append((self.path, status))
+        self.send_response(status)
+        if etag: self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(corpo or b"")))
+        self.end_headers()
+        if corpo: self.wfile.write(corpo)
+
+
+@pytest.fixture
+def servidor():
+    srv = ServidorANS()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _zips(servidor):
+    return [(c, s) for c, s in servidor.log if c.endswith(".zip")]
+
+
+def test_baixa_em_paralelo_extrai_e_revalida_com_304(servidor, tmp_path):
+    pasta = str(tmp_path)
+    downloader.baixar_dados(qtd_trimestres=3, max_downloads=3, url_base=servidor.url, pasta_root=pasta)
+
+    # Só os 3 trimestres mais recentes, baixados ao mesmo tempo
+    assert sorted(c for c, s in _zips(servidor)) == [
+        "/demonstracoes_contabeis/2023/4T2023.zip",
+        "/demonstracoes_contabeis/2024/1T2024.zip",
+        "/demonstracoes_contabeis/2024/2T2024.zip",
+    ]
+    assert {s for _, s in _zips(servidor)} == {200}
+    assert servidor.max_simultaneos > 1
+
+    for rotulo, csv in [("2023_4", "4T2023.csv"), ("2024_1", "1T2024.csv"), ("2024_2", "2T2024.csv")]:
+        assert os.path.exists(os.path.join(pasta, rotulo, csv))
+        assert os.path.exists(os.path.join(pasta, rotulo, downloader.MARCADOR_EXTRACAO))
+        assert os.path.exists(os.path.join(pasta, "zips", f"{rotulo}.zip"))
+    assert not os.path.exists(os.path.join(pasta, "2023_3"))
+
+    manifesto = cache.carregar_manifesto(os.path.join(pasta, os.path.basename(cache.CAMINHO_MANIFESTO)))
+    assert len(manifesto) == 3 and all(e["etag"] for e in manifesto.values())
+
+    # Segunda execução: GET condicional, nada é baixado nem extraído de novo
+    marcador = os.path.join(pasta, "2024_2", downloader.MARCADOR_EXTRACAO)
+    mtime = os.path.getmtime(marcador)
+    servidor.log.clear()
+    downloader.baixar_dados(qtd_trimestres=3, max_downloads=3, url_base=servidor.url, pasta_root=pasta)
+    assert len(_zips(servidor)) == 3
+    assert {s for _, s in _zips(servidor)} == {304}
+    assert os.path.getmtime(marcador) == mtime
+
+
+def test_arquivo_alterado_no_servidor_e_baixado_de_novo(servidor, tmp_path):
+    pasta = str(tmp_path)
+    downloader.baixar_dados(qtd_trimestres=1, max_downloads=1, url_base=servidor.url, pasta_root=pasta)
+    caminho_url = "/demonstracoes_contabeis/2024/2T2024.zip"
+    servidor.paginas[caminho_url] = _zip(2024, 3)  # conteúdo novo, ETag novo
+
+    servidor.log.clear()
+    downloader.baixar_dados(qtd_trimestres=1, max_downloads=1, url_base=servidor.url, pasta_root=pasta)
+    assert _zips(servidor) == [(caminho_url, 200)]
+    with open(os.path.join(pasta, "2024_2", "3T2024.csv")) as f:
+        assert "3,50" in f.read()
+
+
+def test_copia_local_apagada_nao_envia_cabecalho_condicional(servidor, tmp_path):
+    pasta = str(tmp_path)
+    downloader.baixar_dados(qtd_trimestres=1, max_downloads=1, url_base=servidor.url, pasta_root=pasta)
+    os.remove(os.path.join(pasta, "zips", "2024_2.zip"))
+
+    servidor.log.clear()
+    downloader.baixar_dados(qtd_trimestres=1, max_downloads=1, url_base=servidor.url, pasta_root=pasta)
+    assert _zips(servidor) == [("/demonstracoes_contabeis/2024/2T2024.zip", 200)]
+    assert os.path.exists(os.path.join(pasta, "zips", "2024_2.zip"))
+
+
+def test_spans_das_threads_ficam_sob_o_download(servidor, tmp_path):
+    instrumentacao.reiniciar()
+    with instrumentacao.span('pipeline'):
+        downloader.baixar_dados(qtd_trimestres=3, max_downloads=3, url_base=servidor.url, pasta_root=str(tmp_path))
+
+    caminhos = sorted(s['caminho'] for s in instrumentacao.drenar() if s['etapa'] == 'download_zip')
+    assert caminhos == ['pipeline/download/download_zip'] * 3
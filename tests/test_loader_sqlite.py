@@ -0,0 +1,103 @@
+"""Carga do ETL em SQLite: CNPJs repetidos, idempotência e recarga de um trimestre"""
+import pandas as pd
+import pytest
+from sqlalchemy import Engine, create_engine, event, text
+
+from etl import cadastro, loader
+
+
+@pytest.fixture
+def chaves_estrangeiras():
+    # O SQLite só verifica FOREIGN KEY com o pragma ligado; assim a carga falha como no MySQL
+    def ligar(conexao_dbapi, _):
+        conexao_dbapi.execute("PRAGMA foreign_keys=ON")
+    event.listen(Engine, "connect", ligar)
+    yield
+    event.remove(Engine, "connect", ligar)
+
+
+@pytest.fixture
+def url(tmp_path, chaves_estrangeiras):
+    return f"sqlite:///{tmp_path / 'carga.db'}"
+
+
+def _cadop():
+    df = pd.DataFrame({
+        'RegistroANS': [1, 2, 3],
+        'CNPJ': ['11111111000111', '11111111000111', '22222222000122'],  # 1 e 2 com o mesmo CNPJ
+        'RazaoSocial': ['OP UM', 'OP DOIS', 'OP TRES'],
+        'Modalidade': ['Cooperativa Médica'] * 3,
+        'UF': ['SP', 'RJ', 'MG'],
+    })
+    return cadastro.CadastroOperadoras(df.set_index('RegistroANS')[cadastro.COLUNAS_CADASTRO].astype('string'))
+
+
+def _despesas(trimestres=((2024, 1), (2024, 2)), fator=1.0):
+    linhas = []
+    for ano, trimestre in trimestres:
+        # A 4 só existe nas despesas e repete o CNPJ da 3; duas contas por operadora e trimestre
+        for registro, cnpj in [(1, '11111111000111'), (2, '11111111000111'), (3, '22222222000122'),
+                               (4, '22222222000122')]:
+            for conta in (100.0, 50.25):
+                linhas.append({'RegistroANS': registro, 'CNPJ': cnpj, 'RazaoSocial': f'OP {registro}',
+                               'Ano': ano, 'Trimestre': trimestre,
+                               'ValorDespesas': conta * registro * trimestre * fator})
+    return pd.DataFrame(linhas)
+
+
+def _tabela(url, sql):
+    with create_engine(url).connect() as conexao:
+        return [tuple(linha) for linha in conexao.execute(text(sql))]
+
+
+def test_cnpj_repetido_mantem_operadora_sem_cnpj(url):
+    loader.carregar(_despesas(), cadop=_cadop(), url=url)
+
+    assert _tabela(url, "SELECT registro_ans, cnpj FROM operadoras ORDER BY registro_ans") == [
+        (1, '11111111000111'), (2, None), (3, '22222222000122'), (4, None)]
+    assert _tabela(url, "SELECT COUNT(*) FROM despesas") == [(8,)]
+    assert _tabela(url, "SELECT COUNT(*) FROM despesas d LEFT JOIN operadoras o "
+                        "ON o.registro_ans = d.registro_ans WHERE o.registro_ans IS NULL") == [(0,)]
+    # As duas contas do trimestre viram uma linha com a soma
+    assert _tabela(url, "SELECT valor FROM despesas WHERE registro_ans = 2 AND ano = 2024 AND trimestre = 2") == [
+        (pytest.approx(601.0),)]
+
+
+def test_recarga_identica_e_idempotente(url):
+    loader.carregar(_despesas(), cadop=_cadop(), url=url)
+    consultas = ["SELECT * FROM operadoras ORDER BY registro_ans",
+                 "SELECT id, registro_ans, ano, trimestre, valor, data_evento FROM despesas ORDER BY id",
+                 "SELECT * FROM resumo_operadora_trimestre ORDER BY registro_ans, ano, trimestre",
+                 "SELECT * FROM resumo_uf_trimestre ORDER BY uf, ano, trimestre",
+                 "SELECT * FROM resumo_operadora ORDER BY registro_ans"]
+    antes = [_tabela(url, sql) for sql in consultas]
+
+    loader.carregar(_despesas(), cadop=_cadop(), url=url)
+
+    assert [_tabela(url, sql) for sql in consultas] == antes
+    assert _tabela(url, "SELECT versao FROM versao_dados") == [(2,)]
+
+
+def test_recarga_de_um_trimestre(url):
+    loader.carregar(_despesas(), cadop=_cadop(), url=url)
+    primeiro = _tabela(url, "SELECT * FROM despesas WHERE trimestre = 1 ORDER BY id")
+
+    loader.carregar(_despesas(trimestres=((2024, 2),), fator=2.0), cadop=_cadop(), url=url)
+
+    assert _tabela(url, "SELECT * FROM despesas WHERE trimestre = 1 ORDER BY id") == primeiro
+    assert _tabela(url, "SELECT registro_ans, valor FROM despesas WHERE trimestre = 2 ORDER BY registro_ans") == [
+        (r, pytest.approx(150.25 * r * 2 * 2.0)) for r in (1, 2, 3, 4)]
+    # Resumos do trimestre recarregado batem com as despesas
+    assert _tabela(url, "SELECT SUM(total) FROM resumo_uf_trimestre WHERE trimestre = 2") == \
+        _tabela(url, "SELECT SUM(valor) FROM despesas WHERE trimestre = 2")
+    assert _tabela(url, "SELECT registro_ans, valor_inicial, valor_final FROM resumo_operadora "
+                        "WHERE registro_ans = 1") == [(1, pytest.approx(150.25), pytest.approx(601.0))]
+
+
+def test_upsert_em_dialeto_nao_suportado():
+    class ConexaoFalsa:
+        class dialect:
+            name = 'oracle'
+
+    with pytest.raises(ValueError, match="mysql, sqlite, postgresql"):
+        loader._insert_upsert(ConexaoFalsa(), None, [], [])
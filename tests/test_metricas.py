@@ -0,0 +1,47 @@
+"""Contagem de comandos SQL por requisição (backend.metricas), inclusive os que falham"""
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from backend import metricas
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    metricas.instrumentar(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def consultas():
+    consultas = metricas.ConsultasRequisicao(capturar_sql=True)
+    token = metricas._requisicao.set(consultas)
+    yield consultas
+    metricas._requisicao.reset(token)
+
+
+def test_comando_que_falha_e_contado_e_nao_fica_na_conexao(engine, consultas):
+    with engine.connect() as conexao:
+        conexao.execute(text("SELECT 1"))
+        with pytest.raises(exc.OperationalError):
+            conexao.execute(text("SELECT * FROM tabela_que_nao_existe"))
+        conexao.execute(text("SELECT 2"))
+        pendentes = dict(conexao.info.get("inicio_consultas", {}))
+
+    assert consultas.qtd == 3
+    assert consultas.erros == 1
+    assert not pendentes
+    assert [sql for _, sql in consultas.sql] == [
+        "SELECT 1", "[ERRO] SELECT * FROM tabela_que_nao_existe", "SELECT 2"]
+
+
+def test_erros_por_rota_no_prometheus(engine, consultas):
+    with engine.connect() as conexao, pytest.raises(exc.OperationalError):
+        conexao.execute(text("SELECT * FROM tabela_que_nao_existe"))
+
+    registro = metricas.MetricasRequisicoes()
+    registro.registrar("GET", "/api/teste", 500, 0.01, consultas)
+    texto = registro.prometheus()
+    assert 'http_consultas_sql_erros_total{rota="/api/teste"} 1' in texto
+    assert 'http_consultas_sql_por_requisicao_count{rota="/api/teste"} 1' in texto
@@ -0,0 +1,48 @@
+"""Paginação por cursor de GET /api/operadoras ordenada por razão social"""
+import pytest
+from sqlalchemy import create_engine, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.routes import operadoras
+
+NOMES = ['BETA', '', 'ALFA', 'BETA', 'GAMA', '', 'ALFA SAUDE', 'DELTA']
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'paginacao.db'}"
+
+
+def _popular(url):
+    with Session(create_engine(url)) as db:
+        db.add_all([models.Operadora(registro_ans=i + 1, cnpj=f"{i + 1:014d}", razao_social=nome)
+                    for i, nome in enumerate(NOMES)])
+        db.commit()
+
+
+@pytest.mark.parametrize("limit", [1, 3, 100])
+def test_cursor_por_razao_social_percorre_tudo_na_ordem(url, cliente_api, limit):
+    cliente = cliente_api(url)
+    _popular(url)
+
+    vistos, parametros = [], {"paginacao": "cursor", "ordenar": "razao_social", "limit": limit}
+    while True:
+        corpo = cliente.get("/api/operadoras/", params=parametros).json()
+        vistos += [(o["RazaoSocial"], o["RegistroANS"]) for o in corpo["data"]]
+        if corpo["meta"]["next_cursor"] is None: break
+        parametros = {"cursor": corpo["meta"]["next_cursor"], "ordenar": "razao_social", "limit": limit}
+
+    assert vistos == sorted((nome, i + 1) for i, nome in enumerate(NOMES))
+
+
+def test_filtro_do_cursor_usa_o_indice(url, cliente_api):
+    cliente_api(url)  # cria as tabelas
+    chave = operadoras.ORDENACOES["razao_social"]()
+    stmt = select(models.Operadora.registro_ans).where(tuple_(*chave) > tuple_("BETA", 1)).order_by(*chave).limit(10)
+    engine = create_engine(url)
+    with engine.connect() as conexao:
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        plano = " ".join(str(linha) for linha in conexao.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "SEARCH operadoras USING COVERING INDEX idx_operadoras_razao_registro" in plano
+    assert "TEMP B-TREE" not in plano  # sem ordenação à parte
@@ -0,0 +1,44 @@
+"""Processamento em workers: um worker que morre só derruba o arquivo dele"""
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+from etl import downloader
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason="o monkeypatch só chega aos workers criados por fork")
+
+
+def _arquivos(pasta, qtd):
+    arquivos = []
+    for trim in range(1, qtd + 1):
+        caminho = os.path.join(pasta, f"{trim}T2024.csv")
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write("DATA;REG_ANS;CD_CONTA_CONTABIL;VL_SALDO_FINAL\n"
+                    f"2024-01-01;1;411;{trim},50\n2024-01-01;2;4111;10,00\n2024-01-01;3;311;99,00\n")
+        arquivos.append((caminho, 2024, trim))
+    return arquivos
+
+
+def test_worker_que_morre_so_falha_o_proprio_arquivo(tmp_path, monkeypatch):
+    arquivos = _arquivos(str(tmp_path), 4)
+    original = downloader.processar_arquivo
+
+    def processar_ou_morrer(caminho, ano, trim, **opcoes):
+        if trim == 2:
+            os._exit(1)  # como um worker morto pelo OOM killer
+        return original(caminho, ano, trim, **opcoes)
+
+    monkeypatch.setattr(downloader, 'processar_arquivo', processar_ou_morrer)
+    pasta_particoes = str(tmp_path / 'particoes')
+    resultados = downloader._processar_em_paralelo(arquivos, 4, pasta_particoes=pasta_particoes)
+
+    assert [r['trimestre'] for r in resultados] == [1, 2, 3, 4]
+    falhou = resultados[1]
+    assert falhou['particao'] is None and falhou['linhas'] == 0 and 'BrokenProcessPool' in falhou['erro']
+    for resultado in resultados[:1] + resultados[2:]:
+        assert resultado['erro'] is None and resultado['linhas'] == 2
+        df = pd.read_csv(resultado['particao'], sep=';')
+        assert sorted(df['RegistroANS']) == [1, 2]
@@ -0,0 +1,63 @@
+"""/api/estatisticas/ufs (tabelas de resumo) contra a consulta original sobre despesas JOIN operadoras"""
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from etl import cadastro, loader
+
+# Consulta de sql/03_queries_analiticas.sql antes das tabelas de resumo
+CONSULTA_ORIGINAL = """
+SELECT o.uf, SUM(d.valor) AS despesa_total, SUM(d.valor) / COUNT(DISTINCT d.registro_ans) AS media_por_operadora
+FROM despesas d
+JOIN operadoras o ON d.registro_ans = o.registro_ans
+GROUP BY o.uf
+"""
+
+
+def _cadop(ufs):
+    df = pd.DataFrame({
+        'RegistroANS': list(ufs),
+        'CNPJ': [f"{r:014d}" for r in ufs],
+        'RazaoSocial': [f"OP {r}" for r in ufs],
+        'Modalidade': ['Cooperativa Médica'] * len(ufs),
+        'UF': list(ufs.values()),
+    })
+    return cadastro.CadastroOperadoras(df.set_index('RegistroANS')[cadastro.COLUNAS_CADASTRO].astype('string'))
+
+
+def _despesas(registros, trimestres):
+    return pd.DataFrame([
+        {'RegistroANS': r, 'CNPJ': f"{r:014d}", 'RazaoSocial': f"OP {r}", 'Ano': ano, 'Trimestre': t,
+         'ValorDespesas': 1000.0 * r + 10 * t}
+        for ano, t in trimestres for r in registros
+    ])
+
+
+def _original(url):
+    with create_engine(url).connect() as conexao:
+        linhas = conexao.execute(text(CONSULTA_ORIGINAL)).all()
+    # Operadora sem UF: a consulta original agrupa em UF nula; os resumos usam 'ND'
+    return sorted((uf or 'ND', pytest.approx(float(total)), pytest.approx(float(media)))
+                  for uf, total, media in linhas)
+
+
+def _endpoint(cliente):
+    resposta = cliente.get("/api/estatisticas/ufs", params={"limit": 30})
+    assert resposta.status_code == 200
+    return sorted((uf["uf"], uf["despesa_total"], uf["media_por_operadora"]) for uf in resposta.json())
+
+
+def test_ufs_igual_a_consulta_original_entre_cargas(tmp_path, cliente_api):
+    url = f"sqlite:///{tmp_path / 'resumos.db'}"
+    cliente = cliente_api(url)
+    ufs = {1: 'SP', 2: 'SP', 3: 'RJ', 4: 'MG', 5: None}
+
+    loader.carregar(_despesas([1, 2, 3, 4, 5], [(2023, 4), (2024, 1)]), cadop=_cadop(ufs), url=url)
+    assert _endpoint(cliente) == _original(url)
+
+    # Nova carga de um trimestre só, com a operadora 2 mudando de SP para RJ e a 4 perdendo a UF:
+    # os trimestres já resumidos passam a contar a 2 no RJ, como na consulta original
+    ufs.update({2: 'RJ', 4: None})
+    loader.carregar(_despesas([1, 2, 3], [(2024, 2)]), cadop=_cadop(ufs), url=url)
+    assert _endpoint(cliente) == _original(url)
+    assert {uf for uf, _, _ in _endpoint(cliente)} == {'SP', 'RJ', 'ND'}
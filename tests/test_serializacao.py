@@ -0,0 +1,93 @@
+"""As listagens montadas de tuplas (backend.serializacao) seguem os schemas declarados em response_model"""
+import json
+from datetime import date
+from decimal import Decimal
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend import models, schemas, serializacao
+
+CNPJ_COM_DESPESAS = '11111111000111'
+
+
+@pytest.fixture
+def cliente(tmp_path, cliente_api):
+    url = f"sqlite:///{tmp_path / 'api.db'}"
+    cliente = cliente_api(url)
+    with Session(create_engine(url)) as db:
+        db.add_all([
+            models.Operadora(registro_ans=1, cnpj=CNPJ_COM_DESPESAS, razao_social='SAÚDE AÇÃO LTDA',
+                             modalidade='Cooperativa Médica', uf='SP'),
+            models.Operadora(registro_ans=2, cnpj='22222222000122', razao_social='SAUDE BRASIL',
+                             modalidade=None, uf=None),
+            # CNPJ repetido no cadastro: a carga mantém a operadora sem CNPJ (etl.loader)
+            models.Operadora(registro_ans=3, cnpj=None, razao_social='SAUDE SEM CNPJ',
+                             modalidade='Autogestão', uf='RJ'),
+        ])
+        db.add_all([
+            models.Despesa(registro_ans=1, ano=2024, trimestre=t, data_evento=date(2024, 3 * t, 1),
+                           valor=Decimal('1234.56') * t)
+            for t in (1, 2, 3)
+        ])
+        db.commit()
+    return cliente
+
+
+def _confere(schema, corpo):
+    """O corpo passa na validação do schema e sai igual do model_dump (nenhuma chave a mais ou a menos)."""
+    adaptador = TypeAdapter(schema)
+    assert adaptador.dump_python(adaptador.validate_python(corpo), mode='json', by_alias=True) == corpo
+
+
+@pytest.mark.parametrize("parametros", [
+    {},
+    {"page": 2, "limit": 2},
+    {"ordenar": "razao_social"},
+    {"incluir_total": "false"},
+    {"paginacao": "cursor", "limit": 2},
+    {"search": "saude"},
+    {"search": "saude", "paginacao": "cursor", "limit": 1},
+    {"search": "1111"},
+])
+def test_listagem_segue_operadora_response(cliente, parametros):
+    resposta = cliente.get("/api/operadoras/", params=parametros)
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert corpo["data"]
+    _confere(schemas.OperadoraResponse, corpo)
+
+
+def test_cursor_percorre_todas_as_operadoras(cliente):
+    vistos, cursor = [], None
+    while True:
+        corpo = cliente.get("/api/operadoras/", params={"limit": 2, **({"cursor": cursor} if cursor else
+                                                                     {"paginacao": "cursor"})}).json()
+        _confere(schemas.OperadoraResponse, corpo)
+        vistos += [o["RegistroANS"] for o in corpo["data"]]
+        cursor = corpo["meta"]["next_cursor"]
+        if cursor is None: break
+    assert vistos == [1, 2, 3]
+
+
+@pytest.mark.parametrize("agrupar", ["trimestre", "ano"])
+def test_despesas_segue_despesa_base(cliente, agrupar):
+    resposta = cliente.get(f"/api/operadoras/{CNPJ_COM_DESPESAS}/despesas", params={"agrupar": agrupar})
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert corpo
+    _confere(List[schemas.DespesaBase], corpo)
+    assert resposta.headers["X-Total-Count"] == str(len(corpo))
+
+
+def test_orjson_e_json_padrao_geram_o_mesmo_json(monkeypatch):
+    conteudo = {"nome": "SAÚDE", "valor": Decimal("10.10"), "data": date(2024, 1, 31), "nulo": None,
+                "lista": [1, 2.5, "ção"]}
+    com_orjson = json.loads(serializacao.para_json(conteudo))
+    monkeypatch.setattr(serializacao, "orjson", None)
+    assert json.loads(serializacao.para_json(conteudo)) == com_orjson
@@ -0,0 +1,60 @@
+"""Rotas recriadas por backend.sessoes mantêm todas as opções do APIRoute"""
+from fastapi import APIRouter, Depends, FastAPI, Header
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+from backend import database, sessoes
+from backend.routes import estatisticas, operadoras
+
+
+def _exigir_chave(x_chave: str = Header(...)):
+    return x_chave
+
+
+def _router_com_opcoes():
+    router = APIRouter(prefix="/teste", tags=["teste"])
+
+    @router.post("/criar", status_code=201, deprecated=True, responses={409: {"description": "Conflito"}},
+                 dependencies=[Depends(_exigir_chave)], response_class=PlainTextResponse,
+                 response_description="Criado", operation_id="criar_teste", include_in_schema=True,
+                 openapi_extra={"x-extra": 1})
+    def criar(db=Depends(database.get_db)):
+        return "ok"
+
+    @router.get("/sem-banco", response_model_exclude_none=True, summary="Resumo")
+    def sem_banco():
+        return {"a": 1, "b": None}
+
+    return router
+
+
+def _rotas(router):
+    return {(r.path, tuple(sorted(r.methods))): r for r in router.routes if isinstance(r, APIRoute)}
+
+
+def test_opcoes_preservadas_nos_dois_modos():
+    original = _rotas(_router_com_opcoes())
+    for adaptar in (sessoes.router_sync, sessoes.router_async):
+        convertidas = _rotas(adaptar(_router_com_opcoes()))
+        assert convertidas.keys() == original.keys()
+        for chave, rota in convertidas.items():
+            for nome in sessoes._OPCOES_ROTA:
+                if nome in ("dependencies", "generate_unique_id_function", "response_class"):
+                    continue
+                assert getattr(rota, nome) == getattr(original[chave], nome), (chave, nome)
+            assert len(rota.dependencies) == len(original[chave].dependencies)
+            assert rota.response_class is original[chave].response_class
+
+
+def test_openapi_igual_ao_das_rotas_originais():
+    def esquema(adaptar):
+        app = FastAPI()
+        for router in (operadoras.router, estatisticas.router, _router_com_opcoes()):
+            app.include_router(adaptar(router))
+        return app.openapi()
+
+    original = esquema(lambda router: router)
+    assert esquema(sessoes.router_sync) == original
+    convertido = esquema(sessoes.router_async)
+    # No modo assíncrono só muda o tipo da sessão injetada, que não aparece no OpenAPI
+    assert convertido == original
@@ -0,0 +1,83 @@
+"""Compara `validar_cnpjs_em_lote` (vetorizada) com `validar_cnpj_calculo` (linha a linha)"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.processor import validar_cnpj_calculo, validar_cnpjs_em_lote
+
+
+def _gerar_cnpj(rng):
+    base = [rng.randrange(10) for _ in range(12)]
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        resto = sum(d * p for d, p in zip(base, pesos)) % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    return ''.join(map(str, base))
+
+
+def _formatar(cnpj):
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def _comparar(serie):
+    esperado = np.array([validar_cnpj_calculo(v) for v in serie], dtype=bool)
+    obtido = validar_cnpjs_em_lote(serie)
+    assert list(obtido.index) == list(serie.index)
+    np.testing.assert_array_equal(obtido.to_numpy(dtype=bool), esperado)
+    return obtido
+
+
+@pytest.fixture
+def amostra():
+    rng = random.Random(7)
+    validos = [_gerar_cnpj(rng) for _ in range(300)]
+    # Troca o último dígito: o DV2 deixa de bater
+    invalidos = [c[:-1] + str((int(c[-1]) + 1) % 10) for c in validos[:100]]
+    lixo = ["", "abc", "123", "1" * 14, "0" * 14, "11.111.111/1111-11", "123456789012345",
+            "nan", "None", "12.345.678/0001-9X"]
+    return validos, invalidos, lixo
+
+
+def test_validos_e_invalidos(amostra):
+    validos, invalidos, _ = amostra
+    resultado = _comparar(pd.Series(validos + invalidos, dtype=object))
+    assert resultado[:len(validos)].all()
+    assert not resultado[len(validos):].any()
+
+
+def test_formatados_com_pontuacao(amostra):
+    validos, invalidos, _ = amostra
+    resultado = _comparar(pd.Series([_formatar(c) for c in validos + invalidos], dtype=object))
+    assert resultado.sum() == len(validos)
+
+
+def test_lixo_e_ausentes(amostra):
+    _, _, lixo = amostra
+    resultado = _comparar(pd.Series(lixo + [None, np.nan], dtype=object))
+    assert not resultado.any()
+
+
+def test_mistura_com_repetidos_e_indice_nao_padrao(amostra):
+    validos, invalidos, lixo = amostra
+    rng = random.Random(11)
+    valores = [rng.choice(validos + invalidos + lixo + [None]) for _ in range(5_000)]
+    _comparar(pd.Series(valores, index=range(10_000, 0, -2), dtype=object))
+
+
+def test_categorico_espalha_pelos_codigos(amostra):
+    validos, invalidos, lixo = amostra
+    rng = random.Random(3)
+    valores = [rng.choice(validos[:20] + invalidos[:20] + lixo + [None]) for _ in range(2_000)]
+    serie = pd.Series(valores, dtype='category')
+    # Categorias fora de ordem e não usadas não podem deslocar o resultado
+    serie = serie.cat.add_categories(["99999999999999"]).cat.reorder_categories(
+        list(reversed(list(serie.cat.categories) + ["99999999999999"])))
+    assert (serie.cat.codes == -1).any()
+
+    obtido = validar_cnpjs_em_lote(serie)
+    esperado = [False if pd.isna(v) else validar_cnpj_calculo(v) for v in serie]
+    np.testing.assert_array_equal(obtido.to_numpy(dtype=bool), np.array(esperado, dtype=bool))
+    # Mesmo resultado da série sem categorias
+    np.testing.assert_array_equal(obtido.to_numpy(dtype=bool),
+                                  validar_cnpjs_em_lote(serie.astype(object)).to_numpy(dtype=bool))
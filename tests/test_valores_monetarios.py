@@ -0,0 +1,76 @@
+"""Compara `limpar_valores_monetarios` (vetorizada) com `limpar_valor_monetario` (linha a linha)"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.downloader import limpar_valor_monetario, limpar_valores_monetarios
+
+
+def _comparar(valores):
+    serie = pd.Series(valores, dtype=object)
+    esperado = np.array([limpar_valor_monetario(v) for v in valores], dtype='float64')
+    obtido = limpar_valores_monetarios(serie)
+    assert list(obtido.index) == list(serie.index)
+    np.testing.assert_array_equal(obtido.to_numpy(), esperado)
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1.234,56", 1234.56),
+    ("1.234.567,89", 1234567.89),
+    ("1234,5", 1234.5),
+    ("1234.5", 1234.5),          # sem vírgula o ponto é decimal
+    ("1.234", 1.234),            # ... inclusive com três casas
+    ("(1.234,56)", -1234.56),    # negativo entre parênteses
+    ("(10)", -10.0),
+    ("-7,5", -7.5),
+    ("R$ 10,00", 10.0),
+    ("  42 ", 42.0),
+    (".5", 0.5),
+    ("5.", 5.0),
+])
+def test_formatos_validos(valor, esperado):
+    assert limpar_valor_monetario(valor) == pytest.approx(esperado)
+    assert limpar_valores_monetarios(pd.Series([valor], dtype=object))[0] == pytest.approx(esperado)
+
+
+@pytest.mark.parametrize("valor", [
+    "", "   ", "-", "--3", "1.2.3", "1,2,3", "1-2", "abc", "nan", "R$",
+    None, float("nan"),
+    "١٢٣",    # dígitos árabe-índicos: só dígitos ASCII contam
+    "１２,５",  # dígitos de largura total
+])
+def test_lixo_vira_zero(valor):
+    assert limpar_valor_monetario(valor) == 0.0
+    assert limpar_valores_monetarios(pd.Series([valor], dtype=object))[0] == 0.0
+
+
+def test_casos_de_borda_concordam():
+    _comparar(["1.234,56", "(1.234,56)", "1.234", "1,5", "1.2.3", ",5", "5,", "(-5)", "1e5", "1,234.56",
+               "", None, float("nan"), "-", "١٢٣", "²", "R$ 1.000.000,00", "( 3,14 )"])
+
+
+def _valor_brasileiro(rng):
+    inteiro = rng.randrange(0, 10 ** rng.randrange(1, 10))
+    texto = f"{inteiro:,}".replace(",", ".") if rng.random() < 0.5 else str(inteiro)
+    if rng.random() < 0.8:
+        texto += "," + str(rng.randrange(0, 100)).zfill(rng.choice([1, 2]))
+    if rng.random() < 0.1:
+        texto = f"({texto})"
+    elif rng.random() < 0.1:
+        texto = "-" + texto
+    if rng.random() < 0.05:
+        texto = "R$ " + texto
+    return rng.choice([texto] * 18 + ["", "-", "1.2.3"])
+
+
+def test_amostra_aleatoria_formato_brasileiro():
+    rng = random.Random(20240101)
+    _comparar([_valor_brasileiro(rng) for _ in range(20_000)])
+
+
+def test_serie_com_indice_nao_padrao():
+    serie = pd.Series(["1,5", "(2,5)"], index=[10, 3], dtype=object)
+    resultado = limpar_valores_monetarios(serie)
+    assert resultado.to_dict() == {10: 1.5, 3: -2.5}